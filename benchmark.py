@@ -0,0 +1,569 @@
+# IPP project 2. part - benchmarks of IPPcode22 interpreter
+# Author: Vojtech Dvorak (xdvora3o)
+
+"""Contains benchmarks of the IPPcode22 interpreter. Every measurement is
+performed in separate (forked) process, so the peak memory of measured code
+can be obtained and measurements do not affect each other.
+
+Usage:
+    python3 benchmark.py BENCHMARK [SIZE...]
+"""
+
+import contextlib
+import io
+import os
+import pickle
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from bytecode import Bytecode
+from engine import FastEngine
+from interpret import BatchRunner
+from iparser import IParser, IStreamParser, SAnalayzer
+from program import Data, Program
+
+
+class Generator:
+    """Generates synthetic IPPcode22 programs in XML representation"""
+
+    HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n<program language="IPPcode22">\n'
+    FOOTER = '</program>\n'
+
+
+    @staticmethod
+    def instruction(order : int, opcode : str, args : list) -> str:
+        """Creates XML representation of one instruction
+
+        Args:
+            order (int): order number of instruction
+            opcode (str): operational code
+            args (list): list of pairs (type, content) with arguments
+        """
+
+        xmlArgs = ""
+        for index, (type, content) in enumerate(args):
+            xmlArgs += f'\t\t<arg{index + 1} type="{type}">{content}</arg{index + 1}>\n'
+
+        return f'\t<instruction order="{order}" opcode="{opcode}">\n{xmlArgs}\t</instruction>\n'
+
+
+    @staticmethod
+    def arithmetics(size : int, shuffled = False) -> str:
+        """Writes program with given number of (mostly arithmetic) instructions
+        to temporary file and returns its path
+
+        Args:
+            size (int): number of instructions in program
+            shuffled (bool): if it is True, instructions are written in random
+                order (the order attributes are preserved)
+        """
+
+        body = [
+            ("DEFVAR", [("var", "GF@a")]),
+            ("MOVE", [("var", "GF@a"), ("int", "0")]),
+        ]
+        loop = [
+            ("ADD", [("var", "GF@a"), ("var", "GF@a"), ("int", "1")]),
+            ("MUL", [("var", "GF@a"), ("var", "GF@a"), ("int", "1")]),
+            ("SUB", [("var", "GF@a"), ("var", "GF@a"), ("int", "1")]),
+        ]
+
+        for i in range(size - len(body)):
+            body.append(loop[i % len(loop)])
+
+        orders = list(range(1, size + 1))
+        if shuffled:
+            random.Random(size).shuffle(orders)
+
+        return __class__.write(body, orders)
+
+
+    @staticmethod
+    def mixed(size : int) -> str:
+        """Writes program with given number of instructions (with various 
+        opcodes and operand types) to temporary file and returns its path
+        """
+
+        body = [
+            ("DEFVAR", [("var", "GF@a")]),
+            ("DEFVAR", [("var", "GF@s")]),
+            ("MOVE", [("var", "GF@a"), ("int", "0")]),
+            ("JUMP", [("label", "end")]),
+        ]
+        pattern = [
+            ("LABEL", [("label", "l{}")]),
+            ("ADD", [("var", "GF@a"), ("var", "GF@a"), ("int", "0x1F")]),
+            ("CONCAT", [("var", "GF@s"), ("string", "a\\032b"), ("string", "c")]),
+            ("lt", [("var", "GF@s"), ("float", "0x1.8p1"), ("float", "1.5")]),
+            ("JUMPIFEQ", [("label", "l{}"), ("var", "GF@a"), ("nil", "nil")]),
+            ("WRITE", [("bool", "true")]),
+            ("CREATEFRAME", []),
+            ("DEFVAR", [("var", "TF@x")]),
+        ]
+
+        for i in range(size - len(body) - 1):
+            opcode, args = pattern[i % len(pattern)]
+            body.append((opcode, [(t, c.format(i // len(pattern))) for t, c in args]))
+        body.append(("LABEL", [("label", "end")]))
+
+        return __class__.write(body, list(range(1, len(body) + 1)))
+
+
+    @staticmethod
+    def loop(iterations : int) -> str:
+        """Writes program with arithmetic-heavy loop with given number of
+        iterations to temporary file and returns its path
+        """
+
+        body = [
+            ("DEFVAR", [("var", "GF@i")]),
+            ("DEFVAR", [("var", "GF@sum")]),
+            ("DEFVAR", [("var", "GF@diff")]),
+            ("DEFVAR", [("var", "GF@cond")]),
+            ("MOVE", [("var", "GF@i"), ("int", "0")]),
+            ("MOVE", [("var", "GF@sum"), ("int", "0")]),
+            ("LABEL", [("label", "loop")]),
+            ("ADD", [("var", "GF@sum"), ("var", "GF@sum"), ("var", "GF@i")]),
+            ("SUB", [("var", "GF@diff"), ("var", "GF@sum"), ("var", "GF@i")]),
+            ("MUL", [("var", "GF@diff"), ("var", "GF@diff"), ("int", "2")]),
+            ("ADD", [("var", "GF@i"), ("var", "GF@i"), ("int", "1")]),
+            ("LT", [("var", "GF@cond"), ("var", "GF@i"), ("int", str(iterations))]),
+            ("JUMPIFEQ", [("label", "loop"), ("var", "GF@cond"), ("bool", "true")]),
+        ]
+
+        return __class__.write(body, list(range(1, len(body) + 1)))
+
+
+    @staticmethod
+    def stackLoop(iterations : int) -> str:
+        """Writes program with loop computing by stack instructions (with
+        given number of iterations) to temporary file and returns its path
+        """
+
+        body = [
+            ("DEFVAR", [("var", "GF@i")]),
+            ("DEFVAR", [("var", "GF@result")]),
+            ("MOVE", [("var", "GF@i"), ("int", "0")]),
+            ("LABEL", [("label", "loop")]),
+            ("PUSHS", [("var", "GF@i")]),
+            ("PUSHS", [("int", "3")]),
+            ("MULS", []),
+            ("PUSHS", [("var", "GF@i")]),
+            ("SUBS", []),
+            ("PUSHS", [("int", "2")]),
+            ("IDIVS", []),
+            ("POPS", [("var", "GF@result")]),
+            ("PUSHS", [("var", "GF@i")]),
+            ("PUSHS", [("int", "1")]),
+            ("ADDS", []),
+            ("POPS", [("var", "GF@i")]),
+            ("PUSHS", [("var", "GF@i")]),
+            ("PUSHS", [("int", str(iterations))]),
+            ("LTS", []),
+            ("PUSHS", [("bool", "true")]),
+            ("JUMPIFEQS", [("label", "loop")]),
+        ]
+
+        return __class__.write(body, list(range(1, len(body) + 1)))
+
+
+    @staticmethod
+    def fibonacci(n : int) -> str:
+        """Writes program computing n-th Fibonacci number recursively (every
+        call creates new frame) to temporary file and returns its path
+        """
+
+        body = [
+            ("DEFVAR", [("var", "GF@result")]),
+            ("PUSHS", [("int", str(n))]),
+            ("CALL", [("label", "fib")]),
+            ("POPS", [("var", "GF@result")]),
+            ("JUMP", [("label", "end")]),
+            ("LABEL", [("label", "fib")]),
+            ("CREATEFRAME", []),
+            ("PUSHFRAME", []),
+            ("DEFVAR", [("var", "LF@n")]),
+            ("POPS", [("var", "LF@n")]),
+            ("DEFVAR", [("var", "LF@cond")]),
+            ("LT", [("var", "LF@cond"), ("var", "LF@n"), ("int", "2")]),
+            ("JUMPIFEQ", [("label", "base"), ("var", "LF@cond"), ("bool", "true")]),
+            ("PUSHS", [("var", "LF@n")]),
+            ("PUSHS", [("int", "1")]),
+            ("SUBS", []),
+            ("CALL", [("label", "fib")]),
+            ("PUSHS", [("var", "LF@n")]),
+            ("PUSHS", [("int", "2")]),
+            ("SUBS", []),
+            ("CALL", [("label", "fib")]),
+            ("ADDS", []),
+            ("POPFRAME", []),
+            ("RETURN", []),
+            ("LABEL", [("label", "base")]),
+            ("PUSHS", [("var", "LF@n")]),
+            ("POPFRAME", []),
+            ("RETURN", []),
+            ("LABEL", [("label", "end")]),
+        ]
+
+        return __class__.write(body, list(range(1, len(body) + 1)))
+
+
+    @staticmethod
+    def write(body : list, orders : list) -> str:
+        """Writes instructions (pairs opcode, args) with given order numbers
+        to temporary file and returns its path
+        """
+
+        fd, path = tempfile.mkstemp(suffix=".xml", prefix="ippbench")
+        with os.fdopen(fd, "w") as f:
+            f.write(__class__.HEADER)
+            for order in orders:
+                opcode, args = body[order - 1]
+                f.write(__class__.instruction(order, opcode, args))
+            f.write(__class__.FOOTER)
+
+        return path
+
+
+
+class Measurement:
+    """Performs measurements of time and peak memory in forked processes"""
+
+    @staticmethod
+    def measure(func, *args) -> tuple:
+        """Runs given function in child process and returns tuple with
+        elapsed time (in seconds) and peak resident memory (in kB) of it. If 
+        the function returns float, it is used as elapsed time instead (so 
+        the function can measure only the part of its work)
+        """
+
+        readFd, writeFd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            exitCode = 1
+            try:
+                os.close(readFd)
+                start = time.perf_counter()
+                result = func(*args)
+                elapsed = time.perf_counter() - start
+                elapsed = result if isinstance(result, float) else elapsed
+
+                with os.fdopen(writeFd, "wb") as w:
+                    pickle.dump(elapsed, w)
+                exitCode = 0
+            finally:
+                os._exit(exitCode) # Child must never continue in the code of parent
+
+        os.close(writeFd)
+        with os.fdopen(readFd, "rb") as r:
+            data = r.read()
+
+        _, status, usage = os.wait4(pid, 0)
+        if status != 0 or not data:
+            raise RuntimeError(f"Měření {func.__name__} selhalo!")
+
+        return pickle.loads(data), usage.ru_maxrss
+
+
+    @staticmethod
+    def printRow(name : str, size : int, result : tuple):
+        seconds, memory = result
+        print(f"{name:<24}{size:>10}{seconds:>12.3f} s{memory / 1024:>12.1f} MB")
+
+
+
+class Benchmarks:
+    """Contains benchmarks, every benchmark takes the list with sizes of
+    generated programs
+    """
+
+    @staticmethod
+    def config(source = None) -> dict:
+        """Creates minimal configuration dictionary for interpreter classes"""
+
+        return {"sourceOpened" : source, "inputOpened" : sys.stdin}
+
+
+    @staticmethod
+    def parseWith(parserClass, path : str):
+        """Parses program in given file by instance of given parser class"""
+
+        with open(path) as source:
+            return parserClass(__class__.config(source)).parse()
+
+
+    @staticmethod
+    def constructProgram(path : str, presorted : bool) -> float:
+        """Constructs program object from shuffled list of instruction objects
+        (or from sorted list by Program.fromSorted) and returns elapsed time
+        of the construction
+        """
+
+        instructions = __class__.parseWith(IStreamParser, path).getInstructions()
+        if not presorted:
+            random.Random(len(instructions)).shuffle(instructions)
+
+        start = time.perf_counter()
+        if presorted:
+            Program.fromSorted(__class__.config(), instructions)
+        else:
+            Program(__class__.config(), instructions)
+
+        return time.perf_counter() - start
+
+
+    @staticmethod
+    def loadWith(parserClass, path : str) -> float:
+        """Loads program in given file (parsing and semantic analysis) by 
+        given parser class and returns elapsed time of the loading
+        """
+
+        start = time.perf_counter()
+        program = __class__.parseWith(parserClass, path)
+        SAnalayzer().checkSemantics(program)
+
+        return time.perf_counter() - start
+
+
+    @staticmethod
+    def runWith(engineClass, path : str) -> float:
+        """Runs program in given file by given engine (Program.run is used
+        if engine class is None) and returns elapsed time of the execution
+        """
+
+        program = __class__.parseWith(IStreamParser, path)
+        engine = engineClass(program) if engineClass else program
+
+        start = time.perf_counter()
+        engine.run()
+
+        return time.perf_counter() - start
+
+
+    @staticmethod
+    def emitBytecode(path : str, bytecodePath : str):
+        """Loads program in given file and writes its bytecode"""
+
+        program = __class__.parseWith(IStreamParser, path)
+        SAnalayzer().checkSemantics(program)
+        Bytecode.emit(program, bytecodePath)
+
+
+    @staticmethod
+    def startWith(path : str, bytecodePath : str = None) -> float:
+        """Loads program from XML (by streaming parser) or from bytecode file
+        (if its path is given) and runs it, returns elapsed time of both
+        """
+
+        start = time.perf_counter()
+        if bytecodePath:
+            program = Bytecode.load(__class__.config(), bytecodePath)
+        else:
+            program = __class__.parseWith(IStreamParser, path)
+            SAnalayzer().checkSemantics(program)
+        program.run()
+
+        return time.perf_counter() - start
+
+
+    @staticmethod
+    def runBatch(path : str, inputDir : str, workers : int) -> float:
+        """Runs program in given file with all inputs in directory by batch
+        runner with given number of workers and returns elapsed time of runs
+        """
+
+        program = __class__.parseWith(IStreamParser, path)
+        config = {"inputBatch" : inputDir, "workers" : workers}
+        config["batchOutput"] = tempfile.mkdtemp(prefix="ippbench")
+
+        try:
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                BatchRunner(config).run(program)
+
+            return time.perf_counter() - start
+        finally:
+            shutil.rmtree(config["batchOutput"])
+
+
+    @staticmethod
+    def countDataObjects(path : str) -> int:
+        """Runs program in given file and returns number of data objects
+        constructed during the execution (interned objects are not counted)
+        """
+
+        program = __class__.parseWith(IStreamParser, path)
+        originalInit = Data.__init__
+        counter = [0]
+
+        def countingInit(self, *args):
+            counter[0] += 1
+            originalInit(self, *args)
+
+        Data.__init__ = countingInit
+        try:
+            program.run()
+        finally:
+            Data.__init__ = originalInit
+
+        return counter[0]
+
+
+    @staticmethod
+    def parser(sizes : list):
+        """Compares loading of programs by DOM (IParser) and by streaming
+        parser (IStreamParser)
+        """
+
+        for size in sizes:
+            path = Generator.arithmetics(size)
+            try:
+                Measurement.printRow("empty", size, Measurement.measure(lambda: None))
+                Measurement.printRow("IParser (DOM)", size, Measurement.measure(__class__.parseWith, IParser, path))
+                Measurement.printRow("IStreamParser", size, Measurement.measure(__class__.parseWith, IStreamParser, path))
+            finally:
+                os.remove(path)
+
+
+    @staticmethod
+    def ordering(sizes : list):
+        """Measures loading of programs with shuffled order attributes"""
+
+        for size in sizes:
+            path = Generator.arithmetics(size, shuffled=True)
+            try:
+                Measurement.printRow("IParser (shuffled)", size, Measurement.measure(__class__.parseWith, IParser, path))
+                Measurement.printRow("IStreamParser (shuffled)", size, Measurement.measure(__class__.parseWith, IStreamParser, path))
+                Measurement.printRow("Program (shuffled list)", size, Measurement.measure(__class__.constructProgram, path, False))
+                Measurement.printRow("Program.fromSorted", size, Measurement.measure(__class__.constructProgram, path, True))
+            finally:
+                os.remove(path)
+
+
+    @staticmethod
+    def load(sizes : list):
+        """Measures the whole loading of programs (parsing, semantic analysis
+        and linking) by both parsers
+        """
+
+        for size in sizes:
+            path = Generator.mixed(size)
+            try:
+                Measurement.printRow("IParser (DOM)", size, Measurement.measure(__class__.loadWith, IParser, path))
+                Measurement.printRow("IStreamParser", size, Measurement.measure(__class__.loadWith, IStreamParser, path))
+            finally:
+                os.remove(path)
+
+
+    @staticmethod
+    def data(sizes : list):
+        """Measures execution of arithmetic-heavy loop (with given number of
+        iterations), that creates data objects in every instruction
+        """
+
+        for size in sizes:
+            path = Generator.loop(size)
+            try:
+                Measurement.printRow("Program.run", size, Measurement.measure(__class__.runWith, None, path))
+                Measurement.printRow("FastEngine", size, Measurement.measure(__class__.runWith, FastEngine, path))
+                print(f"{'Data objects':<24}{size:>10}{__class__.countDataObjects(path):>14}")
+            finally:
+                os.remove(path)
+
+
+    @staticmethod
+    def stack(sizes : list):
+        """Measures execution of loop (with given number of iterations), that
+        computes only by stack instructions
+        """
+
+        for size in sizes:
+            path = Generator.stackLoop(size)
+            try:
+                Measurement.printRow("Program.run", size, Measurement.measure(__class__.runWith, None, path))
+                Measurement.printRow("FastEngine", size, Measurement.measure(__class__.runWith, FastEngine, path))
+            finally:
+                os.remove(path)
+
+
+    @staticmethod
+    def frames(sizes : list):
+        """Measures execution of recursive computation of Fibonacci numbers
+        (sizes are indexes of computed numbers), that is heavy on frames
+        """
+
+        for size in sizes:
+            path = Generator.fibonacci(size)
+            try:
+                Measurement.printRow("Program.run", size, Measurement.measure(__class__.runWith, None, path))
+                Measurement.printRow("FastEngine", size, Measurement.measure(__class__.runWith, FastEngine, path))
+            finally:
+                os.remove(path)
+
+
+    @staticmethod
+    def bytecode(sizes : list):
+        """Compares short runs (loading and execution of program, that jumps
+        almost immediately to its end) of XML and bytecode representation
+        """
+
+        for size in sizes:
+            path = Generator.mixed(size)
+            bytecodePath = path + ".ippb"
+            try:
+                Measurement.printRow("Bytecode emission", size, Measurement.measure(__class__.emitBytecode, path, bytecodePath))
+                Measurement.printRow("XML (IStreamParser)", size, Measurement.measure(__class__.startWith, path))
+                Measurement.printRow("Bytecode (mmap)", size, Measurement.measure(__class__.startWith, path, bytecodePath))
+                print(f"{'Bytecode size':<24}{size:>10}{os.path.getsize(bytecodePath) / 1024:>12.1f} kB")
+            finally:
+                os.remove(path)
+                if os.path.exists(bytecodePath):
+                    os.remove(bytecodePath)
+
+
+    @staticmethod
+    def batch(sizes : list):
+        """Measures scaling of batch processing (given number of inputs, every
+        run is loop with 10000 iterations) with 1..N worker processes
+        """
+
+        cores = len(os.sched_getaffinity(0))
+        for size in sizes:
+            path = Generator.loop(10000)
+            inputDir = tempfile.mkdtemp(prefix="ippbench")
+            try:
+                for i in range(size):
+                    open(os.path.join(inputDir, f"{i:05d}.in"), "w").close()
+
+                for workers in range(1, cores + 1):
+                    Measurement.printRow(f"Batch ({workers} workers)", size, Measurement.measure(__class__.runBatch, path, inputDir, workers))
+            finally:
+                os.remove(path)
+                shutil.rmtree(inputDir)
+
+
+
+BENCHMARKS = {
+    "parser" : (Benchmarks.parser, [10000, 100000, 1000000]),
+    "ordering" : (Benchmarks.ordering, [100000]),
+    "data" : (Benchmarks.data, [100000]),
+    "stack" : (Benchmarks.stack, [100000]),
+    "frames" : (Benchmarks.frames, [20]),
+    "load" : (Benchmarks.load, [100000, 500000]),
+    "bytecode" : (Benchmarks.bytecode, [100000]),
+    "batch" : (Benchmarks.batch, [64]),
+}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print(f"Použití: python3 benchmark.py {'|'.join(BENCHMARKS)} [VELIKOST...]", file=sys.stderr)
+        sys.exit(1)
+
+    benchmark, defaultSizes = BENCHMARKS[sys.argv[1]]
+    sizes = [int(s) for s in sys.argv[2:]] if len(sys.argv) > 2 else defaultSizes
+
+    benchmark(sizes)
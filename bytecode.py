@@ -0,0 +1,343 @@
+# IPP project 2. part
+# Author: Vojtech Dvorak (xdvora3o)
+
+"""Contains compact binary (bytecode) representation of linked programs.
+Bytecode file consists of header, directory of sections and sections with
+flat arrays (opcodes, order numbers, operand tables, literal pool, label
+targets, names of variable slots and string pool). Loader maps the file to
+memory (read only, so the pages are shared by all processes running the same
+program) and instruction objects are decoded from the arrays lazily, only
+when the instruction is executed for the first time.
+"""
+
+import mmap
+import struct
+import sys
+
+from array import array
+from errors import *
+from iparser import IParser
+from lang import Lang
+from program import Data, Literal, Operand, Program, Target, Type, Variable
+
+
+class MappedInstructions(dict):
+    """Sequence of instructions of mapped bytecode. Instructions are decoded
+    by __missing__ when they are accessed for the first time, then they are
+    stored in the dictionary (indexing of decoded instructions is as fast as
+    indexing of list)
+    """
+
+    def __init__(self, image):
+        super().__init__()
+        self.image = image
+        self.length = len(image.opcodes)
+
+
+    def __missing__(self, index : int):
+        if index.__class__ != int or not 0 <= index < self.length:
+            raise IndexError(f"Instruction index {index} out of range")
+
+        instruction = self.image.decodeInstruction(index)
+        self[index] = instruction
+
+        return instruction
+
+
+    def __len__(self):
+        return self.length
+
+
+    def __iter__(self):
+        for index in range(self.length):
+            yield self[index]
+
+
+
+class BytecodeImage:
+    """Bytecode file mapped to the memory. Sections are accessible as
+    memoryviews with the right item type (see SECTIONS)
+    """
+
+    def __init__(self, buffer):
+        """Checks header of bytecode in given buffer (e.g. mmap object) and
+        creates views to its sections
+
+        Raises:
+            Error.FileError: if the buffer does not contain valid bytecode
+        """
+
+        self.buffer = buffer
+        view = memoryview(buffer)
+
+        if len(view) < Bytecode.HEADER.size:
+            raise Bytecode.invalid("příliš krátký soubor")
+
+        magic, version, byteorder, sectionCount = Bytecode.HEADER.unpack_from(view)
+        if magic != Bytecode.MAGIC:
+            raise Bytecode.invalid("chybná identifikace formátu")
+        if version != Bytecode.VERSION or byteorder != Bytecode.byteorder():
+            raise Bytecode.invalid(f"nepodporovaná verze formátu {version}")
+        if sectionCount != len(Bytecode.SECTIONS):
+            raise Bytecode.invalid("chybný počet sekcí")
+
+        position = Bytecode.HEADER.size
+        for name, typecode in Bytecode.SECTIONS:
+            offset, count = Bytecode.SECTION.unpack_from(view, position)
+            position += Bytecode.SECTION.size
+
+            end = offset + count * array(typecode).itemsize
+            if end > len(view):
+                raise Bytecode.invalid(f"sekce {name} přesahuje konec souboru")
+
+            setattr(self, name, view[offset:end].cast(typecode))
+
+        self.literals = [None] * len(self.literalTypes) # Values of literal pool are decoded lazily
+        self.strings = {}
+
+
+    def string(self, index : int) -> str:
+        """Returns string with given index from the string pool"""
+
+        if index not in self.strings:
+            start, end = self.stringOffsets[index], self.stringOffsets[index + 1]
+            self.strings[index] = bytes(self.stringData[start:end]).decode("utf-8", "surrogatepass")
+
+        return self.strings[index]
+
+
+    def literal(self, index : int) -> tuple:
+        """Returns pair with data type and value of literal from the pool"""
+
+        if self.literals[index] == None:
+            type = Data.Type(self.literalTypes[index])
+            content = self.string(self.literalContents[index])
+            self.literals[index] = (type, Lang.str2value(type, content))
+
+        return self.literals[index]
+
+
+    def decodeOperand(self, index : int) -> Operand:
+        """Creates operand object from the record at given index of operand
+        tables
+        """
+
+        kind = self.kinds[index]
+        number = self.numbers[index]
+        content = self.string(self.contents[index])
+        extra = self.extras[index]
+
+        if kind == Bytecode.KIND_VAR:
+            _, name = Lang.splitVarName(content)
+            operand = Variable(number, content, Variable.FrameM(self.aux[index]), name)
+            operand.setSlot(extra)
+        elif kind == Bytecode.KIND_LITERAL:
+            type, value = self.literal(extra)
+            operand = Literal(number, content, type, value)
+        elif kind == Bytecode.KIND_LABEL:
+            operand = Target(number, content)
+            operand.setTarget(extra if extra >= 0 else None)
+        else:
+            operand = Type(number, content, Lang.getType(content))
+
+        return operand
+
+
+    def decodeInstruction(self, index : int):
+        """Creates instruction object (with operands) from the records at
+        given index
+        """
+
+        opcode = self.string(self.opnames[self.opcodes[index]])
+        operands = [self.decodeOperand(i) for i in range(self.operandStarts[index], self.operandStarts[index + 1])]
+
+        return IParser.createInstruction(opcode, self.orders[index], operands)
+
+
+    def getLabelMap(self) -> dict:
+        return {self.string(n) : t for n, t in zip(self.labelNames, self.labelTargets)}
+
+
+    def getSlotNames(self) -> tuple:
+        globalNames = [self.string(n) for n in self.globalNames]
+        localNames = [self.string(n) for n in self.localNames]
+
+        return globalNames, localNames
+
+
+
+class Bytecode:
+    """Contains writer and loader of the bytecode files"""
+
+    MAGIC = b"IPPB"
+    VERSION = 2
+    HEADER = struct.Struct("<4sHBB") # Magic, version, byte order, number of sections
+    SECTION = struct.Struct("<QQ") # Offset and number of items
+    ALIGNMENT = 8
+
+    # Sections in the order of the directory (name of attribute of image, typecode)
+    SECTIONS = [
+        ("opnames", "I"), # Opcodes used in program (indexes to string pool)
+        ("opcodes", "B"), # Instructions (indexes to opnames)
+        ("orders", "Q"),
+        ("operandStarts", "I"), # Index of the first operand of instruction (+ end)
+        ("kinds", "B"), # Operand tables (one item per operand)
+        ("numbers", "B"),
+        ("aux", "B"), # Frame of variable
+        ("contents", "I"),
+        ("extras", "i"), # Slot, index to literal pool or label target (-1 if unresolved)
+        ("literalTypes", "B"), # Literal pool
+        ("literalContents", "I"),
+        ("labelNames", "I"), # Label targets
+        ("labelTargets", "I"),
+        ("globalNames", "I"), # Names of variables in slots
+        ("localNames", "I"),
+        ("stringOffsets", "I"), # String pool
+        ("stringData", "B"),
+    ]
+
+    KIND_VAR = 0
+    KIND_LITERAL = 1
+    KIND_LABEL = 2
+    KIND_TYPE = 3
+
+    MAX_ORDER = (1 << 64) - 1 # Order numbers are stored as unsigned 64-bit integers
+
+
+    @staticmethod
+    def byteorder() -> int:
+        return 0 if sys.byteorder == "little" else 1
+
+
+    @staticmethod
+    def invalid(reason : str) -> Error.FileError:
+        return Error.FileError(INPUT_FILE_ERROR, f"Neplatný soubor s bytekódem ({reason})!")
+
+
+    @staticmethod
+    def isBytecode(path : str) -> bool:
+        """Checks whether the file starts with identification of bytecode"""
+
+        try:
+            with open(path, "rb") as f:
+                return f.read(len(__class__.MAGIC)) == __class__.MAGIC
+        except OSError:
+            return False
+
+
+    @staticmethod
+    def encode(program : Program) -> bytes:
+        """Creates bytecode of given linked program"""
+
+        if not program.isLinked():
+            program.link()
+
+        sections = {name : array(typecode) for name, typecode in __class__.SECTIONS}
+        strings, opnames, literals = {}, {}, {}
+        stringData = bytearray()
+
+        def string(s : str) -> int:
+            if s not in strings:
+                strings[s] = len(strings)
+                sections["stringOffsets"].append(len(stringData))
+                stringData.extend(s.encode("utf-8", "surrogatepass"))
+            return strings[s]
+
+        for inst in program.getInstructions():
+            if inst.getOrder() > __class__.MAX_ORDER:
+                raise Error.FileError(OUPUT_FILE_ERROR, f"Pořadí instrukce {inst.getOrder()} nelze uložit do bytekódu (maximum je {__class__.MAX_ORDER})!")
+
+            opcode = inst.getOpCode()
+            if opcode not in opnames:
+                opnames[opcode] = len(opnames)
+                sections["opnames"].append(string(opcode))
+
+            sections["opcodes"].append(opnames[opcode])
+            sections["orders"].append(inst.getOrder())
+            sections["operandStarts"].append(len(sections["kinds"]))
+
+            for op in inst.getOperands():
+                aux, extra = 0, 0
+                if op.__class__ == Variable:
+                    kind, aux, extra = __class__.KIND_VAR, op.getFrameMark().value, op.getSlot()
+                elif op.__class__ == Literal:
+                    key = (op.getData().getType(), op.getContent())
+                    if key not in literals:
+                        literals[key] = len(literals)
+                        sections["literalTypes"].append(key[0].value)
+                        sections["literalContents"].append(string(key[1]))
+                    kind, extra = __class__.KIND_LITERAL, literals[key]
+                elif op.__class__ == Target:
+                    target = op.getTarget()
+                    kind, extra = __class__.KIND_LABEL, target if target != None else -1
+                else:
+                    kind = __class__.KIND_TYPE
+
+                sections["kinds"].append(kind)
+                sections["numbers"].append(op.getNumber())
+                sections["aux"].append(aux)
+                sections["contents"].append(string(op.getContent()))
+                sections["extras"].append(extra)
+
+        sections["operandStarts"].append(len(sections["kinds"]))
+
+        labelMap, (globalNames, localNames) = program.getLinkage()
+        for name, target in labelMap.items():
+            sections["labelNames"].append(string(name))
+            sections["labelTargets"].append(target)
+
+        sections["globalNames"].extend(string(n) for n in globalNames)
+        sections["localNames"].extend(string(n) for n in localNames)
+
+        sections["stringOffsets"].append(len(stringData))
+        sections["stringData"].frombytes(bytes(stringData))
+
+        return __class__.pack(sections)
+
+
+    @staticmethod
+    def pack(sections : dict) -> bytes:
+        """Joins header, directory and (aligned) sections to one buffer"""
+
+        directorySize = __class__.HEADER.size + len(__class__.SECTIONS) * __class__.SECTION.size
+        header = bytearray(__class__.HEADER.pack(__class__.MAGIC, __class__.VERSION, __class__.byteorder(), len(__class__.SECTIONS)))
+        body = bytearray()
+
+        for name, _ in __class__.SECTIONS:
+            offset = directorySize + len(body)
+            header += __class__.SECTION.pack(offset, len(sections[name]))
+
+            body += sections[name].tobytes()
+            body += bytes(-len(body) % __class__.ALIGNMENT)
+
+        return bytes(header + body)
+
+
+    @staticmethod
+    def emit(program : Program, path : str):
+        """Writes bytecode of given program to the file"""
+
+        data = __class__.encode(program)
+        try:
+            with open(path, "wb") as f:
+                f.write(data)
+        except OSError:
+            raise Error.FileError(OUPUT_FILE_ERROR, f"Nelze zapsat bytekód do souboru '{path}'!")
+
+
+    @staticmethod
+    def load(config : dict, path : str) -> Program:
+        """Maps bytecode file to the memory and creates linked program, whose
+        instructions are decoded lazily from the mapped file
+        """
+
+        try:
+            with open(path, "rb") as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            raise Error.FileError(INPUT_FILE_ERROR, f"Chyba při otevírání souboru s bytekódem '{path}'!")
+
+        image = BytecodeImage(buffer)
+        instructions = MappedInstructions(image)
+
+        return Program.fromLinked(config, instructions, image.getLabelMap(), image.getSlotNames())
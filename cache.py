@@ -0,0 +1,182 @@
+# IPP project 2. part
+# Author: Vojtech Dvorak (xdvora3o)
+
+"""Contains persistent cache of loaded programs. Programs, that passed the
+semantic analysis and were linked, are stored (pickled) to the cache 
+directory, so the next run with the same source can skip parsing of XML and
+semantic analysis.
+"""
+
+import hashlib
+import io
+import os
+import pickle
+import sys
+import tempfile
+
+import engine
+import errors
+import iparser
+import lang
+import program
+from program import Program
+
+
+class ProgramCache:
+    """Cache directory with pickled programs. Entries are keyed by hash of
+    the source and by version of interpreter (hash of its modules and 
+    python version), so entries created by different version are never used.
+    The total size of cache is bounded, least recently used entries (by mtime,
+    that is updated on every hit) are evicted.
+    """
+
+    DEFAULT_SIZE = 256 # Maximal size of cache in MiB
+    SUFFIX = ".pickle"
+    CHUNK_SIZE = 1 << 16
+    MODULES = [errors, program, lang, iparser, engine]
+
+    versionKey = None # Version of interpreter is computed only once
+
+
+    def __init__(self, directory : str, maxSize : int = DEFAULT_SIZE):
+        """Creates cache in given directory
+
+        Args:
+            directory (str): path to cache directory (it is created if it
+                does not exist)
+            maxSize (int): maximal size of all entries in MiB
+        """
+
+        self.directory = directory
+        self.maxSize = maxSize * (1 << 20)
+        self.key = None
+
+
+    @staticmethod
+    def getVersionKey() -> bytes:
+        """Returns hash of source files of interpreter and python version"""
+
+        if __class__.versionKey == None:
+            version = hashlib.sha256(sys.version.encode())
+            for module in __class__.MODULES + [sys.modules[__name__]]:
+                with open(module.__file__, "rb") as f:
+                    version.update(f.read())
+
+            __class__.versionKey = version.digest()
+
+        return __class__.versionKey
+
+
+    @staticmethod
+    def hashSource(config : dict) -> str:
+        """Computes key of the source given in config. Source, that can not be
+        read again (e.g. stdin) is read to the memory and replaced in config
+        """
+
+        key = hashlib.sha256(__class__.getVersionKey())
+        source = config["sourceOpened"]
+
+        if not source.seekable():
+            source = io.StringIO(source.read())
+            config["sourceOpened"] = source
+
+        start = source.tell()
+        while True:
+            chunk = source.read(__class__.CHUNK_SIZE)
+            if not chunk:
+                break
+
+            key.update(chunk.encode("utf-8", "surrogateescape"))
+
+        source.seek(start)
+
+        return key.hexdigest()
+
+
+    def getPath(self, key : str) -> str:
+        return os.path.join(self.directory, key + __class__.SUFFIX)
+
+
+    def load(self, config : dict) -> Program:
+        """Returns program with the same source as the source in config or
+        None if it is not in cache (damaged entries are removed)
+        """
+
+        self.key = __class__.hashSource(config)
+        path = self.getPath(self.key)
+
+        try:
+            with open(path, "rb") as f:
+                instructions, labelMap, slotNames = pickle.load(f)
+
+            os.utime(path) # Entry was used recently
+        except FileNotFoundError:
+            return None
+        except Exception:
+            self.remove(path)
+            return None
+
+        return Program.fromLinked(config, instructions, labelMap, slotNames)
+
+
+    def store(self, program : Program):
+        """Stores linked program to the cache (under the key of the last 
+        loaded source), failures of writing are ignored, cache is only
+        optimization
+        """
+
+        if self.key == None or not program.isLinked():
+            return
+
+        labelMap, slotNames = program.getLinkage()
+        entry = (program.getInstructions(), labelMap, slotNames)
+
+        tmpPath = None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+
+            # Entry is written to the temporary file first, so other processes
+            # never see incomplete entry
+            fd, tmpPath = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(entry, f, pickle.HIGHEST_PROTOCOL)
+
+            os.replace(tmpPath, self.getPath(self.key))
+        except (OSError, pickle.PicklingError, RecursionError):
+            if tmpPath != None:
+                self.remove(tmpPath) # Incomplete entry is not counted by evict, so it would stay forever
+
+            return
+
+        self.evict()
+
+
+    def remove(self, path : str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+    def evict(self):
+        """Removes least recently used entries until the total size of cache
+        is not greater than its limit
+        """
+
+        entries = []
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.name.endswith(__class__.SUFFIX):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except OSError:
+            return
+
+        totalSize = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if totalSize <= self.maxSize:
+                break
+
+            self.remove(path)
+            totalSize -= size
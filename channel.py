@@ -0,0 +1,95 @@
+# IPP project 2. part
+# Author: Vojtech Dvorak (xdvora3o)
+
+"""Contains simple message channel used for communication between
+interpreter daemon and its clients. Every message is JSON object prefixed by
+its length (4 bytes, big endian).
+"""
+
+import io
+import json
+import struct
+
+
+class Channel:
+    """Sends and receives messages (dictionaries) through connected socket"""
+
+    LENGTH = struct.Struct(">I")
+
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.reader = sock.makefile("rb")
+
+
+    def send(self, message : dict):
+        data = json.dumps(message).encode("utf-8")
+        self.sock.sendall(__class__.LENGTH.pack(len(data)) + data)
+
+
+    def recv(self) -> dict:
+        """Returns the next message or None if the connection was closed"""
+
+        header = self.reader.read(__class__.LENGTH.size)
+        if len(header) < __class__.LENGTH.size:
+            return None
+
+        length, = __class__.LENGTH.unpack(header)
+        data = self.reader.read(length)
+        if len(data) < length:
+            return None
+
+        return json.loads(data.decode("utf-8"))
+
+
+    def close(self):
+        self.reader.close()
+        self.sock.close()
+
+
+
+class ChannelWriter:
+    """Text stream, that sends everything written to it as messages with
+    given key (used instead of stdout and stderr of the daemon)
+    """
+
+    def __init__(self, channel : Channel, key : str):
+        self.channel = channel
+        self.key = key
+
+
+    def write(self, string : str) -> int:
+        if string:
+            self.channel.send({self.key : string})
+
+        return len(string)
+
+
+    def flush(self):
+        pass
+
+
+    def isatty(self) -> bool:
+        return False
+
+
+
+class ChannelReader:
+    """Text stream, whose content is requested through the channel (message
+    with given key) when it is used for the first time (used instead of
+    stdin of the daemon)
+    """
+
+    def __init__(self, channel : Channel, key : str):
+        self.channel = channel
+        self.key = key
+        self.stream = None
+
+
+    def __getattr__(self, name : str):
+        if self.stream == None:
+            self.channel.send({self.key : True})
+            message = self.channel.recv()
+            self.stream = io.StringIO(message[self.key] if message else "")
+
+        return getattr(self.stream, name)
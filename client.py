@@ -0,0 +1,106 @@
+# IPP project 2. part - client of IPPcode22 interpreter daemon
+# Author: Vojtech Dvorak (xdvora3o)
+
+"""Thin client of the interpreter daemon (see daemon.py). It accepts the same
+arguments as interpret.py (and additionally --socket=""), sends them to
+the daemon and prints the output of the interpretation. Standard input is
+sent only if the daemon needs it, statistics are written by the client.
+
+Usage:
+    python3 client.py [--socket="SOCKET"] [ARGUMENTS OF interpret.py]
+"""
+
+import os
+import socket
+import sys
+import tempfile
+
+from channel import Channel
+from errors import *
+
+
+class DaemonClient:
+    """Performs the interpretation by the daemon listening on Unix socket"""
+
+    DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), "ipp-interpret.sock")
+    SOCKET_OPT = "--socket="
+
+
+    @staticmethod
+    def splitArgs(argv : list) -> tuple:
+        """Returns path to socket and arguments for interpreter"""
+
+        socketPath = __class__.DEFAULT_SOCKET
+        args = []
+        for arg in argv[1:]:
+            if arg.startswith(__class__.SOCKET_OPT):
+                socketPath = arg[len(__class__.SOCKET_OPT):]
+            else:
+                args.append(arg)
+
+        return socketPath, args
+
+
+    @staticmethod
+    def run(socketPath : str, args : list) -> int:
+        """Sends job to the daemon and processes its messages until the end
+        of interpretation
+
+        Returns:
+            (int): return code of the interpretation
+        """
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(socketPath)
+        except OSError:
+            sock.close()
+            Error.exit(INTERNAL_ERROR, f"Nelze se připojit k démonovi interpretu '{socketPath}'!")
+
+        channel = Channel(sock)
+        try:
+            channel.send({"argv" : ["interpret.py"] + args, "cwd" : os.getcwd()})
+
+            while True:
+                message = channel.recv()
+                if message == None:
+                    Error.exit(INTERNAL_ERROR, "Spojení s démonem interpretu bylo přerušeno!")
+
+                if "stdout" in message:
+                    sys.stdout.write(message["stdout"])
+                elif "stderr" in message:
+                    sys.stdout.flush()
+                    sys.stderr.write(message["stderr"])
+                elif "stdin" in message:
+                    channel.send({"stdin" : sys.stdin.read()})
+                elif "exit" in message:
+                    return __class__.finish(message)
+        finally:
+            channel.close()
+
+
+    @staticmethod
+    def finish(message : dict) -> int:
+        """Writes statistics from the last message and returns return code"""
+
+        try:
+            for file, content in message["stats"].items():
+                try:
+                    with open(file, "w") as fStream:
+                        fStream.write(content)
+                except OSError:
+                    raise Error.FileError(OUPUT_FILE_ERROR, f"Nelze vytvořit/zapsat statistiky do souboru '{file}'!")
+        except Error.MException as e:
+            e.print()
+            return e.getCode()
+
+        return message["exit"]
+
+
+
+if __name__ == "__main__":
+    socketPath, args = DaemonClient.splitArgs(sys.argv)
+    returnCode = DaemonClient.run(socketPath, args)
+
+    sys.stdout.flush()
+    sys.exit(returnCode)
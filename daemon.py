@@ -0,0 +1,162 @@
+# IPP project 2. part - daemon of IPPcode22 interpreter
+# Author: Vojtech Dvorak (xdvora3o)
+
+"""Long-running interpreter, that serves jobs from clients (see client.py)
+over local Unix socket. Modules of the interpreter are imported only once
+and loaded programs are kept in memory (LRU), so the repeated runs of the same
+program skip parsing of XML and semantic analysis. Jobs are processed one by
+one.
+
+Usage:
+    python3 daemon.py [--socket="SOCKET"] [--programs=N]
+"""
+
+import contextlib
+import getopt
+import hashlib
+import io
+import os
+import socket
+import sys
+
+from collections import OrderedDict
+from bytecode import Bytecode
+from channel import Channel, ChannelReader, ChannelWriter
+from client import DaemonClient
+from errors import *
+from interpret import ConfigCreator, interpret, loadProgram
+from program import Program
+
+
+class InterpreterDaemon:
+    """Listens on Unix socket and performs interpretation of received jobs.
+    Job is given by arguments of interpret.py and working directory of client,
+    output of the interpretation is sent back as messages (see Channel)
+    """
+
+    DEFAULT_PROGRAMS = 64 # Maximal number of programs in memory
+
+
+    def __init__(self, socketPath : str, maxPrograms : int = DEFAULT_PROGRAMS):
+        self.socketPath = socketPath
+        self.maxPrograms = maxPrograms
+        self.programs = OrderedDict() # Linked programs by hashes of sources
+
+
+    def loadProgram(self, config : dict) -> Program:
+        """Returns program with source given in config (programs from XML
+        are taken from memory if it is possible)
+        """
+
+        if "source" in config and Bytecode.isBytecode(config["source"]):
+            return loadProgram(config)
+
+        source = config["sourceOpened"].read()
+        config["sourceOpened"].close()
+        config["sourceOpened"] = io.StringIO(source)
+
+        key = (hashlib.sha256(source.encode("utf-8", "surrogateescape")).digest(), "optimize" in config, "emitBytecode" in config)
+        if key in self.programs:
+            self.programs.move_to_end(key)
+            instructions, labelMap, slotNames, originalIndexes = self.programs[key]
+            return Program.fromLinked(config, instructions, labelMap, slotNames, originalIndexes)
+
+        program = loadProgram(config) # Instructions are not changed by execution, so they can be shared
+        self.programs[key] = (program.getInstructions(),) + program.getLinkage() + (program.getContext().originalIndexes,)
+        if len(self.programs) > self.maxPrograms:
+            self.programs.popitem(last=False)
+
+        return program
+
+
+    def runJob(self, channel : Channel, argv : list) -> tuple:
+        """Performs interpretation with given arguments (standard input is
+        requested from client only if it is read)
+
+        Returns:
+            (tuple): return code and rendered statistics
+        """
+
+        config = None
+        stats = {}
+
+        try:
+            sys.stdin = ChannelReader(channel, "stdin") # Standard input of client is sent only if it is read
+            config = ConfigCreator.parseArgs(argv)
+            ConfigCreator.checkConfig(config)
+        except SystemExit as e: # Invalid arguments or help
+            return (e.code if e.code.__class__ == int else EXIT_SUCCESS), stats
+
+        try:
+            returnCode = interpret(config, self.loadProgram, lambda statCol: stats.update(statCol.render()))
+        finally:
+            ConfigCreator.cleanUp(config)
+
+        return returnCode, stats
+
+
+    def handle(self, channel : Channel):
+        """Processes one job received through the channel"""
+
+        request = channel.recv()
+        if request == None:
+            return
+
+        stdout = ChannelWriter(channel, "stdout")
+        stderr = ChannelWriter(channel, "stderr")
+        stdin, cwd = sys.stdin, os.getcwd()
+
+        try:
+            os.chdir(request["cwd"]) # Relative paths are relative to client
+            with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+                returnCode, stats = self.runJob(channel, request["argv"])
+        except OSError as e:
+            stderr.write(f"Chyba démona: {e}\n")
+            returnCode, stats = INTERNAL_ERROR, {}
+        finally:
+            sys.stdin = stdin
+            os.chdir(cwd)
+
+        channel.send({"exit" : returnCode, "stats" : stats})
+
+
+    def serve(self):
+        """Accepts connections until the daemon is interrupted"""
+
+        if os.path.exists(self.socketPath):
+            os.remove(self.socketPath) # Socket left by previous daemon
+
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.socketPath)
+        server.listen()
+
+        try:
+            while True:
+                connection, _ = server.accept()
+                channel = Channel(connection)
+                try:
+                    self.handle(channel)
+                except (OSError, ValueError):
+                    pass # Client disconnected
+                finally:
+                    channel.close()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+            os.remove(self.socketPath)
+
+
+
+if __name__ == "__main__":
+    try:
+        opts, _ = getopt.getopt(sys.argv[1:], "", ["socket=", "programs="])
+    except getopt.GetoptError as error:
+        Error.exit(ARGUMENT_ERROR, f"Neznámý přepínač {error.opt}!")
+
+    options = dict(opts)
+    if not options.get("--programs", "1").isdigit():
+        Error.exit(ARGUMENT_ERROR, "Počet programů v paměti musí být nezáporné celé číslo!")
+
+    daemon = InterpreterDaemon(options.get("--socket", DaemonClient.DEFAULT_SOCKET), int(options.get("--programs", InterpreterDaemon.DEFAULT_PROGRAMS)))
+    daemon.serve()
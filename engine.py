@@ -0,0 +1,666 @@
+# IPP project 2. part
+# Author: Vojtech Dvorak (xdvora3o)
+
+"""Contains alternative (fast) execution engine of IPPcode22 programs. It
+compiles the list with instruction objects to flat list of closures with
+already resolved operands and jump targets (threaded code) and executes them
+in tight loop.
+"""
+
+from errors import *
+from lang import Op, Utils
+from program import Debug, Fused, Label, Operand, Program, Variable
+
+
+class FastEngine:
+    """Executes program by compiled closures. Every closure performs one
+    instruction and returns index of the next closure to be executed.
+    Observable behaviour (output, errors, statistics) is the same as in case
+    of Program.run
+
+    Labels are skipped during compilation (closures and jump targets point
+    directly to the first instruction after them), so they are not executed.
+    """
+
+    # Implementations of binary operations used by compiled instructions
+    BINARY = {
+        "ADD" : Utils.add,
+        "SUB" : Utils.sub,
+        "MUL" : Utils.mul,
+        "DIV" : Utils.div,
+        "IDIV" : Utils.idiv,
+        "LT" : Utils.lt,
+        "GT" : Utils.gt,
+        "EQ" : Utils.eq,
+        "AND" : Utils.conjunction,
+        "OR" : Utils.disjunction,
+    }
+
+
+    def __init__(self, program : Program):
+        self.program = program
+        self.ctx = program.getContext()
+        self.code = []
+
+        # Opcodes with specialized compilers, others are compiled generically
+        self.compilers = {
+            "LABEL" : self.compileLabel,
+            "MOVE" : self.compileMove,
+            "CALL" : self.compileCall,
+            "RETURN" : self.compileReturn,
+            "PUSHS" : self.compilePushs,
+            "POPS" : self.compilePops,
+            "ADDS" : self.compileStackBinary,
+            "SUBS" : self.compileStackBinary,
+            "MULS" : self.compileStackBinary,
+            "DIVS" : self.compileStackBinary,
+            "IDIVS" : self.compileStackBinary,
+            "LTS" : self.compileStackBinary,
+            "GTS" : self.compileStackBinary,
+            "EQS" : self.compileStackBinary,
+            "ANDS" : self.compileStackBinary,
+            "ORS" : self.compileStackBinary,
+            "ADD" : self.compileArithmetics,
+            "SUB" : self.compileArithmetics,
+            "MUL" : self.compileArithmetics,
+            "DIV" : self.compileArithmetics,
+            "IDIV" : self.compileArithmetics,
+            "LT" : self.compileComparing,
+            "GT" : self.compileComparing,
+            "EQ" : self.compileComparing,
+            "AND" : self.compileLogic,
+            "OR" : self.compileLogic,
+            "NOT" : self.compileLogic,
+            "WRITE" : self.compileWrite,
+            "JUMP" : self.compileJump,
+            "JUMPIFEQ" : self.compileCondJump,
+            "JUMPIFNEQ" : self.compileCondJump,
+            "JUMPIFEQS" : self.compileStackCondJump,
+            "JUMPIFNEQS" : self.compileStackCondJump,
+            "EXIT" : self.compileExit,
+            "CREATEFRAME" : self.compileFrameOperation,
+            "PUSHFRAME" : self.compileFrameOperation,
+            "POPFRAME" : self.compileFrameOperation,
+        }
+
+        # Specialized compilers of superinstructions by their handlers
+        self.fusedCompilers = {
+            Op.compareJump : self.compileCompareJump,
+            Op.stackOperation : self.compileStackOperation,
+            Op.newFrame : self.compileNewFrame,
+        }
+
+
+    def skipLabels(self, index : int) -> int:
+        """Returns index of the first instruction (from given index), that
+        is not label (or length of the instruction list)
+        """
+
+        instructions = self.program.getInstructions()
+        while index < len(instructions) and instructions[index].__class__ == Label:
+            index += 1
+
+        return index
+
+
+    def target(self, labelOperand : Operand) -> int:
+        """Returns index of closure, where execution continues after jump
+        to given label (or None if the label operand was not resolved)
+        """
+
+        target = labelOperand.getTarget()
+
+        return self.skipLabels(target + 1) if target != None else None
+
+
+    def reader(self, operand : Operand):
+        """Creates function without parameters returning data of given operand
+        (symbol). If the fast access fails, ProgramContext.getVar is used to
+        raise the right error
+        """
+
+        ctx = self.ctx
+        if operand.getType() == Operand.Type.LITERAL:
+            data = operand.getData()
+            return lambda: data
+
+        slot = operand.getSlot()
+        frameMark = operand.getFrameMark()
+
+        if frameMark is Variable.FrameM.GLOBAL:
+            gfSlots = ctx.gf.slots # Global frame exists all the time
+
+            def read():
+                data = gfSlots[slot] # Undefined and uninitialized variables are false
+                return data if data else ctx.getVar(operand)
+        elif frameMark is Variable.FrameM.LOCAL:
+            def read():
+                frame = ctx.lf
+                data = frame.slots[slot] if frame is not None else None
+                return data if data else ctx.getVar(operand)
+        else:
+            def read():
+                frame = ctx.tf
+                data = frame.slots[slot] if frame is not None else None
+                return data if data else ctx.getVar(operand)
+
+        return read
+
+
+    def writer(self, variable : Variable):
+        """Creates function with one parameter (data) that assigns data to
+        given variable (ProgramContext.setVar is used to raise errors)
+        """
+
+        ctx = self.ctx
+        slot = variable.getSlot()
+        frameMark = variable.getFrameMark()
+
+        if frameMark is Variable.FrameM.GLOBAL:
+            gfSlots = ctx.gf.slots
+
+            def write(data):
+                if gfSlots[slot] is not None:
+                    gfSlots[slot] = data
+                else:
+                    ctx.setVar(variable, data)
+        elif frameMark is Variable.FrameM.LOCAL:
+            def write(data):
+                frame = ctx.lf
+                if frame is not None and frame.slots[slot] is not None:
+                    frame.slots[slot] = data
+                else:
+                    ctx.setVar(variable, data)
+        else:
+            def write(data):
+                frame = ctx.tf
+                if frame is not None and frame.slots[slot] is not None:
+                    frame.slots[slot] = data
+                else:
+                    ctx.setVar(variable, data)
+
+        return write
+
+
+    def compileGeneric(self, inst, index : int):
+        """Compiles instruction, that does not change the control flow, by
+        calling its original implementation
+        """
+
+        ctx = self.ctx
+        action = inst.action
+        operands = inst.getOperands()
+        nxt = self.skipLabels(index + 1)
+
+        def step():
+            action(ctx, operands)
+            ctx.totalICounter += 1
+            return nxt
+
+        return step
+
+
+    def compileDebug(self, inst, index : int):
+        """Compiles debug instruction (it is not counted and it needs
+        the information about current instruction)
+        """
+
+        ctx = self.ctx
+        action = inst.action
+        operands = inst.getOperands()
+        nxt = self.skipLabels(index + 1)
+
+        def step():
+            ctx.currentInstruction = inst
+            action(ctx, operands)
+            return nxt
+
+        return step
+
+
+    def compileFused(self, inst, index : int):
+        """Compiles superinstruction by calling its handler, its last part
+        can be jump (it is detected by change of next instruction index).
+        Superinstructions set the current instruction to the executed part
+        (for error messages)
+        """
+
+        ctx = self.ctx
+        action = inst.action
+        parts = inst.getParts()
+        nxt = self.skipLabels(index + 1)
+
+        targets = [op for op in parts[-1].getOperands() if op.getType() == Operand.Type.LABEL]
+        target = self.target(targets[0]) if targets else None
+
+        def step():
+            ctx.nextInstructionIndex = index
+            action(ctx, parts)
+            ctx.totalICounter += 1
+            return nxt if ctx.nextInstructionIndex == index else target
+
+        return step
+
+
+    def compileLabel(self, inst, index : int):
+        nxt = self.skipLabels(index + 1)
+        return lambda: nxt
+
+
+    def compileMove(self, inst, index : int):
+        ctx = self.ctx
+        dst, src = inst.getOperands()
+        write = self.writer(dst)
+        read = self.reader(src)
+        nxt = self.skipLabels(index + 1)
+
+        def step():
+            write(read())
+            ctx.totalICounter += 1
+            return nxt
+
+        return step
+
+
+    def compileCall(self, inst, index : int):
+        ctx = self.ctx
+        push = ctx.callStack.push
+        label = inst.getOperands()[0].getContent()
+        target = self.target(inst.getOperands()[0])
+        funcStats = ctx.funcStats
+
+        def step():
+            push((index, ctx.currentFunction))
+            ctx.currentFunction = label
+            ctx.totalICounter += 1
+            return target
+
+        def stepWithStats():
+            push((index, ctx.currentFunction))
+            ctx.currentFunction = label
+            ctx.totalICounter += 1
+            funcStats.enter(label, ctx.totalICounter)
+            return target
+
+        return step if funcStats == None else stepWithStats
+
+
+    def compileReturn(self, inst, index : int):
+        ctx = self.ctx
+        pop = ctx.callStack.pop
+        funcStats = ctx.funcStats
+
+        def step():
+            retIndex, retFunc = pop()
+            ctx.currentFunction = retFunc
+            ctx.totalICounter += 1
+            return retIndex + 1
+
+        def stepWithStats():
+            retIndex, retFunc = pop()
+            ctx.currentFunction = retFunc
+            ctx.totalICounter += 1
+            funcStats.leave(ctx.totalICounter)
+            return retIndex + 1
+
+        return step if funcStats == None else stepWithStats
+
+
+    def compilePushs(self, inst, index : int):
+        ctx = self.ctx
+        push = ctx.dataStack.elements.append
+        read = self.reader(inst.getOperands()[0])
+        nxt = self.skipLabels(index + 1)
+
+        def step():
+            push(read())
+            ctx.totalICounter += 1
+            return nxt
+
+        return step
+
+
+    def compilePops(self, inst, index : int):
+        ctx = self.ctx
+        dataStack = ctx.dataStack
+        pop = dataStack.elements.pop
+        write = self.writer(inst.getOperands()[0])
+        nxt = self.skipLabels(index + 1)
+
+        def step():
+            try:
+                data = pop()
+            except IndexError:
+                raise dataStack.underflow()
+
+            write(data)
+            ctx.totalICounter += 1
+            return nxt
+
+        return step
+
+
+    def compileStackBinary(self, inst, index : int):
+        """Compiles binary stack instruction, two elements on the top of data
+        stack are replaced by the result in place
+        """
+
+        ctx = self.ctx
+        dataStack = ctx.dataStack
+        elements = dataStack.elements
+        pop = elements.pop
+        func = Utils.OPERATIONS[inst.getOpCode()]
+        nxt = self.skipLabels(index + 1)
+
+        def step():
+            try:
+                rOp = pop()
+                elements[-1] = func(ctx, elements[-1], rOp)
+            except IndexError:
+                raise dataStack.underflow()
+
+            ctx.totalICounter += 1
+            return nxt
+
+        return step
+
+
+    def compileBinary(self, inst, index : int, func):
+        """Compiles three adress instruction, whose result is computed by
+        given function (with the same parameters as Utils.add)
+        """
+
+        ctx = self.ctx
+        dst, lOp, rOp = inst.getOperands()
+        write = self.writer(dst)
+        readL = self.reader(lOp)
+        readR = self.reader(rOp)
+        nxt = self.skipLabels(index + 1)
+
+        def step():
+            write(func(ctx, readL(), readR()))
+            ctx.totalICounter += 1
+            return nxt
+
+        return step
+
+
+    def compileArithmetics(self, inst, index : int):
+        return self.compileBinary(inst, index, __class__.BINARY[inst.getOpCode()])
+
+
+    def compileComparing(self, inst, index : int):
+        return self.compileBinary(inst, index, __class__.BINARY[inst.getOpCode()])
+
+
+    def compileLogic(self, inst, index : int):
+        if inst.getOpCode() != "NOT":
+            return self.compileBinary(inst, index, __class__.BINARY[inst.getOpCode()])
+
+        ctx = self.ctx
+        dst, op = inst.getOperands()
+        write = self.writer(dst)
+        read = self.reader(op)
+        negation = Utils.negation
+        nxt = self.skipLabels(index + 1)
+
+        def step():
+            write(negation(ctx, read()))
+            ctx.totalICounter += 1
+            return nxt
+
+        return step
+
+
+    def compileWrite(self, inst, index : int):
+        ctx = self.ctx
+        read = self.reader(inst.getOperands()[0])
+        printable = Utils.getPrintableValue
+        output = ctx.output.write
+        nxt = self.skipLabels(index + 1)
+
+        def step():
+            output(printable(read()))
+            ctx.totalICounter += 1
+            return nxt
+
+        return step
+
+
+    def compileJump(self, inst, index : int):
+        ctx = self.ctx
+        target = self.target(inst.getOperands()[0])
+
+        def step():
+            ctx.totalICounter += 1
+            return target
+
+        return step
+
+
+    def compileCondJump(self, inst, index : int):
+        ctx = self.ctx
+        label, lOp, rOp = inst.getOperands()
+        readL = self.reader(lOp)
+        readR = self.reader(rOp)
+        negated = inst.getOpCode() == "JUMPIFNEQ"
+        equal = Utils.conditionEval
+        target = self.target(label)
+        nxt = self.skipLabels(index + 1)
+
+        def step():
+            jump = equal(ctx, readL(), readR()) != negated
+            ctx.totalICounter += 1
+            return target if jump else nxt
+
+        return step
+
+
+    def compileStackCondJump(self, inst, index : int):
+        ctx = self.ctx
+        dataStack = ctx.dataStack
+        pop = dataStack.elements.pop
+        negated = inst.getOpCode() == "JUMPIFNEQS"
+        equal = Utils.conditionEval
+        target = self.target(inst.getOperands()[0])
+        nxt = self.skipLabels(index + 1)
+
+        def step():
+            try:
+                rOp = pop()
+                lOp = pop()
+            except IndexError:
+                raise dataStack.underflow()
+
+            jump = equal(ctx, lOp, rOp) != negated
+            ctx.totalICounter += 1
+            return target if jump else nxt
+
+        return step
+
+
+    def compileFrameOperation(self, inst, index : int):
+        """Compiles instruction working with frames by calling the method of
+        context directly
+        """
+
+        ctx = self.ctx
+        operation = {
+            "CREATEFRAME" : ctx.newTempFrame,
+            "PUSHFRAME" : ctx.pushFrame,
+            "POPFRAME" : ctx.popFrame,
+        }[inst.getOpCode()]
+        nxt = self.skipLabels(index + 1)
+
+        def step():
+            operation()
+            ctx.totalICounter += 1
+            return nxt
+
+        return step
+
+
+    def compileCompareJump(self, inst, index : int):
+        """Compiles comparison followed by conditional jump with its result
+        (result is compared with bool literal directly, so the jump can not
+        fail)
+        """
+
+        ctx = self.ctx
+        compare, jump = inst.getParts()
+        dst, lOp, rOp = compare.getOperands()
+        label, *jumpOps = jump.getOperands()
+        func = __class__.BINARY[compare.getOpCode()]
+        write = self.writer(dst)
+        readL = self.reader(lOp)
+        readR = self.reader(rOp)
+        literal = [op for op in jumpOps if op.getType() == Operand.Type.LITERAL][0]
+        jumpOn = literal.getData().getValue() != (jump.getOpCode() == "JUMPIFNEQ")
+        target = self.target(label)
+        nxt = self.skipLabels(index + 1)
+
+        def step():
+            ctx.currentInstruction = compare
+            result = func(ctx, readL(), readR())
+            write(result)
+            ctx.currentInstruction = jump
+            ctx.totalICounter += 2
+            return target if result.value == jumpOn else nxt
+
+        return step
+
+
+    def compileStackOperation(self, inst, index : int):
+        ctx = self.ctx
+        lPush, rPush, operation, pop = inst.getParts()
+        readL = self.reader(lPush.getOperands()[0])
+        readR = self.reader(rPush.getOperands()[0])
+        func = Utils.OPERATIONS[operation.getOpCode()]
+        write = self.writer(pop.getOperands()[0])
+        nxt = self.skipLabels(index + 1)
+
+        def step():
+            ctx.currentInstruction = lPush
+            lOp = readL()
+            ctx.totalICounter += 1
+            ctx.currentInstruction = rPush
+            rOp = readR()
+            ctx.totalICounter += 1
+            ctx.currentInstruction = operation
+            result = func(ctx, lOp, rOp)
+            ctx.totalICounter += 1
+            ctx.currentInstruction = pop
+            write(result)
+            ctx.totalICounter += 1
+            return nxt
+
+        return step
+
+
+    def compileNewFrame(self, inst, index : int):
+        ctx = self.ctx
+        create, push = inst.getParts()
+        createFrame = ctx.newTempFrame
+        pushFrame = ctx.pushFrame
+        nxt = self.skipLabels(index + 1)
+
+        def step():
+            ctx.currentInstruction = create
+            createFrame()
+            ctx.totalICounter += 1
+            ctx.currentInstruction = push
+            pushFrame()
+            ctx.totalICounter += 1
+            return nxt
+
+        return step
+
+
+    def compileExit(self, inst, index : int):
+        ctx = self.ctx
+        action = inst.action
+        operands = inst.getOperands()
+        end = len(self.program.getInstructions())
+
+        def step():
+            action(ctx, operands) # Checks and sets the return code
+            ctx.totalICounter += 1
+            return end
+
+        return step
+
+
+    def isResolved(self, inst) -> bool:
+        """Checks whether all label operands of instruction were resolved by
+        linking (jumps to undefined labels are compiled generically, so
+        the original implementation raises the error when jump is performed)
+        """
+
+        for op in inst.getOperands():
+            if op.getType() == Operand.Type.LABEL and op.getTarget() == None:
+                return False
+
+        return True
+
+
+    def compile(self):
+        """Compiles instructions of the program to list of closures (program
+        must be already linked)
+        """
+
+        self.code = []
+        for index, inst in enumerate(self.program.getInstructions()):
+            compiler = self.compilers.get(inst.getOpCode())
+            if inst.__class__ == Fused:
+                compiler = self.fusedCompilers.get(inst.action) if self.isResolved(inst) else None
+                self.code.append(compiler(inst, index) if compiler else self.compileFused(inst, index))
+            elif compiler and self.isResolved(inst):
+                self.code.append(compiler(inst, index))
+            elif isinstance(inst, Debug):
+                self.code.append(self.compileDebug(inst, index))
+            else:
+                self.code.append(self.compileGeneric(inst, index))
+
+
+    def run(self):
+        """Performs the execution of the program by compiled closures"""
+
+        program = self.program
+        ctx = self.ctx
+
+        if not program.isLinked():
+            program.link()
+
+        program.reset()
+        if not self.code: # Compiled code is reused by the next runs
+            self.compile()
+
+        code = self.code
+        instructions = program.getInstructions()
+        statCol = program.getStatCollector()
+        end = len(code)
+        index = self.skipLabels(0)
+
+        try:
+            update = program.startHooks()
+            if update != None:
+                while index < end: # Slower loop with hook (statistics or trace)
+                    current = index
+                    ctx.currentInstruction = instructions[current]
+                    index = code[current]()
+                    update(ctx, current)
+            else:
+                while index < end:
+                    index = code[index]()
+
+        except Error.RuntimeError:
+            ctx.nextInstructionIndex = index # Failed instruction stays the next one (like in Program.execute)
+            if instructions[index].__class__ != Fused: # Superinstructions set the failed part
+                ctx.setInstruction(instructions[index]) # Failed instruction for the error msg
+            raise
+
+        finally:
+            statCol.stop(ctx)
+            ctx.flushOutput()
+
+        program.finish()
@@ -6,11 +6,23 @@ responsible for creating configuration dictionary and for cleaning up
 configuration
 """
 
+import contextlib
+import gc
 import getopt
+import json
+import os
+import pickle
+import signal
 import sys
+import time
 
 from os import F_OK, R_OK, W_OK, access
-from iparser import IParser, SAnalayzer
+from bytecode import Bytecode
+from cache import ProgramCache
+from engine import FastEngine
+from iparser import IParser, IStreamParser, SAnalayzer
+from optimizer import Fuser, Optimizer
+from profiler import Profiler
 from program import StatsCollector
 from errors import *
 
@@ -31,6 +43,12 @@ python3.8 [--input="VSTUPNI_SOUBOR"] [--source="SOUBOR_S_KODEM"] [MOŽNOSTI]
 MOŽNOSTI:
 --help      Vypíše stručnou nápovědu na standardní výstup
 
+-O          Program je před provedením optimalizován (vyhodnocení operací
+            s literály, odstranění nedosažitelného kódu, přesunů proměnné
+            do sebe sama a skoků na bezprostředně následující návěští);
+            statistiky insts a hot (i počet provedených instrukcí vypsaný
+            instrukcí BREAK) jsou počítány pro optimalizovaný program
+
 --source="" Obsahuje cestu k souboru se zdrojovou reprezentaci kódu v XML (v
             případě, že tento přepínač zadán není, je zdroj čten ze standardního vstupu 
             a musí být povinně uveden přepínač --input="")
@@ -39,6 +57,80 @@ MOŽNOSTI:
             případě, že tento přepínač zadán není, je vstupy čteny ze standardního 
             vstupu a musí být povinně uveden přepínač --source="")
 
+--stream    Zdrojový XML soubor je zpracováván proudově (bez vytváření DOM 
+            stromu), vhodné pro velmi rozsáhlé programy
+
+--engine="" Prováděcí jádro interpretu: classic (implicitní) nebo fast (program
+            je před spuštěním přeložen do seznamu předpřipravených funkcí)
+
+--output-buffer=N
+            Velikost bufferu standardního výstupu programu ve znacích (implicitně
+            65536, 0 vypíná bufferování); buffer je vyprázdněn při ukončení 
+            programu, před výpisem na standardní chybový výstup a před čtením
+            z interaktivního vstupu
+
+--cache=""  Adresář s perzistentní cache načtených programů; program, který
+            prošel sémantickou analýzou, je uložen do cache a při dalším
+            spuštění se stejným zdrojem (a stejnou verzí interpretu) je
+            načten přímo z ní bez zpracování XML (implicitně vypnuto)
+
+--cache-size=N
+            Maximální velikost cache v MiB (implicitně 256), při překročení
+            jsou odstraněny nejdéle nepoužité programy
+
+--emit-bytecode=""
+            Program není proveden, ale po sémantické analýze je zapsán do
+            zadaného souboru v binárním formátu (bytekódu); soubor s bytekódem
+            lze poté zadat v --source="" místo XML reprezentace (je načten
+            mapováním do paměti bez zpracování XML)
+
+--input-batch=""
+            Adresář se vstupními soubory nebo soubor se seznamem vstupních
+            souborů (jeden na řádek); program je načten jen jednou a proveden
+            postupně se všemi vstupy (místo --input=""), výstup a chybový
+            výstup každého běhu je zapsán do samostatných souborů, návratové
+            kódy a statistiky do souboru manifest.json
+
+--batch-output=""
+            Adresář pro výsledky dávkového zpracování (implicitně cesta
+            z --input-batch s příponou .out)
+
+--workers=N Počet pracovních procesů dávkového zpracování (implicitně 1, 0
+            znamená počet dostupných jader); program je načten jednou
+            v rodičovském procesu a sdílen s pracovními procesy
+
+--profile=""
+            Během provádění je program vzorkován (podle spotřebovaného času
+            procesoru) a do zadaného souboru je zapsán počet vzorků pro
+            každou prováděnou instrukci spolu s řetězcem volaných funkcí
+            (formát collapsed stacks, vstup např. pro flamegraph.pl)
+
+--profile-interval=N
+            Interval vzorkování v mikrosekundách (implicitně 1000)
+
+--histogram Statistika (za přepínačem --stats="") s počty provedení každé
+            instrukce (podle pořadí), každého operačního kódu a každého
+            základního bloku
+
+--histogram-format=""
+            Formát statistiky --histogram: csv (implicitní, sloupce kind,
+            key a count) nebo json
+
+--trace=""  Zaznamenává posledních N provedených instrukcí (v kruhovém bufferu
+            s konstantní velikostí), záznam je zapsán do zadaného souboru,
+            pokud program skončí běhovou chybou nebo instrukcí EXIT
+
+--trace-size=N
+            Počet zaznamenaných instrukcí (implicitně 4096)
+
+--trace-values
+            Záznam obsahuje také hodnoty zapsané instrukcemi do proměnných
+
+--funcs     Statistika (za přepínačem --stats="") pro každé volané návěští
+            ve formátu CSV: počet volání, počet provedených instrukcí včetně
+            a bez volaných funkcí, čas v sekundách a maximální hloubka
+            rekurze
+
 
 Návratové kódy:
 0\tÚspěšná interpretace
@@ -58,8 +150,9 @@ Návratové kódy:
 class ConfigCreator:
     """Parses arguments from command line and checks if they are valid"""
 
-    SHORT_O = ""
-    LONG_O = ["help", "source=", "input=", "stats=", "insts", "hot", "vars"]
+    SHORT_O = "O"
+    LONG_O = ["help", "source=", "input=", "stats=", "insts", "hot", "vars", "histogram", "histogram-format=", "funcs", "stream", "engine=", "output-buffer=", "cache=", "cache-size=", "emit-bytecode=", "input-batch=", "batch-output=", "workers=", "profile=", "profile-interval=", "trace=", "trace-size=", "trace-values"]
+    ENGINES = ["classic", "fast"]
 
 
     @staticmethod
@@ -99,16 +192,85 @@ class ConfigCreator:
                 iconfig[sKey][val] = {}
                 currentStatsFile = val
 
-            elif opt in ["--insts", "--hot", "--vars"]:
+            elif opt in ["--insts", "--hot", "--vars", "--histogram", "--funcs"]:
 
                 if currentStatsFile == None: # There must be --stats option to specify target file
                     Error.exit(ARGUMENT_ERROR, f"Přepínači {opt} musí předcházet přepínač --stats="" (zadejte --help pro nápovědu)!")
                 else:
                     iconfig[sKey][currentStatsFile][opt.lstrip('-')] = None
 
+            elif opt in ["--histogram-format"]:
+                if val not in StatsCollector.HISTOGRAM_FORMATS:
+                    Error.exit(ARGUMENT_ERROR, f"Neznámý formát histogramu '{val}' (povolené: {', '.join(StatsCollector.HISTOGRAM_FORMATS)})!")
+                iconfig["histogramFormat"] = val
+
             elif opt in ["--help"]:
                 iconfig["help"] = True
 
+            elif opt in ["-O"]:
+                iconfig["optimize"] = True
+
+            elif opt in ["--stream"]:
+                iconfig["stream"] = True
+
+            elif opt in ["--engine"]:
+                if val not in __class__.ENGINES:
+                    Error.exit(ARGUMENT_ERROR, f"Neznámý typ prováděcího jádra '{val}' (povolené: {', '.join(__class__.ENGINES)})!")
+                iconfig["engine"] = val
+
+            elif opt in ["--output-buffer"]:
+                if not val.isdigit():
+                    Error.exit(ARGUMENT_ERROR, f"Velikost výstupního bufferu musí být nezáporné celé číslo! Zadáno: '{val}'")
+                iconfig["outputBuffer"] = int(val)
+
+            elif opt in ["--cache"]:
+                if val == "":
+                    Error.exit(ARGUMENT_ERROR, "Přepínač --cache vyžaduje cestu k adresáři s cache!")
+                iconfig["cache"] = val
+
+            elif opt in ["--cache-size"]:
+                if not val.isdigit():
+                    Error.exit(ARGUMENT_ERROR, f"Velikost cache musí být nezáporné celé číslo! Zadáno: '{val}'")
+                iconfig["cacheSize"] = int(val)
+
+            elif opt in ["--emit-bytecode"]:
+                if val == "":
+                    Error.exit(ARGUMENT_ERROR, "Přepínač --emit-bytecode vyžaduje cestu k výstupnímu souboru!")
+                iconfig["emitBytecode"] = val
+
+            elif opt in ["--input-batch", "--batch-output"]:
+                if val == "":
+                    Error.exit(ARGUMENT_ERROR, f"Přepínač {opt} vyžaduje cestu!")
+                iconfig["inputBatch" if opt == "--input-batch" else "batchOutput"] = val
+
+            elif opt in ["--workers"]:
+                if not val.isdigit():
+                    Error.exit(ARGUMENT_ERROR, f"Počet pracovních procesů musí být nezáporné celé číslo! Zadáno: '{val}'")
+                iconfig["workers"] = int(val)
+
+            elif opt in ["--profile"]:
+                if val == "":
+                    Error.exit(ARGUMENT_ERROR, "Přepínač --profile vyžaduje cestu k výstupnímu souboru!")
+                iconfig["profile"] = val
+
+            elif opt in ["--profile-interval"]:
+                if not val.isdigit() or int(val) == 0:
+                    Error.exit(ARGUMENT_ERROR, f"Interval vzorkování musí být kladné celé číslo! Zadáno: '{val}'")
+                iconfig["profileInterval"] = int(val)
+
+            elif opt in ["--trace"]:
+                if val == "":
+                    Error.exit(ARGUMENT_ERROR, "Přepínač --trace vyžaduje cestu k výstupnímu souboru!")
+                iconfig["trace"] = val
+
+            elif opt in ["--trace-size"]:
+                if not val.isdigit() or int(val) == 0:
+                    Error.exit(ARGUMENT_ERROR, f"Velikost záznamu provádění musí být kladné celé číslo! Zadáno: '{val}'")
+                iconfig["traceSize"] = int(val)
+
+            elif opt in ["--trace-values"]:
+                iconfig["traceValues"] = True
+
             else:
                 Error.exit(ARGUMENT_ERROR, f"Chybný přepínač {opt} (zadejte --help pro nápovědu)!")
 
@@ -135,7 +297,16 @@ class ConfigCreator:
         else:
             config["sourceOpened"] = sys.stdin
 
-        if "input" not in config and "source" not in config:
+        if "inputBatch" in config and "input" in config:
+            Error.exit(ARGUMENT_ERROR, "Přepínače --input-batch a --input nelze kombinovat!")
+
+        if "profile" in config and "inputBatch" in config:
+            Error.exit(ARGUMENT_ERROR, "Přepínače --profile a --input-batch nelze kombinovat!")
+
+        if "profile" in config and not Profiler.isSupported():
+            Error.exit(ARGUMENT_ERROR, "Profilování není na této platformě podporováno!")
+
+        if "input" not in config and "inputBatch" not in config and "source" not in config:
             Error.exit(ARGUMENT_ERROR, "Chybějící parametry skriptu! Musí být zadán alespoň jeden z parametrů --source=FILE nebo --input=FILE!")
 
     @staticmethod
@@ -148,35 +319,318 @@ class ConfigCreator:
             config["sourceOpened"].close()
 
 
-# Main body of interpreter
 
-config = ConfigCreator.parseArgs(sys.argv) # Parsing arguments of the script
-ConfigCreator.checkConfig(config) 
+class BatchRunner:
+    """Runs one loaded program with many inputs (see --input-batch). Context
+    of the program is reset before every run, output and error output of
+    runs are written to separate files, return codes and statistics to the 
+    manifest
 
-interpretParser = IParser(config)
-semanticChecker = SAnalayzer()
+    Inputs can be processed by forked worker processes (see --workers), 
+    loaded program is shared with them by copy-on-write pages
+    """
 
-returnCode = EXIT_SUCCESS  # Imlicit return code if everything runs correctly
+    MANIFEST = "manifest.json"
+    OUTPUT_SUFFIX = ".out"
 
-try:
-    program = interpretParser.parse()
-    semanticChecker.checkSemantics(program)
-    program.run()
-    program.getStatCollector().report()
-except Error.MException as e:
-    e.print()
-    returnCode = e.getCode()
 
-except Exception as e:
-    Error.printGeneral(e)
-    returnCode = INTERNAL_ERROR
+    def __init__(self, config : dict):
+        self.config = config
+        self.outputDir = config.get("batchOutput", config["inputBatch"].rstrip(os.sep) + __class__.OUTPUT_SUFFIX)
+        self.workers = config.get("workers", 1) or len(os.sched_getaffinity(0))
 
-else:
-    programReturnCode = program.getContext().getReturnCode()
-    if programReturnCode != None:
-        returnCode = programReturnCode
 
-finally:
-    ConfigCreator.cleanUp(config) # Freeing resources
-    sys.exit(returnCode)
+    @staticmethod
+    def listInputs(batch : str) -> list:
+        """Returns paths to input files (all files in directory sorted by
+        names or paths from list file, one per line)
+        """
+
+        try:
+            if os.path.isdir(batch):
+                return sorted(e.path for e in os.scandir(batch) if e.is_file())
+
+            with open(batch) as listFile:
+                return [line.strip() for line in listFile if line.strip()]
+        except OSError:
+            raise Error.FileError(INPUT_FILE_ERROR, f"Chyba při čtení dávky vstupů '{batch}'!")
+
+
+    def getPaths(self, index : int) -> tuple:
+        """Returns names of files with output and error output of run"""
+
+        return f"{index:05d}.stdout", f"{index:05d}.stderr"
+
+
+    @staticmethod
+    def exitCode(status : int) -> int:
+        """Converts status returned by waitpid to exit code of the process
+        (negative number of signal, if the process was killed)
+        """
+
+        if hasattr(os, "waitstatus_to_exitcode"): # Python 3.9+
+            return os.waitstatus_to_exitcode(status)
+
+        return os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+
+
+    def runInput(self, engine, program, index : int, inputPath : str) -> dict:
+        """Runs program with one input and returns its record for manifest"""
+
+        stdoutName, stderrName = self.getPaths(index)
+        stats = {}
+
+        with open(os.path.join(self.outputDir, stdoutName), "w") as stdout, \
+            open(os.path.join(self.outputDir, stderrName), "w") as stderr, \
+            contextlib.redirect_stderr(stderr):
+
+            try:
+                input = open(inputPath)
+            except OSError:
+                Error.print(f"Chyba při otevírání souboru '{inputPath}' pro čtení!")
+                returnCode = INPUT_FILE_ERROR
+            else:
+                with input:
+                    program.getContext().reset(input, stdout)
+                    returnCode = runEngine(engine, program, lambda statCol: stats.update(statCol.render()))
+                    program.getContext().output.setStream(sys.stdout) # File with output is closed
+
+        return {"input" : inputPath, "exit" : returnCode, "stdout" : stdoutName, "stderr" : stderrName, "stats" : stats}
+
+
+    def runParallel(self, engine, program, inputs : list) -> list:
+        """Runs program with inputs in forked worker processes (worker k
+        processes inputs k, k + N, k + 2N...) and returns records of runs
+        in the order of inputs
+        """
+
+        workers = [] # Pairs (pid, read end of pipe) of workers, that were not reaped yet
+        count = min(self.workers, len(inputs))
 
+        sys.stdout.flush()
+        gc.freeze() # Loaded program is not traversed by GC in workers, so its pages stay shared
+
+        try:
+            for worker in range(count):
+                readFd, writeFd = os.pipe()
+                pid = os.fork()
+                if pid == 0:
+                    exitCode = 1
+                    try:
+                        os.close(readFd)
+                        indexes = range(worker, len(inputs), count)
+                        results = [self.runInput(engine, program, i, inputs[i]) for i in indexes]
+
+                        with os.fdopen(writeFd, "wb") as w:
+                            pickle.dump(results, w)
+                        exitCode = 0
+                    finally:
+                        os._exit(exitCode) # Worker must never continue in the code of parent
+
+                os.close(writeFd)
+                workers.append((pid, readFd))
+
+            partial = []
+            while workers:
+                pid, readFd = workers.pop(0)
+                try:
+                    with os.fdopen(readFd, "rb") as r:
+                        data = r.read()
+                finally:
+                    _, status = os.waitpid(pid, 0)
+
+                if __class__.exitCode(status) != 0 or not data:
+                    raise Error.InternalError(INTERNAL_ERROR, "Pracovní proces dávkového zpracování selhal!")
+
+                partial.append(pickle.loads(data))
+        finally:
+            for pid, readFd in workers: # Batch failed, remaining workers are stopped, so they do not write outputs anymore
+                os.close(readFd)
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+
+                os.waitpid(pid, 0)
+
+            gc.unfreeze()
+
+        return [partial[i % count][i // count] for i in range(len(inputs))]
+
+
+    def run(self, program) -> int:
+        """Runs program with all inputs of batch, writes the manifest and
+        prints throughput of runs
+
+        Returns:
+            (int): return code of the interpreter
+        """
+
+        inputs = __class__.listInputs(self.config["inputBatch"])
+        engine = FastEngine(program) if self.config.get("engine") == "fast" else program
+
+        try:
+            os.makedirs(self.outputDir, exist_ok=True)
+
+            start = time.perf_counter()
+            if self.workers > 1 and len(inputs) > 1:
+                results = self.runParallel(engine, program, inputs)
+            else:
+                results = [self.runInput(engine, program, i, path) for i, path in enumerate(inputs)]
+            elapsed = time.perf_counter() - start
+
+            throughput = len(results) / elapsed if elapsed > 0 else 0.0
+            manifest = {
+                "runs" : len(results),
+                "seconds" : elapsed,
+                "runsPerSecond" : throughput,
+                "results" : results,
+            }
+
+            with open(os.path.join(self.outputDir, __class__.MANIFEST), "w") as f:
+                json.dump(manifest, f, indent=1)
+        except OSError:
+            raise Error.FileError(OUPUT_FILE_ERROR, f"Nelze zapsat výsledky dávky do adresáře '{self.outputDir}'!")
+
+        print(f"Provedeno {len(results)} běhů za {elapsed:.3f} s ({throughput:.1f} běhů/s)")
+
+        return EXIT_SUCCESS
+
+
+
+def loadProgram(config : dict):
+    """Loads program given by config (from bytecode, from cache or from XML
+    representation, that is checked by semantic analysis), optimizes it
+    if it is required and replaces common sequences by superinstructions
+    """
+
+    program = None
+    isBytecode = "source" in config and Bytecode.isBytecode(config["source"])
+    if isBytecode:
+        program = Bytecode.load(config, config["source"])
+    elif "cache" in config:
+        cache = ProgramCache(config["cache"], config.get("cacheSize", ProgramCache.DEFAULT_SIZE))
+        program = cache.load(config)
+
+    if program == None:
+        interpretParser = IStreamParser(config) if "stream" in config else IParser(config)
+        program = interpretParser.parse()
+        SAnalayzer().checkSemantics(program)
+
+        if "cache" in config:
+            cache.store(program) # Cache contains unoptimized programs
+
+    if "optimize" in config:
+        Optimizer(program).optimize()
+
+    # Superinstructions are not part of bytecode format (and instructions of
+    # bytecode are decoded lazily, so they are not fused)
+    if "emitBytecode" not in config and not isBytecode:
+        Fuser(program).fuse()
+
+    return program
+
+
+def runEngine(engine, program, report = StatsCollector.report) -> int:
+    """Runs linked program by given engine (program itself or FastEngine),
+    errors are printed to the standard error output
+
+    Returns:
+        (int): return code of the execution
+    """
+
+    returnCode = EXIT_SUCCESS  # Imlicit return code if everything runs correctly
+    failed = None # Instruction, that raised runtime error
+
+    try:
+        engine.run()
+        report(program.getStatCollector())
+    except Error.MException as e:
+        e.print()
+        returnCode = e.getCode()
+        if isinstance(e, Error.RuntimeError):
+            failed = program.getContext().getInstruction()
+
+    except Exception as e:
+        Error.printGeneral(e)
+        returnCode = INTERNAL_ERROR
+
+    else:
+        programReturnCode = program.getContext().getReturnCode()
+        if programReturnCode != None:
+            returnCode = programReturnCode
+
+    trace = program.getTrace() # Trace is written after runtime error or EXIT
+    if trace != None and (failed != None or program.getContext().getReturnCode() != None):
+        try:
+            trace.dump(program.getContext(), failed)
+        except Error.MException as e:
+            e.print()
+            returnCode = e.getCode()
+
+    return returnCode
+
+
+def interpret(config : dict, load = loadProgram, report = StatsCollector.report) -> int:
+    """Loads and runs program given by checked config, errors are printed to
+    the standard error output
+
+    Args:
+        config (dict): configuration created by ConfigCreator
+        load (function): function loading program from config
+        report (function): function called with stats collector after
+            successful execution
+
+    Returns:
+        (int): return code of the interpretation
+    """
+
+    try:
+        program = load(config)
+
+        if "emitBytecode" in config:
+            Bytecode.emit(program, config["emitBytecode"])
+            return EXIT_SUCCESS
+
+        if "inputBatch" in config:
+            return BatchRunner(config).run(program)
+    except Error.MException as e:
+        e.print()
+        return e.getCode()
+
+    except Exception as e:
+        Error.printGeneral(e)
+        return INTERNAL_ERROR
+
+    engine = FastEngine(program) if config.get("engine") == "fast" else program
+    if "profile" not in config:
+        return runEngine(engine, program, report)
+
+    profiler = Profiler(program, config.get("profileInterval", Profiler.DEFAULT_INTERVAL))
+    profiler.start()
+    try:
+        returnCode = runEngine(engine, program, report)
+    finally:
+        profiler.stop()
+
+    try:
+        profiler.write(config["profile"]) # Profile is written also after runtime error
+    except Error.MException as e:
+        e.print()
+        return e.getCode()
+
+    return returnCode
+
+
+# Main body of interpreter
+
+if __name__ == "__main__":
+    config = ConfigCreator.parseArgs(sys.argv) # Parsing arguments of the script
+    ConfigCreator.checkConfig(config) 
+
+    try:
+        returnCode = interpret(config)
+    finally:
+        ConfigCreator.cleanUp(config) # Freeing resources
+
+    sys.exit(returnCode)
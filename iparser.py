@@ -11,7 +11,7 @@ import re
 
 from errors import *
 from program import Data, Debug, Executable, Instruction, Label, Literal, Operand, Type
-from program import Program, ProgramContext, Variable
+from program import Program, ProgramContext, Target, Variable
 from lang import Lang
 
 
@@ -25,6 +25,7 @@ class SAnalayzer:
         """Resets semantic analyzer"""
 
         self.jumpTargets = {}
+        self.globalVars = set()
         self.fakeCtx = ProgramContext()
 
 
@@ -38,26 +39,32 @@ class SAnalayzer:
             operands (list): list of operands of instruction
         """
 
-        opcode = inst.getOpCode()
+        descriptor = Lang.getDescriptor(inst.getOpCode())
         order = inst.getOrder()
         
         leadingOp = None
         if operands:
             leadingOp = operands[0]
 
-        if Lang.isLabelInstrucion(opcode):
+        if descriptor.isLabel:
             self.fakeCtx.addLabel(leadingOp.getContent(), index)
-        elif Lang.isJumpInstruction(opcode):
+        elif descriptor.isJump:
             self.jumpTargets[leadingOp.getContent()] = order
-        elif Lang.isNewVarInstruction(opcode):
-            if leadingOp.getFrameMark() == Variable.FrameM.GLOBAL:
-                self.fakeCtx.addVar(leadingOp)
+        elif descriptor.isNewVar:
+            frameMark = leadingOp.getFrameMark()
+            name = leadingOp.getName()
+            if frameMark == Variable.FrameM.GLOBAL:
+                if name in self.globalVars:
+                    raise Error.RuntimeError(SEMANTIC_ERROR, f"Redefinice proměnné {name} v rámci {frameMark.name}!")
+
+                self.globalVars.add(name)
 
 
     def checkSemantics(self, program : Program):
         """Performas static semantic analysis. It can found basic semantic
         errors without executing program such as redefinition of variable
-        in global frame, jump to non-existing label...
+        in global frame, jump to non-existing label... If the program is
+        correct, it is also linked by label map created during analysis
         
         Aargs:
             program (Program): Program object to be analyzed
@@ -68,22 +75,25 @@ class SAnalayzer:
             opcode = i.getOpCode()
             order = i.getOrder()
             operands = i.getOperands()
-            expOperandSymbols = Lang.getOperandTypes(opcode)
+            descriptor = Lang.getDescriptor(opcode)
+            expOperandSymbols = descriptor.operands
 
             nOperands = len(operands)
-            nExpOp = len(expOperandSymbols)
+            nExpOp = descriptor.arity
             if nOperands != nExpOp: # Check amount of arguments of instruction
                 raise Error.SemanticError(BAD_XML, f"Instrukce {opcode} (o. {order}) očekává {nExpOp} operandů, nalezeno {nOperands}!")
 
-            for index, op in enumerate(operands): # Check compatibility of operands
-                if not Lang.isOperandCompatible(op, expOperandSymbols[index]):
-                    raise Error.SemanticError(SEMANTIC_ERROR, f"Nekompatibilní typ operandu instrukce {opcode}(o. {order})! očekáván {expOperandSymbols[index]}, nalezen {Lang.op2Str(op)}")
+            for opIndex, op in enumerate(operands): # Check compatibility of operands
+                if not Lang.isOperandCompatible(op, expOperandSymbols[opIndex]):
+                    raise Error.SemanticError(SEMANTIC_ERROR, f"Nekompatibilní typ operandu instrukce {opcode}(o. {order})! očekáván {expOperandSymbols[opIndex]}, nalezen {Lang.op2Str(op)}")
         
             self.resolveSAction(i, index, operands)
 
         for jt in self.jumpTargets: 
             if jt not in self.fakeCtx.getLabelMap():
                 raise Error.SemanticError(SEMANTIC_ERROR, "Skok na nedefinované návěští '{jt}'! (o. {self.jumpTargets[jt]})")
+
+        program.link(self.fakeCtx.getLabelMap()) # Label map is complete, so it can be used for linking
             
 
 
@@ -96,6 +106,8 @@ class IParser:
     INSTR_TAG = "instruction"
     ARG_TAG_RE = "arg(\d+)"
 
+    TAG_REGEX = {} # Cache with compiled regular expressions for tag names
+
     ORDER_ATTR = "order"
     OPCODE_ATTR = "opcode"
     TYPE_ATTR = "type"
@@ -132,6 +144,20 @@ class IParser:
             raise Error.XMLError(BAD_XML, f"Neočekáváný prázdný atribut {attrName}!") 
 
 
+    @staticmethod
+    def getTagRegex(tagNameRE : str) -> re.Pattern:
+        """Returns compiled regular expression, that matches whole tag name
+        (it is compiled only once)
+        """
+
+        regex = __class__.TAG_REGEX.get(tagNameRE)
+        if regex == None:
+            regex = re.compile("^" + tagNameRE + "$")
+            __class__.TAG_REGEX[tagNameRE] = regex
+
+        return regex
+
+
     @staticmethod
     def safeGetChildren(childTagNameRE : str, parentNode : xml.Node) -> list:
         """Gets children of given XML element or raises exception
@@ -147,6 +173,7 @@ class IParser:
 
         children = []
         xmlNodes = parentNode.childNodes
+        tagRegex = __class__.getTagRegex(childTagNameRE)
 
         for n in xmlNodes:
             if n.nodeType == xml.Node.TEXT_NODE and n.nodeValue.strip() == "":
@@ -154,7 +181,7 @@ class IParser:
             elif n.nodeType == xml.Node.COMMENT_NODE:
                 continue
             elif n.nodeType == xml.Node.ELEMENT_NODE:
-                if re.search("^" + childTagNameRE + "$", n.tagName):
+                if tagRegex.search(n.tagName):
                     children.append(n)
                 else:
                     raise Error.XMLError(BAD_XML, f"Neočekávaný XML tag {n.tagName}!")
@@ -215,7 +242,7 @@ class IParser:
     def createOperand(number : int, content : str, type):
         """Operand object factory, chooses the right subclass of Operand"""
 
-        if type in Data.Type:
+        if type.__class__ == Data.Type:
             value = Lang.str2value(type, content) # Getting corresponding value
             return Literal(number, content, type, value)
 
@@ -228,6 +255,9 @@ class IParser:
             convType = Lang.getType(content)
             return Type(number, content, convType)
 
+        elif type == Operand.Type.LABEL:
+            return Target(number, content)
+
         else:
             return Operand(number, type, content)
 
@@ -243,31 +273,29 @@ class IParser:
 
 
     @staticmethod
-    def getOperands(opcode : str, order : int, instruction : xml.Node):
-        """Gets operands of instruction in XML representation and converts it
-        to list with operands objects
+    def convertOperands(opcode : str, order : int, xmlOps : list):
+        """Converts arguments of instruction to list with operand objects
 
         Args:
             opcode (str): operational code of instruction
             order (int): order number of instruction
-            instruction (xml.Node): XML representation of instruction
+            xmlOps (list): list of pairs with XML element of argument and its
+                data (text inside the element)
 
         Returns:
             (list): list with operand objects
         """
 
-        xmlOps = __class__.safeGetChildren(__class__.ARG_TAG_RE, instruction)
         operands = []
-        for op in xmlOps:
-            tagName = op.tagName
-            opNumber = int(re.sub(__class__.ARG_TAG_RE, r"\1", tagName))
+        argTagRegex = __class__.getTagRegex(__class__.ARG_TAG_RE)
+        for op, content in xmlOps:
+            opNumber = int(argTagRegex.search(op.tagName).group(1)) # Tag names are already checked
 
             xmlType = __class__.safeGetAttribute(__class__.TYPE_ATTR, op, False)
             if not Lang.isType(xmlType):
                 raise Error.XMLError(BAD_XML, f"Neznámý typ operandu '{xmlType}' instrukce {opcode} (o.: {order})!")
 
             type = Lang.getType(xmlType)
-            content = __class__.safeGetData(op, canBeEmpty=True)
             if not Lang.isValidFormated(type, content):
                 raise Error.XMLError(BAD_XML, f"Špatný formát operandu '{content}' instrukce {opcode} (o.: {str(order)})!")
 
@@ -279,18 +307,39 @@ class IParser:
         return operands
 
 
+    @staticmethod
+    def getOperands(opcode : str, order : int, instruction : xml.Node):
+        """Gets operands of instruction in XML representation and converts it
+        to list with operands objects
+
+        Args:
+            opcode (str): operational code of instruction
+            order (int): order number of instruction
+            instruction (xml.Node): XML representation of instruction
+
+        Returns:
+            (list): list with operand objects
+        """
+
+        xmlOps = __class__.safeGetChildren(__class__.ARG_TAG_RE, instruction)
+        xmlOps = [(op, __class__.safeGetData(op, canBeEmpty=True)) for op in xmlOps]
+
+        return __class__.convertOperands(opcode, order, xmlOps)
+
+
     @staticmethod
     def createInstruction(opcode : str, order : int, ops):
         """Factory for making instruction objects, chooses the right subclass"""
         
-        uOpcode = opcode.upper()
+        descriptor = Lang.getDescriptor(opcode)
+        uOpcode = descriptor.opcode
 
-        if Lang.isLabelInstrucion(opcode):
+        if descriptor.isLabel:
             return Label(uOpcode, order, ops)
-        elif Lang.isDebugInstruction(opcode):
-            return Debug(uOpcode, order, ops, Lang.getFunction(uOpcode))
+        elif descriptor.isDebug:
+            return Debug(uOpcode, order, ops, descriptor.handler)
         else:
-            return Executable(uOpcode, order, ops, Lang.getFunction(uOpcode))
+            return Executable(uOpcode, order, ops, Lang.getHandler(uOpcode, ops))
 
 
     @staticmethod
@@ -305,13 +354,14 @@ class IParser:
             (list): Sorted list with instruction objects
         """
 
-        instructionSeq.sort(key=__class__.safeGetOrder)
+        # Order numbers are obtained only once (and used as sort keys)
+        orderedSeq = [(__class__.safeGetOrder(i), i) for i in instructionSeq]
+        orderedSeq.sort(key=lambda pair: pair[0])
 
         lastOrder = None
         converted = []
-        for i in instructionSeq:
+        for order, i in orderedSeq:
             opcode = __class__.safeGetAttribute(__class__.OPCODE_ATTR, i, False)
-            order = __class__.safeGetOrder(i)
 
             if lastOrder == order:
                 raise Error.XMLError(BAD_XML, f"Nalezena duplicita atributu order! (u instrukce {opcode})!")
@@ -358,14 +408,14 @@ class IParser:
         """Creates program object
         
         Args:
-            instructions (list): list of instructions, that 
-                should be executed in runtime
+            instructions (list): list of instructions sorted by their order
+                numbers, that should be executed in runtime
 
         Returns:
             (Program): program object with contaning given instructions
         """
 
-        return Program(self.config, instructions)
+        return Program.fromSorted(self.config, instructions)
 
 
     def parse(self):
@@ -385,4 +435,328 @@ class IParser:
 
         program = self.createProgram(instructions)
 
+        return program
+
+
+
+def safeHandler(handler):
+    """Decorator of expat handlers. Stores the first XMLError raised by
+    handler and skips all following events (except of checking 
+    well-formedness that is done by expat)
+    """
+
+    def wrapper(self, *args):
+        if self.error:
+            return
+
+        try:
+            handler(self, *args)
+        except Error.XMLError as e:
+            self.error = e
+
+    return wrapper
+
+
+
+class XMLElement:
+    """Lightweight substitute of XML element used by IStreamParser. It offers
+    the same interface for reading attributes as xml.dom.minidom elements, so
+    the static methods of IParser can be used also for streamed elements
+    """
+
+    def __init__(self, tagName : str, attributes : dict):
+        self.tagName = tagName
+        self.attributes = attributes
+
+
+    def hasAttribute(self, attrName : str) -> bool:
+        return attrName in self.attributes
+
+
+    def getAttribute(self, attrName : str) -> str:
+        return self.attributes.get(attrName, "")
+
+
+
+class IStreamParser(IParser):
+    """Parses input XML representation in streaming mode. Instead of building
+    the whole DOM tree it uses expat handlers and creates instruction objects
+    one element at a time (so the memory consumption is proportional to the
+    program and not to its XML representation).
+
+    The checks are the same as in the IParser (and they have the same return
+    codes), but the errors are found in the document order. Because of it, the 
+    first found error of the input structure is stored and raised after the
+    whole document was processed (not-wellformed XML has to be reported
+    always, even if it is located after the bad XML structure).
+    """
+
+    BUFFER_SIZE = 1 << 16 # Size of chunks, that are given to expat parser
+
+    # Kinds of XML nodes, that are distinguished inside the argument elements
+    TEXT_NODE = "#text"
+    CDATA_NODE = "#cdata-section"
+    COMMENT_NODE = "#comment"
+    ELEMENT_NODE = "#element"
+    PI_NODE = "#pi"
+
+    # Depths of elements in the tree of XML document
+    ROOT_DEPTH = 1
+    INSTR_DEPTH = 2
+    ARG_DEPTH = 3
+
+    def __init__(self, config : dict):
+        super().__init__(config)
+        self.reset()
+
+
+    def reset(self):
+        """Resets state of the stream parser"""
+
+        self.error = None
+        self.depth = 0
+        self.inCdata = False
+        self.pendingText = []
+
+        self.instructions = []
+        self.instrOpcode = None
+        self.instrOrder = None
+        self.xmlOps = []
+
+        self.argElement = None
+        self.argNodes = 0
+        self.argFirstNode = None
+        self.argLastNode = None
+        self.argText = []
+
+
+    def checkPendingText(self):
+        """Checks text collected between elements (on the root and instruction
+        level only whitespaces are tolerated)
+        """
+
+        if self.pendingText:
+            text = "".join(self.pendingText)
+            self.pendingText = []
+
+            if text.strip() != "":
+                raise Error.XMLError(BAD_XML, f"Neočekávaný XML prvek typu {__class__.TEXT_NODE}!")
+
+
+    def addArgNode(self, kind : str):
+        """Registers new child node of currently processed argument element"""
+
+        if kind == __class__.TEXT_NODE and self.argLastNode == __class__.TEXT_NODE:
+            return # Adjacent texts are merged into one text node
+
+        self.argNodes += 1
+        self.argLastNode = kind
+        if self.argFirstNode == None:
+            self.argFirstNode = kind
+        elif kind == __class__.COMMENT_NODE:
+            raise Error.XMLError(BAD_XML, f"Očekáván POUZE text uvnitř tagu {self.argElement.tagName}, nalezen jiný obsah!")
+
+
+    def getArgData(self) -> str:
+        """Returns data of the argument element with the same rules as 
+        IParser.safeGetData (with tolerated empty data)
+        """
+
+        if self.argFirstNode == None:
+            return ""
+        elif self.argFirstNode != __class__.TEXT_NODE:
+            raise Error.XMLError(BAD_XML, f"Očekáván text uvnitř tagu {self.argElement.tagName}, nalezen jiný obsah!")
+
+        return "".join(self.argText).strip()
+
+
+    @safeHandler
+    def startElement(self, tagName : str, attributes : dict):
+        """Expat handler called at the start of every XML element"""
+
+        self.depth += 1
+        element = XMLElement(tagName, attributes)
+
+        if self.depth == __class__.ROOT_DEPTH:
+            if tagName != __class__.ROOT_TAG:
+                raise Error.XMLError(BAD_XML, f"Očekáván kořenový XML tag {__class__.ROOT_TAG}, nebyl nalezen!")
+
+            lang = __class__.safeGetAttribute(__class__.LANG_ATTR, element, False)
+            if lang.upper() == __class__.LANGUAGE.upper(): # Checking ippcode22 attribute (case insensitive)
+                raise Error.XMLError(BAD_XML, f"Neplatný obsah atributu '{__class__.LANG_ATTR}', očekáváno '{__class__.LANGUAGE}'!")
+
+        elif self.depth == __class__.INSTR_DEPTH:
+            self.checkPendingText()
+            if tagName != __class__.INSTR_TAG:
+                raise Error.XMLError(BAD_XML, f"Neočekávaný XML tag {tagName}!")
+
+            order = __class__.safeGetOrder(element)
+            opcode = __class__.safeGetAttribute(__class__.OPCODE_ATTR, element, False)
+            if not Lang.isInstruction(opcode):
+                raise Error.XMLError(BAD_XML, f"Neznámý operační kód '{opcode}'!")
+
+            self.instrOpcode = opcode
+            self.instrOrder = order
+            self.xmlOps = []
+
+        elif self.depth == __class__.ARG_DEPTH:
+            self.checkPendingText()
+            if not __class__.getTagRegex(__class__.ARG_TAG_RE).search(tagName):
+                raise Error.XMLError(BAD_XML, f"Neočekávaný XML tag {tagName}!")
+
+            self.argElement = element
+            self.argNodes = 0
+            self.argFirstNode = None
+            self.argLastNode = None
+            self.argText = []
+
+        elif self.depth == __class__.ARG_DEPTH + 1:
+            self.addArgNode(__class__.ELEMENT_NODE)
+
+
+    @safeHandler
+    def endElement(self, tagName : str):
+        """Expat handler called at the end of every XML element"""
+
+        if self.depth == __class__.ROOT_DEPTH:
+            self.checkPendingText()
+
+        elif self.depth == __class__.INSTR_DEPTH:
+            self.checkPendingText()
+
+            opcode = self.instrOpcode
+            order = self.instrOrder
+
+            operands = __class__.convertOperands(opcode, order, self.xmlOps)
+            self.instructions.append(__class__.createInstruction(opcode, order, operands))
+
+        elif self.depth == __class__.ARG_DEPTH:
+            self.xmlOps.append((self.argElement, self.getArgData()))
+
+        self.depth -= 1
+
+
+    @safeHandler
+    def characterData(self, data : str):
+        """Expat handler called for text (and content of CDATA sections)"""
+
+        if self.depth == __class__.ARG_DEPTH:
+            if self.inCdata:
+                return
+
+            self.addArgNode(__class__.TEXT_NODE)
+            if self.argNodes == 1:
+                self.argText.append(data)
+
+        elif self.depth in [__class__.ROOT_DEPTH, __class__.INSTR_DEPTH]:
+            self.pendingText.append(data)
+
+
+    @safeHandler
+    def startCdata(self):
+        """Expat handler called at the start of CDATA section"""
+
+        self.inCdata = True
+        if self.depth == __class__.ARG_DEPTH:
+            self.addArgNode(__class__.CDATA_NODE)
+        elif self.depth in [__class__.ROOT_DEPTH, __class__.INSTR_DEPTH]:
+            raise Error.XMLError(BAD_XML, f"Neočekávaný XML prvek typu {__class__.CDATA_NODE}!")
+
+
+    @safeHandler
+    def endCdata(self):
+        """Expat handler called at the end of CDATA section"""
+
+        self.inCdata = False
+
+
+    @safeHandler
+    def comment(self, data : str):
+        """Expat handler called for XML comments"""
+
+        if self.depth == __class__.ARG_DEPTH:
+            self.addArgNode(__class__.COMMENT_NODE)
+        elif self.depth in [__class__.ROOT_DEPTH, __class__.INSTR_DEPTH]:
+            self.checkPendingText()
+
+
+    @safeHandler
+    def processingInstruction(self, target : str, data : str):
+        """Expat handler called for XML processing instructions"""
+
+        if self.depth == __class__.ARG_DEPTH:
+            self.addArgNode(__class__.PI_NODE)
+        elif self.depth in [__class__.ROOT_DEPTH, __class__.INSTR_DEPTH]:
+            self.checkPendingText()
+            raise Error.XMLError(BAD_XML, f"Neočekávaný XML prvek typu {target}!")
+
+
+    @staticmethod
+    def sortInstructions(instructions : list) -> list:
+        """Sorts streamed instructions by their order numbers and checks
+        the duplicities of order attribute
+        """
+
+        instructions.sort(key=Instruction.getOrder)
+
+        lastOrder = None
+        for i in instructions:
+            if lastOrder == i.getOrder():
+                raise Error.XMLError(BAD_XML, f"Nalezena duplicita atributu order! (u instrukce {i.getOpCode()})!")
+
+            lastOrder = i.getOrder()
+
+        return instructions
+
+
+    def createExpatParser(self):
+        """Creates expat parser (with the same settings as xml.dom.minidom) 
+        and registers handlers of the stream parser to it
+        """
+
+        parser = expat.ParserCreate(namespace_separator=" ")
+        parser.buffer_text = True
+
+        parser.StartElementHandler = self.startElement
+        parser.EndElementHandler = self.endElement
+        parser.CharacterDataHandler = self.characterData
+        parser.StartCdataSectionHandler = self.startCdata
+        parser.EndCdataSectionHandler = self.endCdata
+        parser.CommentHandler = self.comment
+        parser.ProcessingInstructionHandler = self.processingInstruction
+
+        return parser
+
+
+    def parse(self):
+        """Parses XML source (specified in config dict.) in streaming mode
+        and creates corresponding program object
+        """
+
+        self.reset()
+        parser = self.createExpatParser()
+        source = self.config["sourceOpened"]
+
+        try:
+            while True:
+                chunk = source.read(__class__.BUFFER_SIZE)
+                if not chunk:
+                    break
+
+                parser.Parse(chunk, False)
+
+            parser.Parse("", True)
+        except expat.ExpatError as e:
+            raise Error.XMLError(NOT_WELLFORMED, f"Špatně formátovaný XML zdroj ({str(e.lineno)}, {e.offset})!")
+        except:
+            raise Error.XMLError(NOT_WELLFORMED)
+
+        if self.error:
+            raise self.error
+
+        instructions = __class__.sortInstructions(self.instructions)
+        self.instructions = []
+
+        program = self.createProgram(instructions)
+
         return program
\ No newline at end of file
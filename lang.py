@@ -11,87 +11,87 @@ for similar operation with same checks)
 
 import re
 from errors import *
-from program import Data, Literal, Operand, ProgramContext, Variable
+from program import Data, Literal, Operand, ProgramContext, Stack, Variable
 
 
 class Utils:
     """Contains static methods for simplfying implementations of instructions"""
 
+    ARITHMETIC_TYPES = [Data.Type.INT, Data.Type.FLOAT]
+
+
     @staticmethod
-    def arithmetics(ctx : ProgramContext, lOp : Data, rOp : Data, func : str = 'ADD') -> Data:
-        """Performs specified arithmetical operation and resturns Data
-        object with result or it raises exception
+    def checkArithmetics(ctx : ProgramContext, lOp : Data, rOp : Data):
+        """Checks types of operands of arithmetical operation (raises exception
+        if they are not compatible)
 
         Args:
             ctx (ProgramContext): current program context (for printing errors)
             lOp (Data): data of the left operand
             rOp (Data): data of the righ operand
-            func (str): function specifier it can be ADD|SUB|MULT|DIV|IDIV
         """
 
-        t = Data.Type
-        compTypes = [t.INT, t.FLOAT]
+        compTypes = __class__.ARITHMETIC_TYPES
         if lOp.getType() not in compTypes or rOp.getType() not in compTypes:
             raise Error.RuntimeError(BAD_TYPES, f"Aritmetické instrukce vyžadují operandy typu FLOAT nebo INT!", ctx)
 
         if lOp.getType() != rOp.getType():
             raise Error.RuntimeError(BAD_TYPES, f"Aritmetické instrukce vyžadují operandy stejného typu!", ctx)
 
-        result = None
-        if func == 'SUB':
-            result = lOp.getValue() - rOp.getValue()
 
-        elif func == 'MUL':
-            result = lOp.getValue() * rOp.getValue()
+    @staticmethod
+    def numeric(type : Data.Type, result) -> Data:
+        """Creates data object with the result of arithmetical operation"""
 
-        elif func == 'DIV':
-            if rOp.getValue() == 0.0:
-                raise Error.RuntimeError(BAD_VALUE, f"Dělení nulou!", ctx)
-            elif rOp.getType() != t.FLOAT or lOp.getType() != t.FLOAT:
-                raise Error.RuntimeError(BAD_TYPES, f"Instrukce DIV vyžaduje oba operandy typu FLOAT!", ctx)
-            result = lOp.getValue() / rOp.getValue()
+        if type == Data.Type.FLOAT:
+            return Data(type, result)
 
-        elif func == 'IDIV':
-            if rOp.getValue() == 0:
-                raise Error.RuntimeError(BAD_VALUE, f"Integer division by ZERO!", ctx)
-            elif rOp.getType() != t.INT or lOp.getType() != t.INT:
-                raise Error.RuntimeError(BAD_TYPES, f"Instrukce DIV vyžaduje oba operandy typu INT!", ctx)
+        return Data.ofInt(result)
 
-            result = lOp.getValue() // rOp.getValue()
 
-        else:
-            result = lOp.getValue() + rOp.getValue()
-
-        resultType = t.INT
-        if lOp.getType() == t.FLOAT or rOp.getType() == t.FLOAT:
-            resultType = t.FLOAT
+    @staticmethod
+    def add(ctx : ProgramContext, lOp : Data, rOp : Data) -> Data:
+        __class__.checkArithmetics(ctx, lOp, rOp)
 
-        return Data(resultType, result)
+        return __class__.numeric(lOp.getType(), lOp.getValue() + rOp.getValue())
 
 
     @staticmethod
-    def arithmetics3(ctx : ProgramContext, args : list, f : str = 'ADD'):
-        """Wrapper of arithmetics for three adress instructions"""
+    def sub(ctx : ProgramContext, lOp : Data, rOp : Data) -> Data:
+        __class__.checkArithmetics(ctx, lOp, rOp)
 
-        dst = args[0]
-        lOp = ctx.getData(args[1])
-        rOp = ctx.getData(args[2])
+        return __class__.numeric(lOp.getType(), lOp.getValue() - rOp.getValue())
 
-        result = __class__.arithmetics(ctx, lOp, rOp, f)
 
-        ctx.setVar(dst, result)
+    @staticmethod
+    def mul(ctx : ProgramContext, lOp : Data, rOp : Data) -> Data:
+        __class__.checkArithmetics(ctx, lOp, rOp)
+
+        return __class__.numeric(lOp.getType(), lOp.getValue() * rOp.getValue())
 
 
     @staticmethod
-    def stackArithmetics(ctx : ProgramContext, f : str = 'ADD'):
-        """Wrapper of arithmetics for stack instructions"""
+    def div(ctx : ProgramContext, lOp : Data, rOp : Data) -> Data:
+        __class__.checkArithmetics(ctx, lOp, rOp)
 
-        rOp = ctx.dataStack.pop()
-        lOp = ctx.dataStack.pop()
+        if rOp.getValue() == 0.0:
+            raise Error.RuntimeError(BAD_VALUE, f"Dělení nulou!", ctx)
+        elif rOp.getType() != Data.Type.FLOAT or lOp.getType() != Data.Type.FLOAT:
+            raise Error.RuntimeError(BAD_TYPES, f"Instrukce DIV vyžaduje oba operandy typu FLOAT!", ctx)
 
-        result = __class__.arithmetics(ctx, lOp, rOp, f)
+        return Data(Data.Type.FLOAT, lOp.getValue() / rOp.getValue())
 
-        ctx.dataStack.push(result)
+
+    @staticmethod
+    def idiv(ctx : ProgramContext, lOp : Data, rOp : Data) -> Data:
+        __class__.checkArithmetics(ctx, lOp, rOp)
+
+        if rOp.getValue() == 0:
+            raise Error.RuntimeError(BAD_VALUE, f"Integer division by ZERO!", ctx)
+        elif rOp.getType() != Data.Type.INT or lOp.getType() != Data.Type.INT:
+            raise Error.RuntimeError(BAD_TYPES, f"Instrukce DIV vyžaduje oba operandy typu INT!", ctx)
+
+        return Data.ofInt(lOp.getValue() // rOp.getValue())
 
 
     @staticmethod
@@ -101,7 +101,7 @@ class Utils:
         if toBeConverted.getType() != Data.Type.FLOAT:
             raise Error.RuntimeError(BAD_TYPES, f"Neočekávaný typ parametru! Očekáván FLOAT.", ctx)
 
-        return Data(Data.Type.INT, int(toBeConverted.getValue()))
+        return Data.ofInt(int(toBeConverted.getValue()))
 
 
     @staticmethod
@@ -115,123 +115,158 @@ class Utils:
 
 
     @staticmethod
-    def comparing(ctx : ProgramContext, lOp : Data, rOp : Data, func : str = 'EQ') -> Data:
-        """Performs specified comparison and resturns Data (of type BOOL)
-        object with the result or it raises exception
-
+    def equal(ctx : ProgramContext, lOp : Data, rOp : Data) -> bool:
+        """Checks equality of operands (they must have the same type or one of
+        them can be nil) and returns boolean value with the result
+        
         Args:
             ctx (ProgramContext): current program context (for printing errors)
             lOp (Data): data of the left operand
             rOp (Data): data of the righ operand
-            func (str): function specifier it can be EQ|GT|LT
         """
 
         lOpType = lOp.getType()
         rOpType = rOp.getType()
         t = Data.Type
+        if lOpType != rOpType and lOpType != t.NIL and rOpType != t.NIL:
+            raise Error.RuntimeError(BAD_TYPES, f"Porovnávané hodnoty musí být stejného typu (nebo jeden operand může být typu NIL)!", ctx)
 
-        result = None
-        if func == 'EQ':
-            if lOpType != rOpType and lOpType != t.NIL and rOpType != t.NIL:
-                raise Error.RuntimeError(BAD_TYPES, f"Porovnávané hodnoty musí být stejného typu (nebo jeden operand může být typu NIL)!", ctx)
+        return lOp.getValue() == rOp.getValue()
 
-            result = lOp.getValue() == rOp.getValue()
-        else:
-            if lOpType != rOpType or lOpType == t.NIL and rOpType == t.NIL:
-                raise Error.RuntimeError(BAD_TYPES, f"Porovnávané hodnoty musí být stejného typu!", ctx)
-            
-            if func == 'LT':
-                result = lOp.getValue() < rOp.getValue()
-            else:
-                result = lOp.getValue() > rOp.getValue()
 
-        return Data(t.BOOL, result)
+    @staticmethod
+    def conditionEval(ctx : ProgramContext, lOp : Data, rOp : Data) -> bool:
+        """Evaluates condition of conditional jump (operands are equal) and
+        returns boolean value with the result (the same check as equal, but
+        with message of conditional jumps)
+        """
+
+        lOpType = lOp.getType()
+        rOpType = rOp.getType()
+        t = Data.Type
+        if lOpType != rOpType and lOpType != t.NIL and rOpType != t.NIL:
+            raise Error.RuntimeError(BAD_TYPES, f"Nekompatibilní datové typy operandů! (oba typy musí být stejné/jeden může být NIL)", ctx)
+
+        return lOp.getValue() == rOp.getValue()
 
 
     @staticmethod
-    def comparing3(ctx : ProgramContext, args : list, f : str = 'EQ'):
-        """Wrapper of comparing for three adress instructions"""
+    def checkRelational(ctx : ProgramContext, lOp : Data, rOp : Data):
+        """Checks types of operands of LT and GT (raises exception if they 
+        are not compatible)
+        """
 
-        dst = args[0]
-        lOp = ctx.getData(args[1])
-        rOp = ctx.getData(args[2])
+        lOpType = lOp.getType()
+        rOpType = rOp.getType()
+        if lOpType != rOpType or lOpType == Data.Type.NIL and rOpType == Data.Type.NIL:
+            raise Error.RuntimeError(BAD_TYPES, f"Porovnávané hodnoty musí být stejného typu!", ctx)
 
-        result = __class__.comparing(ctx, lOp, rOp, f)
 
-        ctx.setVar(dst, result)
+    @staticmethod
+    def eq(ctx : ProgramContext, lOp : Data, rOp : Data) -> Data:
+        return Data.ofBool(__class__.equal(ctx, lOp, rOp))
 
 
     @staticmethod
-    def stackComparing(ctx : ProgramContext, f : str = 'EQ'):
-        """Wrapper of comparing for stack instructions"""
+    def lt(ctx : ProgramContext, lOp : Data, rOp : Data) -> Data:
+        __class__.checkRelational(ctx, lOp, rOp)
 
-        rOp = ctx.dataStack.pop()
-        lOp = ctx.dataStack.pop()
+        return Data.ofBool(lOp.getValue() < rOp.getValue())
 
-        result = __class__.comparing(ctx, lOp, rOp, f)
 
-        ctx.dataStack.push(result)
+    @staticmethod
+    def gt(ctx : ProgramContext, lOp : Data, rOp : Data) -> Data:
+        __class__.checkRelational(ctx, lOp, rOp)
+
+        return Data.ofBool(lOp.getValue() > rOp.getValue())
 
 
     @staticmethod
-    def logic(ctx : ProgramContext, lOp : Data, rOp : Data = None, func : str = 'NOT'):
-        """Performs specified logical and resturns Data (of type BOOL)
-        object with the result or it raises exception
+    def checkLogic(ctx : ProgramContext, op : Data):
+        """Checks type of operand of logical operation"""
 
-        Args:
-            ctx (ProgramContext): current program context (for printing errors)
-            lOp (Data): data of the left operand
-            rOp (Data): data of the righ operand
-            func (str): function specifier it can be EQ|GT|LT
-        """
-        
-        if lOp.getType() != Data.Type.BOOL:
+        if op.getType() != Data.Type.BOOL:
             raise Error.RuntimeError(BAD_TYPES, f"Logické operace mohout operovat pouze s operandy typu BOOL!", ctx)
 
-        result = None
-        if func in ['AND', 'OR']:
-            if rOp.getType() != Data.Type.BOOL:
-                raise Error.RuntimeError(BAD_TYPES, f"Logické operace mohout operovat pouze s operandy typu BOOL!", ctx)
-            
-            if func == 'AND':
-                result = lOp.getValue() and rOp.getValue()
-            else:
-                result = lOp.getValue() or rOp.getValue()
-        else:
-            result = not lOp.getValue()
 
-        return Data(Data.Type.BOOL, result)
+    @staticmethod
+    def conjunction(ctx : ProgramContext, lOp : Data, rOp : Data) -> Data:
+        __class__.checkLogic(ctx, lOp)
+        __class__.checkLogic(ctx, rOp)
+
+        return Data.ofBool(lOp.getValue() and rOp.getValue())
+
 
-    
     @staticmethod
-    def logic3(ctx : ProgramContext, args : list, f : str = 'NOT'):
-        """Wrapper of logic for three adress instructions"""
+    def disjunction(ctx : ProgramContext, lOp : Data, rOp : Data) -> Data:
+        __class__.checkLogic(ctx, lOp)
+        __class__.checkLogic(ctx, rOp)
+
+        return Data.ofBool(lOp.getValue() or rOp.getValue())
+
+
+    @staticmethod
+    def negation(ctx : ProgramContext, op : Data) -> Data:
+        __class__.checkLogic(ctx, op)
+
+        return Data.ofBool(not op.getValue())
+
+
+    @staticmethod
+    def binary3(ctx : ProgramContext, args : list, func):
+        """Wrapper of binary operations (e.g. Utils.add) for three adress 
+        instructions
+        """
 
-        dst = args[0]
         lOp = ctx.getData(args[1])
-        rOp = None
+        rOp = ctx.getData(args[2])
 
-        if f in ['AND', 'OR']:
-            rOp = ctx.getData(args[2])
+        ctx.setVar(args[0], func(ctx, lOp, rOp))
 
-        result = __class__.logic(ctx, lOp, rOp, f)
 
-        ctx.setVar(dst, result)
+    @staticmethod
+    def stackBinary(ctx : ProgramContext, func):
+        """Wrapper of binary operations (e.g. Utils.add) for stack instructions
+        (two elements on the top are replaced by the result in place)
+        """
+
+        elements = ctx.dataStack.elements
+        try:
+            rOp = elements.pop()
+            elements[-1] = func(ctx, elements[-1], rOp)
+        except IndexError:
+            raise ctx.dataStack.underflow()
+
+
+    @staticmethod
+    def unary2(ctx : ProgramContext, args : list, func):
+        """Wrapper of unary operations (e.g. Utils.negation) for two adress
+        instructions
+        """
+
+        ctx.setVar(args[0], func(ctx, ctx.getData(args[1])))
 
 
     @staticmethod
-    def stackLogic(ctx : ProgramContext, f : str = 'NOT'):
-        """Wrapper of logic for stack instructions"""
+    def stackUnary(ctx : ProgramContext, func):
+        """Wrapper of unary operations for stack instructions (the top
+        element is replaced by the result in place)
+        """
 
-        rOp = None
-        if f in ['AND', 'OR']:
-            rOp = ctx.dataStack.pop()
+        elements = ctx.dataStack.elements
+        try:
+            elements[-1] = func(ctx, elements[-1])
+        except IndexError:
+            raise ctx.dataStack.underflow()
 
-        lOp = ctx.dataStack.pop()
 
-        result = __class__.logic(ctx, lOp, rOp, f)
+    def ordAtIndex(ctx : ProgramContext, string : Data, index : Data) -> Data:
+        """Returns data object (INT) with ordinal value of character of string
+        at given index (or it raises exception)
+        """
 
-        ctx.dataStack.push(result)
+        # String is in unicode so it should be valid character for ord
+        return Data.ofInt(ord(Utils.getCharAtIndex(ctx, string, index)))
 
 
     def int2char(ctx : ProgramContext, ordinal : Data):
@@ -269,31 +304,6 @@ class Utils:
         return string.getValue()[indexInt]
 
 
-    def conditionEval(ctx : ProgramContext, lOp : Data, rOp : Data, f : str = 'EQ') -> bool:
-        """Evaluates condition (== or !=) of jump and returns boolean value
-        wwith the result
-
-        Args:
-            lOp (Data): left operand of comparison
-            rOp (Data): right opearnd of comparison
-            f (str): specifies comparison mode (EQ|NEQ)
-
-        Returns:
-            (bool) True if jump should be performed (condition is satisfied)
-        """
-
-        lOpType = lOp.getType()
-        rOpType = rOp.getType()
-        t = Data.Type
-        if lOpType != rOpType and lOpType != t.NIL and rOpType != t.NIL:
-            raise Error.RuntimeError(BAD_TYPES, f"Nekompatibilní datové typy operandů! (oba typy musí být stejné/jeden může být NIL)", ctx)
-
-        if f == 'NEQ':
-            return lOp.getValue() != rOp.getValue()
-        else:
-            return lOp.getValue() == rOp.getValue()
-
-    
     def getPrintableValue(data : Data) -> str:
         """Converts Data value to printable represenation (__str__ method in 
         data object is used for debugging and contains also type)
@@ -323,6 +333,21 @@ class Utils:
         return toPrint
 
 
+# Binary operations by opcodes of instructions (three adress and stack variants)
+Utils.OPERATIONS = {
+    "ADD" : Utils.add, "ADDS" : Utils.add,
+    "SUB" : Utils.sub, "SUBS" : Utils.sub,
+    "MUL" : Utils.mul, "MULS" : Utils.mul,
+    "DIV" : Utils.div, "DIVS" : Utils.div,
+    "IDIV" : Utils.idiv, "IDIVS" : Utils.idiv,
+    "LT" : Utils.lt, "LTS" : Utils.lt,
+    "GT" : Utils.gt, "GTS" : Utils.gt,
+    "EQ" : Utils.eq, "EQS" : Utils.eq,
+    "AND" : Utils.conjunction, "ANDS" : Utils.conjunction,
+    "OR" : Utils.disjunction, "ORS" : Utils.disjunction,
+}
+
+
 
 class Op:
     """
@@ -342,15 +367,11 @@ class Op:
 
 
     def pushFrame(ctx : ProgramContext, args : list):
-        TFToBePushed = ctx.getFrame(Variable.FrameM.TEMPORARY)
-        ctx.frameStack.push(TFToBePushed)
-        ctx.updateLocalFrame() # Stack with frames is changing -> need to update LF
-        ctx.deleteTempFrame() # Making TF undefined
+        ctx.pushFrame()
 
 
     def popFrame(ctx : ProgramContext, args : list):
-        ctx.frames[Variable.FrameM.TEMPORARY] = ctx.frameStack.pop()
-        ctx.updateLocalFrame() # Stack with frames is changing -> need to update LF
+        ctx.popFrame()
 
 
     def defVar(ctx : ProgramContext, args : list):
@@ -367,17 +388,23 @@ class Op:
         targetLabel = args[0].getContent()
         ctx.setCurrentFunction(targetLabel)
 
+        if ctx.funcStats != None:
+            ctx.funcStats.enter(targetLabel, ctx.totalICounter + 1) # CALL is counted after its execution
+
 
     def retFromCall(ctx : ProgramContext, args : list):
         retIndex, retFunc = ctx.callStack.pop() # Pick up old function context from stack
         ctx.setNextInstructionIndex(retIndex) # Jumping back
         ctx.setCurrentFunction(retFunc)
 
+        if ctx.funcStats != None:
+            ctx.funcStats.leave(ctx.totalICounter + 1)
+
     
     def pushs(ctx : ProgramContext, args : list):
         toStore = args[0]
         dataToStore = ctx.getData(toStore)
-        ctx.dataStack.push(dataToStore)
+        ctx.dataStack.elements.append(dataToStore)
 
 
     def pops(ctx : ProgramContext, args : list):
@@ -388,23 +415,23 @@ class Op:
 
 
     def add(ctx : ProgramContext, args : list):
-        Utils.arithmetics3(ctx, args, 'ADD')
+        Utils.binary3(ctx, args, Utils.add)
 
 
     def sub(ctx : ProgramContext, args : list):
-        Utils.arithmetics3(ctx, args, 'SUB')
+        Utils.binary3(ctx, args, Utils.sub)
 
 
     def mul(ctx : ProgramContext, args : list):
-        Utils.arithmetics3(ctx, args, 'MUL')
+        Utils.binary3(ctx, args, Utils.mul)
 
 
     def div(ctx : ProgramContext, args : list):
-        Utils.arithmetics3(ctx, args, 'DIV')
+        Utils.binary3(ctx, args, Utils.div)
 
 
     def idiv(ctx : ProgramContext, args : list):
-        Utils.arithmetics3(ctx, args, 'IDIV')
+        Utils.binary3(ctx, args, Utils.idiv)
 
     
     def float2int(ctx : ProgramContext, args : list):
@@ -426,27 +453,27 @@ class Op:
 
     
     def lt(ctx : ProgramContext, args : list):
-        Utils.comparing3(ctx, args, 'LT')
+        Utils.binary3(ctx, args, Utils.lt)
 
 
     def gt(ctx : ProgramContext, args : list):
-        Utils.comparing3(ctx, args, 'GT')
+        Utils.binary3(ctx, args, Utils.gt)
 
 
     def eq(ctx : ProgramContext, args : list):
-        Utils.comparing3(ctx, args, 'EQ')
+        Utils.binary3(ctx, args, Utils.eq)
 
 
     def andF(ctx : ProgramContext, args : list):
-        Utils.logic3(ctx, args, 'AND')
+        Utils.binary3(ctx, args, Utils.conjunction)
 
 
     def orF(ctx : ProgramContext, args : list):
-        Utils.logic3(ctx, args, 'OR')
+        Utils.binary3(ctx, args, Utils.disjunction)
 
 
     def notF(ctx : ProgramContext, args : list):
-        Utils.logic3(ctx, args, 'NOT')
+        Utils.unary2(ctx, args, Utils.negation)
 
 
     def int2char(ctx : ProgramContext, args : list):
@@ -463,32 +490,23 @@ class Op:
         string = ctx.getData(args[1])
         index = ctx.getData(args[2])
 
-        # String is in unicode so it should be valid character for ord
-        result = ord(Utils.getCharAtIndex(ctx, string, index))
-
-        ctx.setVar(dst, Data(Data.Type.INT, result))
+        ctx.setVar(dst, Utils.ordAtIndex(ctx, string, index))
 
 
     def read(ctx : ProgramContext, args : list):
         dst = args[0]
         type = args[1].getTypeVal()
 
-        t = Data.Type
-        if type not in [t.INT, t.STR, t.BOOL, t.FLOAT]:
+        converter = InputConverter.CONVERTERS.get(type)
+        if converter == None:
             raise Error.RuntimeError(BAD_VALUE, f"Argument specifikující typ musí být int|str|bool|float!", ctx)
 
-        inp = ctx.input.readline().strip()
-        inp = inp.lower() if type == t.BOOL else inp # If it is bool type it does not matter letter case
-        
-        inputValue = None
-        notNil = (inp != "" or type == t.STR)
-        #                                         v   Everything except True is considered as false (except of empty string)
-        if (Lang.isValidFormated(type, inp) or type == t.BOOL) and notNil:
-            inputValue = Lang.str2value(type, inp)
-        else:
-            type = t.NIL
+        if ctx.interactive:
+            ctx.flushOutput() # User should see the output before the prompt
 
-        ctx.setVar(dst, Data(type, inputValue))
+        inp = ctx.reader.readline().strip()
+
+        ctx.setVar(dst, converter(inp))
 
 
     def write(ctx : ProgramContext, args : list):
@@ -496,7 +514,7 @@ class Op:
 
         toPrint = Utils.getPrintableValue(toBeConverted)
         
-        print(toPrint, end='')
+        ctx.output.write(toPrint)
 
     
     def concat(ctx : ProgramContext, args : list):
@@ -518,7 +536,7 @@ class Op:
         if string.getType() != Data.Type.STR:
             raise Error.RuntimeError(BAD_TYPES, f"Neočekávaný datový typ operandu! Očekáván STR.", ctx)
 
-        ctx.setVar(dst, Data(Data.Type.INT, len(string.getValue())))
+        ctx.setVar(dst, Data.ofInt(len(string.getValue())))
 
 
     def getchar(ctx : ProgramContext, args : list):
@@ -587,8 +605,10 @@ class Op:
 
 
     def jump(ctx : ProgramContext, args : list):
-        targetLabel = args[0].getContent()
-        targetIndex = ctx.getLabelIndex(targetLabel)
+        targetIndex = args[0].getTarget() # Target is resolved during linking
+        if targetIndex == None:
+            targetIndex = ctx.getLabelIndex(args[0].getContent())
+
         ctx.setNextInstructionIndex(targetIndex)
 
 
@@ -596,7 +616,7 @@ class Op:
         lOp = ctx.getData(args[1])
         rOp = ctx.getData(args[2])
 
-        if Utils.conditionEval(ctx, lOp, rOp, 'EQ'):
+        if Utils.conditionEval(ctx, lOp, rOp):
             __class__.jump(ctx, args)
 
 
@@ -604,7 +624,7 @@ class Op:
         lOp = ctx.getData(args[1])
         rOp = ctx.getData(args[2])
 
-        if Utils.conditionEval(ctx, lOp, rOp, 'NEQ'):
+        if not Utils.conditionEval(ctx, lOp, rOp):
             __class__.jump(ctx, args)
 
 
@@ -628,6 +648,7 @@ class Op:
 
         toPrint = Utils.getPrintableValue(arg)
 
+        ctx.flushOutput() # Preserving order of stdout and stderr
         print(toPrint, end='', file=sys.stderr)
 
 
@@ -636,10 +657,14 @@ class Op:
         order = ctx.getInstruction()
         function = ctx.getCurrentFunction()
 
-        lf = ctx.frames[Variable.FrameM.LOCAL]
-        gf = ctx.frames[Variable.FrameM.GLOBAL]
-        tf = ctx.frames[Variable.FrameM.TEMPORARY]
+        lf = ctx.lf
+        gf = ctx.gf
+        tf = ctx.tf
+
+        callStack = Stack() # Return indexes are printed as indexes in the program without superinstructions
+        callStack.elements = [(ctx.getOriginalIndex(index), func) for index, func in ctx.callStack.getElements()]
 
+        ctx.flushOutput()
         print(f"________________________", file=sys.stderr)
         print(f"BREAK at: {order} (executed i.: {total})", file=sys.stderr)
         print(f"Function: " + str(function if function != None else "-"), end='\n\n', file=sys.stderr)
@@ -647,7 +672,7 @@ class Op:
         print(f"GF: {gf}", file=sys.stderr)
         print(f"LF: " + str(lf if lf != None else "Undef."), file=sys.stderr)
         print(f"TF: " + str(tf if tf != None else "Undef."), end='\n\n', file=sys.stderr)
-        print(f"Call st.: {ctx.callStack}", end='\n\n', file=sys.stderr)
+        print(f"Call st.: {callStack}", end='\n\n', file=sys.stderr)
         print(f"Data stack: {ctx.dataStack}", end='\n\n', file=sys.stderr)
         print(f"Frame stack: {ctx.frameStack}", end='\n\n', file=sys.stderr)
         print(f"________________________", file=sys.stderr)
@@ -659,104 +684,266 @@ class Op:
 
     
     def adds(ctx : ProgramContext, args : list):
-        Utils.stackArithmetics(ctx, 'ADD')
+        Utils.stackBinary(ctx, Utils.add)
 
 
     def muls(ctx : ProgramContext, args : list):
-        Utils.stackArithmetics(ctx, 'MUL')
+        Utils.stackBinary(ctx, Utils.mul)
 
 
     def subs(ctx : ProgramContext, args : list):
-        Utils.stackArithmetics(ctx, 'SUB')
+        Utils.stackBinary(ctx, Utils.sub)
 
 
     def idivs(ctx : ProgramContext, args : list):
-        Utils.stackArithmetics(ctx, 'IDIV')
+        Utils.stackBinary(ctx, Utils.idiv)
 
 
     def divs(ctx : ProgramContext, args : list):
-        Utils.stackArithmetics(ctx, 'DIV')
+        Utils.stackBinary(ctx, Utils.div)
 
 
     def int2floats(ctx : ProgramContext, args : list):
-        toBeConverted = ctx.dataStack.pop()
-
-        result = Utils.int2float(ctx, toBeConverted)
-
-        ctx.dataStack.push(result)
+        Utils.stackUnary(ctx, Utils.int2float)
 
 
     def float2ints(ctx : ProgramContext, args : list):
-        toBeConverted = ctx.dataStack.pop()
-
-        result = Utils.float2int(ctx, toBeConverted)
-
-        ctx.dataStack.push(result)
+        Utils.stackUnary(ctx, Utils.float2int)
 
 
     def lts(ctx : ProgramContext, args : list):
-        Utils.stackComparing(ctx, 'LT')
+        Utils.stackBinary(ctx, Utils.lt)
 
 
     def gts(ctx : ProgramContext, args : list):
-        Utils.stackComparing(ctx, 'GT')
+        Utils.stackBinary(ctx, Utils.gt)
 
 
     def eqs(ctx : ProgramContext, args : list):
-        Utils.stackComparing(ctx, 'EQ')
+        Utils.stackBinary(ctx, Utils.eq)
 
 
     def ands(ctx : ProgramContext, args : list):
-        Utils.stackLogic(ctx, 'AND')
+        Utils.stackBinary(ctx, Utils.conjunction)
 
 
     def ors(ctx : ProgramContext, args : list):
-        Utils.stackLogic(ctx, 'OR')
+        Utils.stackBinary(ctx, Utils.disjunction)
 
 
     def nots(ctx : ProgramContext, args : list):
-        Utils.stackLogic(ctx, 'NOT')
+        Utils.stackUnary(ctx, Utils.negation)
 
 
     def int2chars(ctx : ProgramContext, args : list):
-        ordinalValue = ctx.dataStack.pop()
-
-        result = Utils.int2char(ctx, ordinalValue)
-
-        ctx.dataStack.push(result)
+        Utils.stackUnary(ctx, Utils.int2char)
 
 
     def stri2ints(ctx : ProgramContext, args : list):
-        index = ctx.dataStack.pop()
-        string = ctx.dataStack.pop()
-
-        # String is in unicode so it should be valid character for ord
-        result = ord(Utils.getCharAtIndex(ctx, string, index))
-        
-        ctx.dataStack.push(Data(Data.Type.INT, result))
+        Utils.stackBinary(ctx, Utils.ordAtIndex)
 
 
     def jumpifeqs(ctx : ProgramContext, args : list):
-        rOp = ctx.dataStack.pop()
-        lOp = ctx.dataStack.pop()
+        elements = ctx.dataStack.elements
+        try:
+            rOp = elements.pop()
+            lOp = elements.pop()
+        except IndexError:
+            raise ctx.dataStack.underflow()
 
-        if Utils.conditionEval(ctx, lOp, rOp, 'EQ'):
+        if Utils.conditionEval(ctx, lOp, rOp):
             __class__.jump(ctx, args)
 
 
     def jumpifneqs(ctx : ProgramContext, args : list):
-        rOp = ctx.dataStack.pop()
-        lOp = ctx.dataStack.pop()
+        elements = ctx.dataStack.elements
+        try:
+            rOp = elements.pop()
+            lOp = elements.pop()
+        except IndexError:
+            raise ctx.dataStack.underflow()
 
-        if Utils.conditionEval(ctx, lOp, rOp, 'NEQ'):
+        if not Utils.conditionEval(ctx, lOp, rOp):
             __class__.jump(ctx, args)
 
 
+    #--------------------------- SPECIALIZED INSTRUCTIONS ---------------------
+    # They are bound instead of generic implementations by Lang.getHandler
+    # *Ints variants are used if both source operands are int literals (no
+    # checks are needed), *IntLiteral variants if one of them is variable
+    # (guard falls back to the generic implementation, that raises errors)
+
+    def addInts(ctx : ProgramContext, args : list):
+        ctx.setVar(args[0], Data.ofInt(args[1].data.value + args[2].data.value))
+
+
+    def addIntLiteral(ctx : ProgramContext, args : list):
+        lOp = ctx.getData(args[1])
+        rOp = ctx.getData(args[2])
+        if lOp.type is not Data.Type.INT or rOp.type is not Data.Type.INT:
+            return __class__.add(ctx, args)
+
+        ctx.setVar(args[0], Data.ofInt(lOp.value + rOp.value))
+
+
+    def subInts(ctx : ProgramContext, args : list):
+        ctx.setVar(args[0], Data.ofInt(args[1].data.value - args[2].data.value))
+
+
+    def subIntLiteral(ctx : ProgramContext, args : list):
+        lOp = ctx.getData(args[1])
+        rOp = ctx.getData(args[2])
+        if lOp.type is not Data.Type.INT or rOp.type is not Data.Type.INT:
+            return __class__.sub(ctx, args)
+
+        ctx.setVar(args[0], Data.ofInt(lOp.value - rOp.value))
+
+
+    def mulInts(ctx : ProgramContext, args : list):
+        ctx.setVar(args[0], Data.ofInt(args[1].data.value * args[2].data.value))
+
+
+    def mulIntLiteral(ctx : ProgramContext, args : list):
+        lOp = ctx.getData(args[1])
+        rOp = ctx.getData(args[2])
+        if lOp.type is not Data.Type.INT or rOp.type is not Data.Type.INT:
+            return __class__.mul(ctx, args)
+
+        ctx.setVar(args[0], Data.ofInt(lOp.value * rOp.value))
+
+
+    def ltInts(ctx : ProgramContext, args : list):
+        ctx.setVar(args[0], Data.ofBool(args[1].data.value < args[2].data.value))
+
+
+    def ltIntLiteral(ctx : ProgramContext, args : list):
+        lOp = ctx.getData(args[1])
+        rOp = ctx.getData(args[2])
+        if lOp.type is not Data.Type.INT or rOp.type is not Data.Type.INT:
+            return __class__.lt(ctx, args)
+
+        ctx.setVar(args[0], Data.ofBool(lOp.value < rOp.value))
+
+
+    def gtInts(ctx : ProgramContext, args : list):
+        ctx.setVar(args[0], Data.ofBool(args[1].data.value > args[2].data.value))
+
+
+    def gtIntLiteral(ctx : ProgramContext, args : list):
+        lOp = ctx.getData(args[1])
+        rOp = ctx.getData(args[2])
+        if lOp.type is not Data.Type.INT or rOp.type is not Data.Type.INT:
+            return __class__.gt(ctx, args)
+
+        ctx.setVar(args[0], Data.ofBool(lOp.value > rOp.value))
+
+
+    def eqInts(ctx : ProgramContext, args : list):
+        ctx.setVar(args[0], Data.ofBool(args[1].data.value == args[2].data.value))
+
+
+    def eqIntLiteral(ctx : ProgramContext, args : list):
+        lOp = ctx.getData(args[1])
+        rOp = ctx.getData(args[2])
+        if lOp.type is not Data.Type.INT or rOp.type is not Data.Type.INT:
+            return __class__.eq(ctx, args)
+
+        ctx.setVar(args[0], Data.ofBool(lOp.value == rOp.value))
+
+
+    #--------------------------- SUPERINSTRUCTIONS ---------------------------
+    # Handlers of fused sequences of instructions (see optimizer.Fuser), they
+    # get list with the original instructions (parts) instead of operands.
+    # Every part is set as current instruction before its step (for error
+    # messages) and instruction counter is incremented after every part
+    # except the last one (it is incremented by Fused.do)
+
+    def compareJump(ctx : ProgramContext, parts : list):
+        """LT/GT/EQ followed by conditional jump with its result"""
+
+        compare, jump = parts
+        dst, lOp, rOp = compare.operands
+
+        ctx.currentInstruction = compare
+        ctx.setVar(dst, Utils.OPERATIONS[compare.opcode](ctx, ctx.getData(lOp), ctx.getData(rOp)))
+        ctx.totalICounter += 1
+
+        ctx.currentInstruction = jump
+        label, lOp, rOp = jump.operands
+        if Utils.conditionEval(ctx, ctx.getData(lOp), ctx.getData(rOp)) != (jump.opcode == "JUMPIFNEQ"):
+            __class__.jump(ctx, jump.operands)
+
+
+    def stackOperation(ctx : ProgramContext, parts : list):
+        """PUSHS, PUSHS, binary stack operation and POPS (data stack is not
+        used at all)
+        """
+
+        lPush, rPush, operation, pop = parts
+
+        ctx.currentInstruction = lPush
+        lOp = ctx.getData(lPush.operands[0])
+        ctx.totalICounter += 1
+
+        ctx.currentInstruction = rPush
+        rOp = ctx.getData(rPush.operands[0])
+        ctx.totalICounter += 1
+
+        ctx.currentInstruction = operation
+        result = Utils.OPERATIONS[operation.opcode](ctx, lOp, rOp)
+        ctx.totalICounter += 1
+
+        ctx.currentInstruction = pop
+        ctx.setVar(pop.operands[0], result)
+
+
+    def newFrame(ctx : ProgramContext, parts : list):
+        """CREATEFRAME followed by PUSHFRAME (e.g. at the start of function)"""
+
+        create, push = parts
+
+        ctx.currentInstruction = create
+        __class__.createFrame(ctx, create.operands)
+        ctx.totalICounter += 1
+
+        ctx.currentInstruction = push
+        __class__.pushFrame(ctx, push.operands)
+
 
     def nop(ctx : ProgramContext, args : list):
         pass
 
 
+class OpcodeDescriptor:
+    """Precomputed description of one opcode (see Lang.DESCRIPTORS), so
+    the properties of instruction can be obtained by one dictionary lookup
+    """
+
+    __slots__ = ("opcode", "handler", "operands", "arity", "isLabel", "isJump", "isDebug", "isNewVar")
+
+
+    def __init__(self, opcode : str, handler, operands : list, flags : dict):
+        """Creates descriptor of opcode
+
+        Args:
+            opcode (str): operational code (in upper case)
+            handler (function): generic implementation of instruction
+            operands (list): expected types of operands (operand signature)
+            flags (dict): membership of opcode in groups of instructions 
+                (label, jump, debug, newVar)
+        """
+
+        self.opcode = opcode
+        self.handler = handler
+        self.operands = operands
+        self.arity = len(operands)
+        self.isLabel = flags["label"]
+        self.isJump = flags["jump"]
+        self.isDebug = flags["debug"]
+        self.isNewVar = flags["newVar"]
+
+
+
 class Lang:
     """Contains specification of source language elements and converter 
     static methods
@@ -770,6 +957,9 @@ class Lang:
             of enum Variable.Frame (that is used in script)
         OPERAND_FORMAT (dict): contains regular expression strings for all
             type of operands (to make additiional checks in internal parser)
+        DESCRIPTORS (dict): opcode descriptors created from INSTRUCTIONS and 
+            groups of instructions (see OpcodeDescriptor)
+        FORMAT_REGEX (dict): compiled regular expressions from OPERAND_FORMAT
     """
 
     FUNC_INDEX = 0
@@ -847,6 +1037,17 @@ class Lang:
         "JUMPIFNEQS"        : [Op.jumpifneqs, ["label"]],
     }
 
+    # Type-specialized implementations of instructions with int literals
+    # (see Op, first is used for two literals, second for literal and variable)
+    INT_SPECIALIZED = {
+        "ADD"               : (Op.addInts, Op.addIntLiteral),
+        "SUB"               : (Op.subInts, Op.subIntLiteral),
+        "MUL"               : (Op.mulInts, Op.mulIntLiteral),
+        "LT"                : (Op.ltInts, Op.ltIntLiteral),
+        "GT"                : (Op.gtInts, Op.gtIntLiteral),
+        "EQ"                : (Op.eqInts, Op.eqIntLiteral),
+    }
+
     LABEL_INSTRUCTIONS = ["LABEL"]
     DEBUG_INSTRUCTIONS = ["DPRINT", "BREAK"]
     JUMP_INSTRUCTIONS = ["JUMP", "JUMPIFEQ", "JUMPIFNEQ", "CALL"]
@@ -884,6 +1085,10 @@ class Lang:
 
     VAR_DELIM_CHAR = '@'
 
+    ESC_SEQUENCE_REGEX = re.compile(r"\\\d{3}")
+    LEADING_ZEROS_REGEX = re.compile("^(0+)([1-9])")
+    HEXA_FLOAT_REGEX = re.compile('^[-\+]?0[xX]')
+
 
     @staticmethod
     def isValidFormated(type, str : str, caseSensitive = False) -> bool:
@@ -897,7 +1102,7 @@ class Lang:
         """
 
         str = str.lower() if caseSensitive else str
-        if re.search(__class__.OPERAND_FORMAT[type], str):
+        if __class__.FORMAT_REGEX[type].search(str):
             return True
         else:
             if type == Data.Type.FLOAT:
@@ -924,54 +1129,103 @@ class Lang:
             string (str): input string, that will be converted to data
         """
 
-        def replaceEscSequence(match : re.Match):
-            """Callback function for replacing escape sequences in strings"""
-
-            matchedStr = match.group()
-            convertable = matchedStr[1:].lstrip('0') # Removal of initial backslash and leading zeros
-            return chr(int(convertable)) # Returning unicode char corresponding to converted number sequence
-
         t = Data.Type
         if (string == "nil" and type != t.STR) or type == t.NIL: # Everything can have nil value (and nil type can have only nil value)
             return None
 
         elif type == Data.Type.BOOL:
-            if string == "true":
-                return True
-            else:
-                return False
+            return __class__.str2bool(string)
 
         elif type == Data.Type.STR:
-            result = re.sub(r"\\\d{3}", replaceEscSequence, string)
-            return result
+            return __class__.str2str(string)
 
         elif type == Data.Type.INT:
-            # Replacing leading zero for octal format mark (in the source language spec. leading zero means octal format)
-            withoutLeadingZeros = re.sub("^(0+)([1-9])", r"0o\2", string)
-            return int(withoutLeadingZeros, 0) 
+            return __class__.str2int(string)
         
         elif type == Data.Type.FLOAT:
-            if re.search('^[-\+]?0[xX]', string):
-                return float.fromhex(string)
-            else:
-                # Sometimes it can be difficult to distiguish hexa representation of float and decimal representation
-                # That is the reason why this workaround was made (e. g. 1p0 not starts with 0x but is convertable)
+            return __class__.str2float(string)
 
-                result = None
-                try:
-                    result = float(string)
-                except:
-                    result = float.fromhex(string)
 
-                return result
+    @staticmethod
+    def replaceEscSequence(match : re.Match) -> str:
+        """Callback function for replacing escape sequences in strings"""
+
+        matchedStr = match.group()
+        convertable = matchedStr[1:].lstrip('0') # Removal of initial backslash and leading zeros
+        return chr(int(convertable)) # Returning unicode char corresponding to converted number sequence
 
 
     @staticmethod
-    def isInstruction(str : str, caseSensitive = False) -> bool:
-        if caseSensitive:
-            return str in __class__.INSTRUCTIONS
+    def str2bool(string : str) -> bool:
+        return string == "true"
+
+
+    @staticmethod
+    def str2str(string : str) -> str:
+        return __class__.ESC_SEQUENCE_REGEX.sub(__class__.replaceEscSequence, string)
+
+
+    @staticmethod
+    def str2int(string : str) -> int:
+        if not string.startswith("0"):
+            return int(string, 0)
+
+        # Replacing leading zero for octal format mark (in the source language spec. leading zero means octal format)
+        withoutLeadingZeros = __class__.LEADING_ZEROS_REGEX.sub(r"0o\2", string)
+        return int(withoutLeadingZeros, 0) 
+
+
+    @staticmethod
+    def str2float(string : str) -> float:
+        if __class__.HEXA_FLOAT_REGEX.search(string):
+            return float.fromhex(string)
         else:
-            return str.upper() in __class__.INSTRUCTIONS
+            # Sometimes it can be difficult to distiguish hexa representation of float and decimal representation
+            # That is the reason why this workaround was made (e. g. 1p0 not starts with 0x but is convertable)
+
+            result = None
+            try:
+                result = float(string)
+            except:
+                result = float.fromhex(string)
+
+            return result
+
+
+    @staticmethod
+    def createDescriptors() -> dict:
+        """Creates table with descriptors of all opcodes (from INSTRUCTIONS 
+        and lists with groups of instructions)
+        """
+
+        descriptors = {}
+        for opcode, (handler, operands) in __class__.INSTRUCTIONS.items():
+            flags = {
+                "label" : opcode in __class__.LABEL_INSTRUCTIONS,
+                "jump" : opcode in __class__.JUMP_INSTRUCTIONS,
+                "debug" : opcode in __class__.DEBUG_INSTRUCTIONS,
+                "newVar" : opcode in __class__.NEW_VAR_INSTRUCTIONS,
+            }
+
+            descriptors[opcode] = OpcodeDescriptor(opcode, handler, operands, flags)
+
+        return descriptors
+
+
+    @staticmethod
+    def getDescriptor(opcode : str, caseSensitive = False) -> OpcodeDescriptor:
+        """Returns descriptor of given opcode or None if it is not opcode"""
+
+        descriptor = __class__.DESCRIPTORS.get(opcode)
+        if descriptor == None and not caseSensitive:
+            descriptor = __class__.DESCRIPTORS.get(opcode.upper())
+
+        return descriptor
+
+
+    @staticmethod
+    def isInstruction(str : str, caseSensitive = False) -> bool:
+        return __class__.getDescriptor(str, caseSensitive) != None
 
 
     @staticmethod
@@ -997,12 +1251,46 @@ class Lang:
 
     @staticmethod
     def getFunction(opcode : str):
-        return __class__.INSTRUCTIONS[opcode][__class__.FUNC_INDEX]
+        return __class__.DESCRIPTORS[opcode].handler
+
+
+    @staticmethod
+    def isIntLiteral(op : Operand) -> bool:
+        """Checks whether operand is int literal with known (not nil) value"""
+
+        if op.__class__ != Literal:
+            return False
+
+        data = op.getData()
+
+        return data.getType() == Data.Type.INT and data.getValue() != None
+
+
+    @staticmethod
+    def getHandler(opcode : str, operands : list):
+        """Returns function, that implements instruction with given operands. 
+        If types of operands are known (because they are literals), 
+        specialized implementation is returned (see INT_SPECIALIZED)
+        """
+
+        generic = __class__.getFunction(opcode)
+        if opcode not in __class__.INT_SPECIALIZED or len(operands) != 3:
+            return generic
+
+        symbols = operands[1:]
+        literals = [op for op in symbols if __class__.isIntLiteral(op)]
+        variables = [op for op in symbols if op.__class__ == Variable]
+        if operands[0].__class__ != Variable or not literals or len(literals) + len(variables) != 2:
+            return generic
+
+        intsHandler, literalHandler = __class__.INT_SPECIALIZED[opcode]
+
+        return intsHandler if len(literals) == 2 else literalHandler
 
 
     @staticmethod
     def getOperandTypes(opcode : str) -> str:
-        return __class__.INSTRUCTIONS[opcode][__class__.OP_INDEX]
+        return __class__.DESCRIPTORS[opcode].operands
 
 
     @staticmethod
@@ -1045,10 +1333,9 @@ class Lang:
     def isNewVarInstruction(opcode : str, caseSensitive = False) -> bool:
         """Checks whether the instructions declares new variable (for semantic checks)"""
 
-        if caseSensitive:
-            return opcode in __class__.NEW_VAR_INSTRUCTIONS
-        else:
-            return opcode.upper() in __class__.NEW_VAR_INSTRUCTIONS
+        descriptor = __class__.getDescriptor(opcode, caseSensitive)
+
+        return descriptor != None and descriptor.isNewVar
 
 
     @staticmethod
@@ -1064,10 +1351,9 @@ class Lang:
     def isLabelInstrucion(opcode : str, caseSensitive = False) -> bool:
         """Checks whether instruction defines new label (for semantic checks)"""
 
-        if caseSensitive:
-            return opcode in __class__.LABEL_INSTRUCTIONS
-        else:
-            return opcode.upper() in __class__.LABEL_INSTRUCTIONS
+        descriptor = __class__.getDescriptor(opcode, caseSensitive)
+
+        return descriptor != None and descriptor.isLabel
 
 
     @staticmethod
@@ -1076,20 +1362,18 @@ class Lang:
         and factory methods)
         """
 
-        if caseSensitive:
-            return opcode in __class__.JUMP_INSTRUCTIONS
-        else:
-            return opcode.upper() in __class__.JUMP_INSTRUCTIONS
+        descriptor = __class__.getDescriptor(opcode, caseSensitive)
+
+        return descriptor != None and descriptor.isJump
 
     
     @staticmethod
     def isDebugInstruction(opcode : str, caseSensitive = False) -> bool:
         """Checks whether instruction is debug instruction"""
 
-        if caseSensitive:
-            return opcode in __class__.DEBUG_INSTRUCTIONS
-        else:
-            return opcode.upper() in __class__.DEBUG_INSTRUCTIONS
+        descriptor = __class__.getDescriptor(opcode, caseSensitive)
+
+        return descriptor != None and descriptor.isDebug
 
 
     @staticmethod
@@ -1130,3 +1414,61 @@ class Lang:
                 return False
         else:
             return False
+
+
+
+Lang.FORMAT_REGEX = {type : re.compile(format) for type, format in Lang.OPERAND_FORMAT.items()}
+
+Lang.DESCRIPTORS = Lang.createDescriptors()
+
+
+
+class InputConverter:
+    """Contains type-specific converters of input lines (for READ instruction),
+    every converter takes stripped line and returns data object with 
+    the result (nil if the line is empty or it has invalid format)
+    """
+
+    INT_REGEX = Lang.FORMAT_REGEX[Data.Type.INT]
+
+
+    def toInt(line : str) -> Data:
+        if line == "" or not InputConverter.INT_REGEX.search(line):
+            return Data.NIL
+        elif line == "nil":
+            return Data(Data.Type.INT, None)
+
+        return Data.ofInt(Lang.str2int(line))
+
+
+    def toFloat(line : str) -> Data:
+        if line == "" or not Lang.isValidFormated(Data.Type.FLOAT, line):
+            return Data.NIL
+
+        return Data(Data.Type.FLOAT, None if line == "nil" else Lang.str2float(line))
+
+
+    def toBool(line : str) -> Data:
+        line = line.lower() # If it is bool type it does not matter letter case
+        if line == "":
+            return Data.NIL
+        elif line == "nil":
+            return Data(Data.Type.BOOL, None)
+
+        #  Everything except True is considered as false (except of empty string)
+        return Data.ofBool(Lang.str2bool(line))
+
+
+    def toStr(line : str) -> Data:
+        if "\\" not in line: # There is no escape sequence
+            return Data(Data.Type.STR, line)
+
+        return Data(Data.Type.STR, Lang.str2str(line))
+
+
+    CONVERTERS = {
+        Data.Type.INT : toInt,
+        Data.Type.FLOAT : toFloat,
+        Data.Type.BOOL : toBool,
+        Data.Type.STR : toStr,
+    }
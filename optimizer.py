@@ -0,0 +1,294 @@
+# IPP project 2. part
+# Author: Vojtech Dvorak (xdvora3o)
+
+"""Contains optional optimization pass over linked program (see -O), that is
+performed after semantic analysis, and fusion of instruction sequences to
+superinstructions. All optimizations preserve observable
+behaviour of the program (output, return code and runtime errors), only
+statistics insts and hot (and the counter printed by BREAK) are counted for
+the optimized program.
+"""
+
+from errors import *
+from iparser import IParser
+from lang import Lang, Op, Utils
+from program import Data, Fused, Label, Literal, Program, Variable
+
+
+class Optimizer:
+    """Peephole and dead code optimizations of instruction list:
+
+    - arithmetic, relational and logic instructions with literal operands
+      are replaced by MOVE of the result (if the operation does not fail)
+    - MOVE of variable to itself is removed if the variable is surely defined
+      and initialized (it was written or read earlier in the same basic block)
+    - JUMP to label, that immediately follows it, is removed
+    - unreachable instructions after JUMP, EXIT and RETURN (to the next
+      label) are removed
+
+    Removed and replaced instructions keep order numbers of the original
+    ones, the program is linked again after optimization.
+    """
+
+    # Operations, that can be evaluated during optimization
+    FOLDABLE = {
+        "ADD" : Utils.add,
+        "SUB" : Utils.sub,
+        "MUL" : Utils.mul,
+        "DIV" : Utils.div,
+        "IDIV" : Utils.idiv,
+        "LT" : Utils.lt,
+        "GT" : Utils.gt,
+        "EQ" : Utils.eq,
+        "AND" : Utils.conjunction,
+        "OR" : Utils.disjunction,
+        "NOT" : Utils.negation,
+    }
+
+    TERMINATING = ["JUMP", "EXIT", "RETURN"] # Instructions that never continue by the next one
+    FRAME_CHANGING = ["CREATEFRAME", "PUSHFRAME", "POPFRAME", "CALL"]
+
+
+    def __init__(self, program : Program):
+        self.program = program
+        self.ctx = program.getContext()
+
+
+    @staticmethod
+    def literalContent(data : Data) -> str:
+        """Returns representation of data in the format of literal operands"""
+
+        if data.getType() == Data.Type.BOOL:
+            return "true" if data.getValue() else "false"
+        elif data.getType() == Data.Type.FLOAT:
+            return data.getValue().hex()
+        else:
+            return str(data.getValue())
+
+
+    def fold(self, inst):
+        """Returns MOVE instruction with result of given instruction, if it
+        can be evaluated (otherwise the original instruction is returned)
+        """
+
+        func = __class__.FOLDABLE.get(inst.getOpCode())
+        if func == None:
+            return inst
+
+        dst, *ops = inst.getOperands()
+        if not all(op.__class__ == Literal for op in ops):
+            return inst
+
+        if any(op.getData().getValue() == None and op.getData().getType() != Data.Type.NIL for op in ops):
+            return inst # Literal without value (e.g. int@nil) fails in runtime (if it is executed)
+
+        try:
+            result = func(self.ctx, *[op.getData() for op in ops])
+        except Error.MException: # Error must be raised in runtime
+            return inst
+
+        if result.getType() not in [Data.Type.INT, Data.Type.BOOL, Data.Type.FLOAT]:
+            return inst
+
+        literal = Literal(2, __class__.literalContent(result), result.getType(), result.getValue())
+
+        return IParser.createInstruction("MOVE", inst.getOrder(), [dst, literal])
+
+
+    def foldConstants(self, instructions : list) -> list:
+        return [self.fold(inst) for inst in instructions]
+
+
+    def removeSelfMoves(self, instructions : list) -> list:
+        """Removes MOVE instructions with the same variable as destination and
+        source, if the variable is surely initialized (otherwise MOVE raises
+        error, that must be preserved)
+        """
+
+        result = []
+        initialized = set() # Variables, that are surely initialized (pairs frame, name)
+
+        for inst in instructions:
+            opcode = inst.getOpCode()
+            operands = inst.getOperands()
+
+            if inst.__class__ == Label:
+                initialized.clear() # Label can be reached from anywhere
+                result.append(inst)
+                continue
+
+            if opcode == "MOVE" and all(op.__class__ == Variable for op in operands):
+                dst, src = operands
+                key = (dst.getFrameMark(), dst.getName())
+                if key == (src.getFrameMark(), src.getName()) and key in initialized:
+                    continue
+
+            result.append(inst)
+
+            if opcode in __class__.FRAME_CHANGING: # Only global variables stay accessible
+                initialized = {key for key in initialized if key[0] == Variable.FrameM.GLOBAL}
+
+            descriptor = Lang.getDescriptor(opcode)
+            for op, expected in zip(operands, descriptor.operands):
+                if op.__class__ != Variable:
+                    continue
+
+                key = (op.getFrameMark(), op.getName())
+                if descriptor.isNewVar:
+                    initialized.discard(key)
+                elif opcode != "TYPE" or expected == "var": # TYPE can read uninitialized variable
+                    initialized.add(key) # If the instruction succeeds, variable is initialized
+
+        return result
+
+
+    def removeJumpsToNext(self, instructions : list) -> list:
+        """Removes JUMP instructions, whose target label follows them (there can
+        be other labels between them)
+        """
+
+        result = []
+        for index, inst in enumerate(instructions):
+            if inst.getOpCode() == "JUMP":
+                target = inst.getOperands()[0].getContent()
+                following = index + 1
+                while following < len(instructions) and instructions[following].__class__ == Label:
+                    if instructions[following].getOperands()[0].getContent() == target:
+                        break
+                    following += 1
+
+                if following < len(instructions) and instructions[following].__class__ == Label:
+                    continue
+
+            result.append(inst)
+
+        return result
+
+
+    def removeUnreachable(self, instructions : list) -> list:
+        """Removes instructions between terminating instruction and the next
+        label
+        """
+
+        result = []
+        reachable = True
+        for inst in instructions:
+            if inst.__class__ == Label:
+                reachable = True
+
+            if reachable:
+                result.append(inst)
+
+            if inst.getOpCode() in __class__.TERMINATING:
+                reachable = False
+
+        return result
+
+
+    def optimize(self):
+        """Performs all optimizations and links the optimized program"""
+
+        instructions = self.foldConstants(list(self.program.getInstructions()))
+        instructions = self.removeSelfMoves(instructions)
+
+        while True: # Removing of unreachable code can create new jumps to next label and vice versa
+            optimized = self.removeJumpsToNext(self.removeUnreachable(instructions))
+            if len(optimized) == len(instructions):
+                break
+
+            instructions = optimized
+
+        self.program.replaceInstructions(instructions)
+
+
+
+class Fuser:
+    """Replaces frequent sequences of instructions by superinstructions (see
+    Fused and superinstructions in lang.Op). Sequences never contain labels,
+    so jumps can not target the middle of superinstruction. Superinstructions
+    are counted as all of their parts and the statistics of the hottest
+    instruction stay the same (every part of superinstruction is executed
+    the same number of times and the first part has the lowest order)
+    """
+
+    COMPARISONS = ["LT", "GT", "EQ"]
+    COND_JUMPS = ["JUMPIFEQ", "JUMPIFNEQ"]
+    STACK_OPERATIONS = ["ADDS", "SUBS", "MULS", "DIVS", "IDIVS", "LTS", "GTS", "EQS", "ANDS", "ORS"]
+
+
+    def __init__(self, program : Program):
+        self.program = program
+
+
+    @staticmethod
+    def isSameVar(lOp, rOp) -> bool:
+        return lOp.__class__ == Variable and rOp.__class__ == Variable and \
+            (lOp.getFrameMark(), lOp.getName()) == (rOp.getFrameMark(), rOp.getName())
+
+
+    @staticmethod
+    def isBoolLiteral(op) -> bool:
+        """Checks, that operand is bool literal with value (bool@nil has
+        None, it is never equal to result of comparison)
+        """
+
+        return op.__class__ == Literal and op.getData().getType() == Data.Type.BOOL and op.getData().getValue() is not None
+
+
+    @staticmethod
+    def isCompareJump(window : list) -> bool:
+        """Comparison followed by conditional jump comparing its result with
+        bool literal (e.g. LT GF@c ...; JUMPIFEQ label GF@c bool@true)
+        """
+
+        compare, jump = window
+        if compare.getOpCode() not in __class__.COMPARISONS or jump.getOpCode() not in __class__.COND_JUMPS:
+            return False
+
+        dst = compare.getOperands()[0]
+        _, lOp, rOp = jump.getOperands()
+
+        return (__class__.isSameVar(dst, lOp) and __class__.isBoolLiteral(rOp)) or \
+            (__class__.isSameVar(dst, rOp) and __class__.isBoolLiteral(lOp))
+
+
+    @staticmethod
+    def isStackOperation(window : list) -> bool:
+        opcodes = [inst.getOpCode() for inst in window]
+
+        return opcodes[:2] == ["PUSHS", "PUSHS"] and opcodes[2] in __class__.STACK_OPERATIONS and opcodes[3] == "POPS"
+
+
+    @staticmethod
+    def isNewFrame(window : list) -> bool:
+        return [inst.getOpCode() for inst in window] == ["CREATEFRAME", "PUSHFRAME"]
+
+
+    def fuse(self):
+        """Replaces all recognized sequences by superinstructions and links
+        the program again (if something was replaced)
+        """
+
+        patterns = [ # Length of sequence, predicate and handler of superinstruction
+            (4, __class__.isStackOperation, Op.stackOperation),
+            (2, __class__.isCompareJump, Op.compareJump),
+            (2, __class__.isNewFrame, Op.newFrame),
+        ]
+
+        instructions = list(self.program.getInstructions())
+        result = []
+        index = 0
+
+        while index < len(instructions):
+            for length, matches, handler in patterns:
+                window = instructions[index:index + length]
+                if len(window) == length and matches(window):
+                    result.append(Fused(window, handler))
+                    index += length
+                    break
+            else:
+                result.append(instructions[index])
+                index += 1
+
+        if len(result) != len(instructions):
+            self.program.replaceInstructions(result)
@@ -0,0 +1,118 @@
+# IPP project 2. part
+# Author: Vojtech Dvorak (xdvora3o)
+
+"""Contains sampling profiler of IPPcode22 programs (see --profile). Samples
+are taken by timer measuring CPU time of the process (signal SIGPROF), so
+the execution loops are not slowed down by any check. Every sample records
+the executed instruction and the chain of functions (labels of CALL
+instructions), results are written as collapsed stacks (input format of
+flamegraph.pl, speedscope and similar tools).
+"""
+
+import signal
+
+from collections import Counter
+from engine import FastEngine
+from errors import *
+from program import Fused, Program
+
+
+class Profiler:
+    """Samples execution of linked program by given engine. Executed
+    instruction is found in the loop of FastEngine (its local variables) or
+    it is taken from program context (it is set by Program.execute)
+    """
+
+    DEFAULT_INTERVAL = 1000 # Sampling interval in microseconds of CPU time
+    MAIN = "<main>" # Name of the code outside of functions
+    FAST_LOOP = FastEngine.run.__code__
+
+
+    def __init__(self, program : Program, interval : int = DEFAULT_INTERVAL):
+        self.program = program
+        self.ctx = program.getContext()
+        self.interval = interval / 1000000
+        self.samples = Counter() # Numbers of samples by pairs (functions, instruction)
+        self.previousHandler = None
+
+
+    @staticmethod
+    def isSupported() -> bool:
+        return hasattr(signal, "setitimer")
+
+
+    def locate(self, frame):
+        """Returns instruction executed in the moment, when the Python frame
+        was interrupted (or None if no instruction is executed). Part of
+        superinstruction is returned instead of superinstruction, so both
+        engines report instructions of IPPcode22
+        """
+
+        instruction = self.ctx.currentInstruction
+        while frame is not None:
+            if frame.f_code is __class__.FAST_LOOP:
+                variables = frame.f_locals
+                index = variables["current"] if "current" in variables else variables.get("index")
+                instructions = self.program.getInstructions()
+
+                instruction = instructions[index] if index != None and 0 <= index < len(instructions) else None
+                break
+
+            frame = frame.f_back
+
+        if instruction.__class__ == Fused: # Executed part is set as current instruction by handlers
+            parts = instruction.getParts()
+            current = self.ctx.currentInstruction
+
+            return current if any(current is part for part in parts) else parts[0]
+
+        return instruction
+
+
+    def sample(self, signum, frame):
+        """Handler of SIGPROF, that records one sample"""
+
+        instruction = self.locate(frame)
+        if instruction == None:
+            return
+
+        functions = tuple(func for _, func in self.ctx.callStack.getElements()) + (self.ctx.currentFunction,)
+        self.samples[(functions, instruction)] += 1
+
+
+    def start(self):
+        self.samples.clear()
+        self.previousHandler = signal.signal(signal.SIGPROF, self.sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, self.previousHandler)
+
+
+    def collapse(self) -> dict:
+        """Returns numbers of samples by collapsed stacks (names of functions
+        and the instruction separated by semicolons)
+        """
+
+        stacks = Counter()
+        for (functions, instruction), count in self.samples.items():
+            names = [func if func != None else __class__.MAIN for func in functions]
+            names.append(f"{instruction.getOpCode()} o.{instruction.getOrder()}")
+            stacks[";".join(names)] += count
+
+        return stacks
+
+
+    def write(self, path : str):
+        """Writes collapsed stacks (one per line with number of samples) to
+        the file
+        """
+
+        try:
+            with open(path, "w") as f:
+                for stack, count in sorted(self.collapse().items()):
+                    f.write(f"{stack} {count}\n")
+        except OSError:
+            raise Error.FileError(OUPUT_FILE_ERROR, f"Nelze zapsat profil do souboru '{path}'!")
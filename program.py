@@ -9,13 +9,26 @@ from enum import Enum, auto
 from fileinput import close
 from errors import *
 
+import json
 import sys
+import time
+
+from array import array
 
 class Data:
     """Inner representation of data during execution, it is basically composit
     of type (given by enum value) and value (it depends on type semantics)
+
+    Data objects are immutable (they have no setters), so they can be shared
+    between variables, stacks and literals. Constructor does not validate
+    the value (it is called in every instruction), values from outer world
+    should be converted by Data.create, that checks them. Frequent values
+    (nil, bools and small ints) are interned, see Data.ofBool and Data.ofInt.
     """
 
+    __slots__ = ("type", "value")
+
+
     class Type(Enum):
         NIL = auto()
         BOOL = auto()
@@ -24,54 +37,97 @@ class Data:
         FLOAT = auto()
 
 
+    SMALL_INT_MIN = -128
+    SMALL_INT_MAX = 1024
+
+
     def __init__(self, type, value):
         self.type = type
-        self.setValue(value)
+        self.value = value
 
     def __str__(self):
         return "("+self.type.name+", "+str(self.value)+")"
 
-    
-    def isValCompatible(self, value) -> bool:
+
+    @staticmethod
+    def isValCompatible(type, value) -> bool:
         """Checks whther given value of python type is compatible with 
-        data type of object
+        given data type
 
         Args:
+            type (Data.Type): data type of the value
             value (any): value that should be checked
         """
 
         if value.__class__.__name__ == "NoneType": # Every type can have 'None' (nil) value
             return True
 
-        if self.type == __class__.Type.BOOL and value.__class__ == bool:
+        if type == __class__.Type.BOOL and value.__class__ == bool:
             return True
-        elif self.type == __class__.Type.INT and value.__class__ == int:
+        elif type == __class__.Type.INT and value.__class__ == int:
             return True
-        elif self.type == __class__.Type.STR and value.__class__ == str:
+        elif type == __class__.Type.STR and value.__class__ == str:
             return True
-        elif self.type == __class__.Type.FLOAT and value.__class__ == float:
+        elif type == __class__.Type.FLOAT and value.__class__ == float:
             return True
         else:
             return False
 
 
-    def getType(self):
-        return self.type
+    @staticmethod
+    def create(type, value):
+        """Creates data object with validation of value (interned objects are
+        returned for frequent values)
+        """
+
+        if not __class__.isValCompatible(type, value):
+            raise Error.InternalError(INTERNAL_ERROR, f"Nelze přiřadit hodnotu typu {value.__class__.__name__} datovému objektu s typem {type.name}!")
+
+        if type == __class__.Type.NIL:
+            return __class__.NIL
+        elif type == __class__.Type.BOOL and value != None:
+            return __class__.ofBool(value)
+        elif type == __class__.Type.INT and value != None:
+            return __class__.ofInt(value)
+        else:
+            return Data(type, value)
+
+
+    @staticmethod
+    def ofBool(value : bool):
+        """Returns interned data object with given bool value"""
+
+        return __class__.TRUE if value else __class__.FALSE
+
+
+    @staticmethod
+    def ofInt(value : int):
+        """Returns data object with given int value (interned for small ints)"""
+
+        if __class__.SMALL_INT_MIN <= value <= __class__.SMALL_INT_MAX:
+            return __class__.SMALL_INTS[value - __class__.SMALL_INT_MIN]
 
+        return Data(__class__.Type.INT, value)
 
-    def setType(self, newType):
-        self.type = newType
+
+    def __reduce__(self):
+        # Unpickled data objects (e.g. from cache) are interned again
+        return (Data.create, (self.type, self.value))
+
+
+    def getType(self):
+        return self.type
 
 
     def getValue(self):
         return self.value
 
 
-    def setValue(self, newValue):
-        if self.isValCompatible(newValue):
-            self.value = newValue
-        else:
-            raise Error.InternalError(INTERNAL_ERROR, f"Nelze přiřadit hodnotu typu {newValue.__class__.__name__} datovému objektu s typem {self.type.name}!")
+Data.NIL = Data(Data.Type.NIL, None)
+Data.TRUE = Data(Data.Type.BOOL, True)
+Data.FALSE = Data(Data.Type.BOOL, False)
+Data.SMALL_INTS = [Data(Data.Type.INT, i) for i in range(Data.SMALL_INT_MIN, Data.SMALL_INT_MAX + 1)]
+
 
 
 class Operand:
@@ -113,7 +169,7 @@ class Literal(Operand):
 
     def __init__(self, num : int, content : str, dataType: Data.Type, value):
         super().__init__(num, super().Type.LITERAL, content)
-        self.data = Data(dataType, value)
+        self.data = Data.create(dataType, value)
 
 
     def getData(self):
@@ -134,6 +190,30 @@ class Type(Operand):
 
 
 
+class Target(Operand):
+    """Subclass of Operand. Represents label operand. Contains also index
+    of the label in the instruction list, that is filled by linking of 
+    program (so jumps do not need to search the label map)
+    """
+
+    def __init__(self, num : int, content : str):
+        super().__init__(num, super().Type.LABEL, content)
+        self.target = None
+
+
+    def getTarget(self):
+        """Returns index of label in instruction list (or None if the operand
+        was not linked or the label does not exist)
+        """
+
+        return self.target
+
+
+    def setTarget(self, index : int):
+        self.target = index
+
+
+
 class Variable(Operand):
     """Subclass of Operand. Represents variable operand. Contains also
     frame property and (variable) name property
@@ -149,6 +229,7 @@ class Variable(Operand):
         super().__init__(num, super().Type.VAR, content)
         self.frame = frame
         self.name = name
+        self.slot = None
 
 
     def getFrameMark(self):
@@ -159,6 +240,133 @@ class Variable(Operand):
         return self.name
 
 
+    def getSlot(self):
+        """Returns index of variable in the frame (it is assigned during 
+        linking of program)
+        """
+
+        return self.slot
+
+
+    def setSlot(self, slot : int):
+        self.slot = slot
+
+
+
+class OutputBuffer:
+    """Output sink, that accumulates written strings and writes them to
+    the stream at once, when the buffer is full or when it is flushed 
+    explicitly (e.g. before writing to another stream)
+    """
+
+    DEFAULT_SIZE = 1 << 16
+
+
+    def __init__(self, stream, size : int = DEFAULT_SIZE):
+        """Creates buffer for given stream
+
+        Args:
+            stream (opened file): target of the output
+            size (int): number of characters, that can be accumulated before
+                writing them to the stream (0 means no buffering)
+        """
+
+        self.stream = stream
+        self.size = size
+        self.parts = []
+        self.length = 0
+
+
+    def write(self, string : str):
+        self.parts.append(string)
+        self.length += len(string)
+
+        if self.length >= self.size:
+            self.flush()
+
+
+    def flush(self):
+        """Writes content of the buffer to the stream and flushes it"""
+
+        if self.parts:
+            self.stream.write("".join(self.parts))
+            self.parts = []
+            self.length = 0
+
+        self.stream.flush()
+
+
+    def setStream(self, stream):
+        """Flushes the buffer and redirects the following output to given
+        stream
+        """
+
+        self.flush()
+        self.stream = stream
+
+
+
+class InputReader:
+    """Reads lines of input by large blocks, so READ instruction does not 
+    need to read the file for every line. Interactive input (terminal) is
+    read line by line (reading of block would wait for more lines)
+    """
+
+    DEFAULT_BLOCK_SIZE = 1 << 16
+
+
+    def __init__(self, stream, interactive : bool = False, blockSize : int = DEFAULT_BLOCK_SIZE):
+        self.stream = stream
+        self.interactive = interactive
+        self.blockSize = blockSize
+        self.lines = []
+        self.position = 0
+        self.rest = [] # Parts of incomplete line at the end of the last block(s)
+        self.eof = False
+
+
+    def readline(self) -> str:
+        """Returns the next line of input without line break (or empty string
+        at the end of input)
+        """
+
+        if self.position < len(self.lines):
+            line = self.lines[self.position]
+            self.position += 1
+            return line
+
+        if self.interactive:
+            return self.stream.readline().rstrip("\n")
+
+        while not self.eof:
+            self.readBlock()
+            if self.lines:
+                return self.readline()
+
+        return ""
+
+
+    def readBlock(self):
+        """Reads next block of input and splits it to lines (the last 
+        incomplete line is kept to the next block)
+        """
+
+        block = self.stream.read(self.blockSize)
+        self.position = 0
+
+        if block == "":
+            self.eof = True
+            self.lines = ["".join(self.rest)] if self.rest else []
+            self.rest = []
+        elif "\n" not in block: # Very long line
+            self.rest.append(block)
+            self.lines = []
+        else:
+            self.rest.append(block)
+            self.lines = "".join(self.rest).split("\n")
+            self.rest = [self.lines.pop()]
+
+
 
 class Stack:
     """Instances of this class simulate behaviour of ADT stack by array (list)"""
@@ -238,36 +446,133 @@ class Stack:
 
 
 
-class Frame:
-    """Instaces of this class represent frames with variables. Basicaly
-    it is wrapper for dictionary containing also some additional methods...
+class DataStack(Stack):
+    """Data stack of program. Emptiness is not checked before operations,
+    error is raised only if the operation with the list fails (IndexError).
+    Handlers of stack instructions work directly with the list of elements
+    (see Utils.stackBinary), the list stays the same object for the whole
+    life of the stack
     """
 
     def __init__(self):
-        self.vars = {}
+        super().__init__()
+        self.setErr("Prázdný datový zásobník!", MISSING_VALUE)
+
+
+    def clear(self):
+        self.elements.clear()
+
+
+    def underflow(self) -> Error.RuntimeError:
+        """Returns exception, that should be raised when the stack is empty"""
+
+        return Error.RuntimeError(self.errCode, self.errMsg)
+
+
+    def pop(self, eTol = False):
+        try:
+            return self.elements.pop()
+        except IndexError:
+            if eTol:
+                return None
+
+            raise self.underflow()
+
+
+    def getTop(self, eTol = False):
+        try:
+            return self.elements[-1]
+        except IndexError:
+            if eTol:
+                return None
+
+            raise self.underflow()
+
+
+
+class Frame:
+    """Instaces of this class represent frames with variables. Variables are
+    stored in list (slots), every variable name has its own index assigned
+    during linking of program (see Program.assignSlots). Slot with None
+    means, that the variable is not defined in frame, slot with UNINIT
+    sentinel means, that it is defined, but it has no value yet.
+
+    Both None and UNINIT are considered as false, so the data of initialized
+    variable can be obtained by single check.
+    """
+
+    class Uninitialized:
+        """Sentinel for defined but uninitialized variables"""
+
+        def __bool__(self):
+            return False
+
+        def __str__(self):
+            return str(None)
+
+
+    UNINIT = Uninitialized()
+
+
+    def __init__(self, names : list):
+        """Creates frame for variables with given names (list with names
+        must be shared by all frames of the same kind, index of name is
+        index of slot)
+        """
+
+        self.names = names
+        self.slots = [None] * len(names)
+        self.defined = [] # Slots of variables in order of their definition
+
 
     def __str__(self):
         string = "{"
 
-        for v in self.vars:
+        for slot in self.defined:
             string += "; " if string != "{" else ""
-            string += v+"="+str(self.vars[v])
+            string += self.names[slot]+"="+str(self.slots[slot])
 
         string += "}"
 
         return string
 
 
-    def getVars(self):
-        return self.vars
+    def count(self) -> int:
+        """Returns number of variables defined in the frame"""
+
+        return len(self.defined)
+
+
+    def isDefined(self, slot : int) -> bool:
+        return self.slots[slot] != None
 
 
-    def getVar(self, varName):
-        return self.vars[varName]
+    def define(self, slot : int):
+        """Defines new (uninitialized) variable in given slot"""
 
+        self.slots[slot] = __class__.UNINIT
+        self.defined.append(slot)
 
-    def setVar(self, varName, data = None):
-        self.vars[varName] = data
+
+    def getSlot(self, slot : int):
+        return self.slots[slot]
+
+
+    def setSlot(self, slot : int, data):
+        self.slots[slot] = data
+
+
+    def clear(self):
+        """Undefines all variables (the list with slots stays the same
+        object, so references to it remain valid). Only defined slots are
+        reset, so the clearing is cheaper than creating new frame
+        """
+
+        slots = self.slots
+        for slot in self.defined:
+            slots[slot] = None
+
+        self.defined = []
 
 
 class ProgramContext:
@@ -280,29 +585,52 @@ class ProgramContext:
             currently executed instruction
         currentFunction (str): label, that was lastly called as function
         input (opened file): file from which is read input
+        interactive (bool): True if input is interactive (terminal), then
+            the output is flushed before reading
+        reader (InputReader): reader of input lines (for READ instructions)
+        output (OutputBuffer): buffered standard output of program
         returnCode (int): ret. code of executed program
         totaICounter (int): counter of executed instructions
-        frames (dict): dictionary with frames, that store data of variables
+        varCount (int): number of variables in accessible frames (GF, LF
+            and TF), it is updated incrementally (see StatsCollector)
+        gf (Frame): global frame
+        lf (Frame|None): local frame (the top of the frame stack)
+        tf (Frame|None): temporary frame
+        framePool (list): cleared local frames, that can be reused by
+            CREATEFRAME (frames are put there when they are thrown away)
+        globalNames (list): names of variables in global frame (index of
+            name is its slot in the frame)
+        localNames (list): names of variables in local and temporary frames
         frameStack (Stack): the stack for storing temporary frames
         callStack (Stack): the stack containing infromation for returns
-        dataStack (Stack): stack with data
+        dataStack (DataStack): stack with data
+        funcStats (FunctionStats|None): statistics of functions notified by
+            CALL and RETURN (None if they are not collected)
         labelMap (dict): contains map of labels (association between labels and
             indexed in array with instructions)
+        originalIndexes (list|None): indexes of instructions in the program
+            before fusion of superinstructions (None if nothing was fused)
     """
 
-    def __init__(self, input = sys.stdin):
+    def __init__(self, input = sys.stdin, outputSize : int = OutputBuffer.DEFAULT_SIZE):
         self.nextInstructionIndex = None
         self.currentInstruction = None
         self.currentFunction = None
         self.input = input
+        self.interactive = input.isatty()
+        self.reader = InputReader(input, self.interactive)
+        self.output = OutputBuffer(sys.stdout, outputSize)
         self.returnCode = None
         self.totalICounter = 0
+        self.varCount = 0
+
+        self.globalNames = []
+        self.localNames = []
 
-        self.frames = { # Initial states of frames
-            Variable.FrameM.GLOBAL : Frame(),
-            Variable.FrameM.LOCAL : None,
-            Variable.FrameM.TEMPORARY : None,
-        }
+        self.gf = Frame(self.globalNames) # Initial states of frames
+        self.lf = None
+        self.tf = None
+        self.framePool = []
 
         self.frameStack = Stack()
         self.frameStack.setErr("Prázdný zásobník rámců!", FRAME_NOT_EXISTS)
@@ -310,10 +638,50 @@ class ProgramContext:
         self.callStack = Stack()
         self.callStack.setErr("Prázdný zásobník volání!", MISSING_VALUE)
         
-        self.dataStack = Stack()
-        self.dataStack.setErr("Prázdný datový zásobník!", MISSING_VALUE)
+        self.dataStack = DataStack()
+        self.funcStats = None
 
         self.labelMap = {}
+        self.originalIndexes = None
+
+
+    def reset(self, input, outputStream):
+        """Brings context to the initial state, so the linked program can be
+        executed again (e.g. with another input). Label map, tables with
+        names of variables and objects referenced by compiled code (global
+        frame, stacks and output buffer) are preserved
+
+        Args:
+            input (opened file): new input of program
+            outputStream (opened file): new target of the standard output
+        """
+
+        self.nextInstructionIndex = None
+        self.currentInstruction = None
+        self.currentFunction = None
+        self.input = input
+        self.interactive = input.isatty()
+        self.reader = InputReader(input, self.interactive)
+        self.output.setStream(outputStream)
+        self.returnCode = None
+        self.totalICounter = 0
+        self.varCount = 0
+
+        self.gf.clear()
+        self.lf = None
+        self.tf = None
+
+        self.frameStack.clear()
+        self.callStack.clear()
+        self.dataStack.clear()
+
+
+    def flushOutput(self):
+        """Writes all buffered output of program (it should be called before
+        writing to other streams to preserve order of messages)
+        """
+
+        self.output.flush()
 
 
     def getTotalICounter(self) -> int:
@@ -354,6 +722,14 @@ class ProgramContext:
         return self.returnCode
 
 
+    def getOriginalIndex(self, index : int) -> int:
+        """Returns index of instruction in the program before fusion of
+        superinstructions (e.g. for printing of call stack by BREAK)
+        """
+
+        return index if self.originalIndexes == None else self.originalIndexes[index]
+
+
     def clearLabelMap(self):
         """Deletes all mapped labels from labelMap dictionary"""
 
@@ -388,26 +764,46 @@ class ProgramContext:
             return self.labelMap[name]
 
 
-    def getFrame(self, frameMark : Variable.FrameM) -> dict:
-        """Returns specific frame from dictionary with frames"""
+    def setSlotNames(self, globalNames : list, localNames : list):
+        """Sets tables with names of variables (given by slot assignment) and
+        creates new global frame corresponding to them
+        """
+
+        self.globalNames = globalNames
+        self.localNames = localNames
+
+        self.varCount -= self.gf.count()
+        self.gf = Frame(self.globalNames)
+        self.framePool = [] # Pooled frames have slots for the old names
+
+
+    def getFrame(self, frameMark : Variable.FrameM) -> Frame:
+        """Returns specific frame (frame marks are compared by identity,
+        hashing of enum members is slow)
+        """
 
-        if not frameMark in self.frames or self.frames[frameMark] == None:
+        if frameMark is Variable.FrameM.GLOBAL:
+            return self.gf
+
+        frame = self.lf if frameMark is Variable.FrameM.LOCAL else self.tf
+        if frame is None:
             raise Error.RuntimeError(FRAME_NOT_EXISTS, f"Rámec '{frameMark.name}' neexistuje!", self)
-        else:
-            return self.frames[frameMark]
+
+        return frame
 
 
     def addVar(self, var : Variable):
         """Safely add var to corresponding frame"""
 
-        name = var.getName()
+        slot = var.getSlot()
         frameMark = var.getFrameMark()
         frame = self.getFrame(frameMark)
 
-        if name in frame.getVars():
-            raise Error.RuntimeError(SEMANTIC_ERROR, f"Redefinice proměnné {name} v rámci {frameMark.name}!", self)
+        if frame.isDefined(slot):
+            raise Error.RuntimeError(SEMANTIC_ERROR, f"Redefinice proměnné {var.getName()} v rámci {frameMark.name}!", self)
         else:
-            frame.setVar(name, None)
+            frame.define(slot)
+            self.varCount += 1
 
 
     def checkVar(self, var : Variable, canBeUninit = False):
@@ -419,19 +815,20 @@ class ProgramContext:
                 is not initialized
 
         Returns:
-            (tuple) frameMark and name of variable
+            (tuple) frame and slot of variable
         """
 
-        name = var.getName()
+        slot = var.getSlot()
         frameMark = var.getFrameMark()
         frame = self.getFrame(frameMark)
 
-        if not name in frame.getVars():
-            raise Error.RuntimeError(VAR_NOT_EXISTS, f"Proměnná '{name}' neexistuje v rámci {frameMark.name}!", self)
-        elif frame.getVar(name) == None and not canBeUninit:
-            raise Error.RuntimeError(MISSING_VALUE, f"Neinicializovaná proměnná '{name}' v rámci {frameMark.name}!", self)
+        data = frame.getSlot(slot)
+        if data == None:
+            raise Error.RuntimeError(VAR_NOT_EXISTS, f"Proměnná '{var.getName()}' neexistuje v rámci {frameMark.name}!", self)
+        elif data is Frame.UNINIT and not canBeUninit:
+            raise Error.RuntimeError(MISSING_VALUE, f"Neinicializovaná proměnná '{var.getName()}' v rámci {frameMark.name}!", self)
         else:
-            return frame, name
+            return frame, slot
 
 
     def getVar(self, var : Variable, canBeUninit = False):
@@ -446,17 +843,18 @@ class ProgramContext:
             (Data|None)
         """
 
-        frame, name = self.checkVar(var, canBeUninit)
+        frame, slot = self.checkVar(var, canBeUninit)
+        data = frame.getSlot(slot)
 
-        return frame.getVar(name)
+        return data if data is not Frame.UNINIT else None
 
 
     def setVar(self, varObj : Variable, newData : Data):
         """Assigns data to variable"""
 
-        frame, name = self.checkVar(varObj, canBeUninit=True) # Check if variable exists in frame
+        frame, slot = self.checkVar(varObj, canBeUninit=True) # Check if variable exists in frame
     
-        frame.setVar(name, newData) # Assigning new data to it
+        frame.setSlot(slot, newData) # Assigning new data to it
 
     
     def getData(self, operand : Operand) -> Data:
@@ -473,99 +871,348 @@ class ProgramContext:
             raise Error.InternalError(INTERNAL_ERROR, f"Nelze získat data z operandu {operand.getType().name}!")
 
     
+    @staticmethod
+    def countVars(frame : Frame) -> int:
+        """Returns number of variables in frame (that can be undefined)"""
+
+        return frame.count() if frame != None else 0
+
+
+    def recycleFrame(self, frame : Frame):
+        """Clears thrown away frame and puts it to the pool (frame can not be
+        referenced from anywhere else)
+        """
+
+        if frame is not None:
+            frame.clear()
+            self.framePool.append(frame)
+
+
     def newTempFrame(self):
-        """Creates new temporary frame and throw away the old one"""
+        """Creates new temporary frame (from pool if it is possible) and throw
+        away the old one
+        """
+
+        oldFrame = self.tf
+        self.tf = self.framePool.pop() if self.framePool else Frame(self.localNames)
+
+        self.varCount -= __class__.countVars(oldFrame)
+        self.recycleFrame(oldFrame)
+
+
+    def pushFrame(self):
+        """Moves temporary frame to the frame stack (it becomes local frame)"""
+
+        frame = self.getFrame(Variable.FrameM.TEMPORARY)
+        self.frameStack.push(frame)
+
+        self.varCount -= __class__.countVars(self.lf) # Frame is counted as TF before and as LF now
+        self.lf = frame
+        self.tf = None
+
 
-        self.frames[Variable.FrameM.TEMPORARY] = Frame()
+    def popFrame(self):
+        """Moves local frame from the frame stack to temporary frame (the old
+        temporary frame is thrown away)
+        """
+
+        frame = self.frameStack.pop()
+        oldFrame = self.tf
+        self.tf = frame
+        self.lf = self.frameStack.getTop(eTol=True)
+
+        self.varCount += __class__.countVars(self.lf) - __class__.countVars(oldFrame)
+        self.recycleFrame(oldFrame)
+
+
+
+class FunctionStats:
+    """Collects statistics of functions (labels called by CALL): number of
+    calls, inclusive and exclusive numbers of executed instructions, inclusive
+    wall time and maximal depth of recursion. It is notified only by CALL and
+    RETURN, so its costs do not depend on the number of other executed
+    instructions. Inclusive values of recursive function are counted only for
+    its outermost activation (nested activations are already included)
+    """
 
+    class Record:
+        """Statistics of one function"""
 
-    def deleteTempFrame(self):
-        """Clears temporary frame to initial state"""
+        def __init__(self):
+            self.calls = 0
+            self.inclusive = 0
+            self.exclusive = 0
+            self.seconds = 0.0
+            self.depth = 0 # Number of active activations
+            self.maxDepth = 0
+
+
+    def __init__(self):
+        self.start()
+
+
+    def start(self):
+        """Discards statistics of previous run"""
 
-        self.frames[Variable.FrameM.TEMPORARY] = None
+        self.functions = {} # Records by labels (in order of the first call)
+        self.activations = [] # Lists [record, counter at entry, time at entry, instructions of callees]
 
 
-    def updateLocalFrame(self):
-        """Updates local frame - it is recommended to call it everytime
-        the frameStack is updated
+    def enter(self, label : str, counter : int):
+        """Called when function is called, counter is the number of executed
+        instructions including CALL
         """
 
-        self.frames[Variable.FrameM.LOCAL] = self.frameStack.getTop(eTol=True)  
+        record = self.functions.get(label)
+        if record == None:
+            record = self.functions[label] = __class__.Record()
+
+        record.calls += 1
+        record.depth += 1
+        record.maxDepth = max(record.maxDepth, record.depth)
+
+        self.activations.append([record, counter, time.perf_counter(), 0])
+
+
+    def leave(self, counter : int):
+        """Called when function returns, counter is the number of executed
+        instructions including RETURN
+        """
+
+        record, entryCounter, entryTime, calleeInsts = self.activations.pop()
+        inclusive = counter - entryCounter
+
+        record.exclusive += inclusive - calleeInsts
+        record.depth -= 1
+        if record.depth == 0:
+            record.inclusive += inclusive
+            record.seconds += time.perf_counter() - entryTime
+
+        if self.activations:
+            self.activations[-1][3] += inclusive
+
+
+    def finish(self, counter : int):
+        """Ends all active functions (program ended inside of function)"""
+
+        while self.activations:
+            self.leave(counter)
+
+
+    def render(self) -> str:
+        """Returns statistics in CSV format (one function per line)"""
+
+        rows = ["label,calls,inclusive,exclusive,seconds,maxDepth"]
+        for label, r in self.functions.items():
+            rows.append(f"{label},{r.calls},{r.inclusive},{r.exclusive},{r.seconds:.6f},{r.maxDepth}")
+
+        return "\n".join(rows)
 
 
 
 class StatsCollector:
-    """Its instances are reponsible for collecting stats about interpretation"""
+    """Its instances are reponsible for collecting stats about interpretation.
+    
+    Collector is plugged to the execution loop as hook (see method update),
+    that is called after every executed instruction. If there is no group of
+    statistics, the hook is not used at all. All updates have constant time
+    complexity: number of variables is maintained incrementally by program
+    context and execution counts are stored in array indexed by positions of
+    instructions (the hottest instruction is found when stats are reported).
+    """
 
     SKEY = "stats" # Key that is used in dictionary with configuration
+    HISTOGRAM_FORMATS = ["csv", "json"]
+
+    # Instructions, that end basic block (labels start new blocks)
+    BLOCK_ENDS = ["JUMP", "JUMPIFEQ", "JUMPIFNEQ", "JUMPIFEQS", "JUMPIFNEQS", "CALL", "RETURN", "EXIT"]
 
 
     def __init__(self, config):
         """Initializes statistics information and saves the stats config"""
 
         self.sconfig = {}
+        self.histogramFormat = config.get("histogramFormat", __class__.HISTOGRAM_FORMATS[0])
 
         if __class__.SKEY in config:
             self.sconfig = config[__class__.SKEY]
 
+        stats = [stat for group in self.sconfig.values() for stat in group]
+        self.funcStats = FunctionStats() if "funcs" in stats else None
+        self.hooked = any(stat != "funcs" for stat in stats) # Function stats do not need the hook
+
         self.insts = 0
-        self.hotInstruction = None
         self.vars = 0
 
-        self.hotMap = {}
+        self.instructions = []
+        self.counters = []
+
 
+    def start(self, instructions : list):
+        """Prepares counters of executions for given (sorted) instructions
+        (statistics of previous run are discarded)
+        """
 
-    def updateInsts(self, ctx : ProgramContext):
-        """Updates executed instruction counter"""
+        self.instructions = instructions
+        self.counters = [0] * len(instructions)
+        self.insts = 0
+        self.vars = 0
 
-        self.insts = ctx.getTotalICounter()
+        if self.funcStats != None:
+            self.funcStats.start()
 
 
-    def updateHot(self, ctx : ProgramContext):
-        """Updates the hottest instruction"""
+    def stop(self, ctx : ProgramContext):
+        """Should be called when the program ends (also by error)"""
 
-        curInstr = ctx.getInstruction()
-        if curInstr in self.hotMap:
-            self.hotMap[curInstr] += 1
-        else: 
-            self.hotMap[curInstr] = 1
+        if self.funcStats != None:
+            self.funcStats.finish(ctx.totalICounter)
 
-        if self.hotInstruction == None:
-            self.hotInstruction = curInstr
-        else:
-            hot = self.hotInstruction
 
-            hotN = self.hotMap[hot]
-            curN = self.hotMap[curInstr]
+    def update(self, ctx : ProgramContext, index : int):
+        """Hook, that should be called after execution of instruction at given 
+        index. Only instructions that incremented the instruction counter are
+        taken into account (debug instructions and labels are not counted)
+        """
 
-            hotO = hot.getOrder()
-            curO = curInstr.getOrder()
+        if ctx.totalICounter != self.insts:
+            self.insts = ctx.totalICounter
+            self.counters[index] += 1
 
-            if (curN > hotN) or (curN == hotN and curO < hotO):
-                self.hotInstruction = curInstr
-    
+            if ctx.varCount > self.vars:
+                self.vars = ctx.varCount
 
-    def updateVars(self, ctx : ProgramContext):
-        """Updates maximum declared variables number"""
-        
-        curVars = 0
-        for frame in ctx.frames:
-            if ctx.frames[frame]:
-                curVars += len(ctx.frames[frame].getVars())
-        
-        if curVars > self.vars:
-            self.vars = curVars
-        
 
-    def updateAll(self, ctx : ProgramContext):
-        """Updates statistics information (if there was option --stats)"""
+    def getHotInstruction(self):
+        """Returns the most executed instruction (with the lowest order number
+        if there are more of them) or None if nothing was executed
+        """
+
+        counters = self.counters
+        if not counters or max(counters) == 0:
+            return None
+
+        # Instructions are sorted, so the first maximum has the lowest order
+        return self.instructions[counters.index(max(counters))]
+
+
+    def getExecutions(self) -> list:
+        """Returns pairs (instruction, number of executions) in the order of
+        instructions. Superinstructions are replaced by their parts (every
+        part was executed the same number of times), labels have None instead
+        of number of executions (they are never executed)
+        """
+
+        executions = []
+        for inst, count in zip(self.instructions, self.counters):
+            if inst.__class__ == Label:
+                executions.append((inst, None))
+            elif inst.__class__ == Fused:
+                executions.extend((part, count) for part in inst.getParts())
+            else:
+                executions.append((inst, count))
+
+        return executions
+
+
+    def getHistograms(self) -> tuple:
+        """Returns histograms of executions per instruction (by orders), per
+        opcode and per basic block
+
+        Returns:
+            (tuple): dictionary order -> count, dictionary opcode -> count
+                and list with triplets (first order, last order, count) of
+                basic blocks (block is executed as many times as its most
+                executed instruction)
+        """
+
+        orders, opcodes, blocks = {}, {}, []
+        block = None
+
+        for inst, count in self.getExecutions():
+            if count == None:
+                block = None # Label starts new block
+                continue
+
+            opcode = inst.getOpCode()
+            orders[inst.getOrder()] = count
+            opcodes[opcode] = opcodes.get(opcode, 0) + count
+
+            if block == None:
+                block = [inst.getOrder(), inst.getOrder(), count]
+                blocks.append(block)
+            else:
+                block[1] = inst.getOrder()
+                block[2] = max(block[2], count)
+
+            if opcode in __class__.BLOCK_ENDS:
+                block = None
+
+        return orders, opcodes, [tuple(b) for b in blocks]
+
+
+    def formatHistograms(self) -> str:
+        """Returns histograms in CSV (columns kind, key and count) or JSON
+        (due to configuration)
+        """
+
+        orders, opcodes, blocks = self.getHistograms()
+        if self.histogramFormat == "json":
+            return json.dumps({
+                "orders" : {str(order) : count for order, count in orders.items()},
+                "opcodes" : opcodes,
+                "blocks" : [{"start" : start, "end" : end, "count" : count} for start, end, count in blocks],
+            }, indent=2)
+
+        rows = ["kind,key,count"]
+        rows += [f"order,{order},{count}" for order, count in orders.items()]
+        rows += [f"opcode,{opcode},{count}" for opcode, count in sorted(opcodes.items())]
+        rows += [f"block,{start}-{end},{count}" for start, end, count in blocks]
+
+        return "\n".join(rows)
+
+
+    def isEnabled(self) -> bool:
+        """Returns True if there is at least one group of statistics"""
+
+        return bool(self.sconfig)
+
+
+    def needsHook(self) -> bool:
+        """Returns True if the hook must be called after every instruction"""
+
+        return self.hooked
+
+
+    def getFunctionStats(self) -> FunctionStats:
+        return self.funcStats
+
+
+    def getStat(self, stat : str) -> int:
+        """Returns value of statistic with given name"""
+
+        if stat == "insts":
+            return self.insts
+        elif stat == "hot":
+            return self.getHotInstruction().getOrder()
+        elif stat == "vars":
+            return self.vars
+        elif stat == "histogram":
+            return self.formatHistograms()
+        elif stat == "funcs":
+            return self.funcStats.render()
+        else:
+            raise Error.InternalError(INTERNAL_ERROR, f"Nepodporovaný typ statistiky '{stat}'!")
+
+
+    def render(self) -> dict:
+        """Returns dictionary with contents of statistics files (keys are
+        names of files given in config), e.g. for sending them to client
+        """
+
+        return {file : "".join(f"{self.getStat(stat)}\n" for stat in stats) for file, stats in self.sconfig.items()}
 
-        if self.sconfig:
-            self.updateHot(ctx)
-            self.updateVars(ctx)
-            self.updateInsts(ctx)
 
-    
     def report(self):
         """Prints statistics into corresponding files (given in config)"""
 
@@ -576,23 +1223,151 @@ class StatsCollector:
                 raise Error.FileError(OUPUT_FILE_ERROR, f"Nelze vytvořit/zapsat statistiky do souboru '{file}'!")
 
             for stat in self.sconfig[file]:
-                data = None
-
-                if stat == "insts":
-                    data = self.insts
-                elif stat == "hot":
-                    data = self.hotInstruction.getOrder()
-                elif stat == "vars":
-                    data = self.vars
-                else:
-                    raise Error.InternalError(INTERNAL_ERROR, f"Nepodporovaný typ statistiky '{stat}'!")
-                
-                print(data, file=fStream, end="\n")
+                print(self.getStat(stat), file=fStream, end="\n")
 
             fStream.close()
 
 
 
+class ExecutionTrace:
+    """Ring buffer with indexes of the last executed instructions (and
+    optionally with data written by them) for post-mortem analysis. Buffer
+    is preallocated, so the memory does not depend on the length of run and
+    the hook (see update) performs only a few stores. Only instructions,
+    that incremented the instruction counter, are recorded (like in
+    StatsCollector)
+    """
+
+    DEFAULT_SIZE = 4096
+    SYMB_FIRST = ["PUSHS", "WRITE", "EXIT", "DPRINT"] # Instructions, whose first variable is not written
+
+
+    def __init__(self, path : str, size : int = DEFAULT_SIZE, values : bool = False):
+        self.path = path
+        self.size = size
+        self.values = [None] * size if values else None
+        self.indexes = array("l", [0]) * size
+        self.instructions = []
+        self.targets = []
+        self.recorded = 0 # Number of records (modulo size is position of the next record)
+        self.insts = 0
+
+
+    @staticmethod
+    def getTarget(inst):
+        """Returns variable written by instruction (or None)"""
+
+        if inst.__class__ == Fused:
+            targets = [__class__.getTarget(part) for part in inst.getParts()]
+            targets = [t for t in targets if t != None]
+
+            return targets[0] if targets else None
+
+        operands = inst.getOperands()
+        if operands and operands[0].__class__ == Variable and inst.getOpCode() not in __class__.SYMB_FIRST:
+            return operands[0]
+
+        return None
+
+
+    def start(self, instructions : list):
+        """Discards records of previous run and prepares the trace for given
+        (sorted) instructions
+        """
+
+        self.instructions = instructions
+        if self.values != None:
+            self.targets = [__class__.getTarget(inst) for inst in instructions]
+
+        self.recorded = 0
+        self.insts = 0
+
+
+    def getHook(self):
+        return self.update if self.values == None else self.updateWithValues
+
+
+    def update(self, ctx : ProgramContext, index : int):
+        """Hook, that should be called after execution of instruction at given
+        index
+        """
+
+        if ctx.totalICounter != self.insts:
+            self.insts = ctx.totalICounter
+            self.indexes[self.recorded % self.size] = index
+            self.recorded += 1
+
+
+    def updateWithValues(self, ctx : ProgramContext, index : int):
+        """Hook, that records also data written by the instruction"""
+
+        if ctx.totalICounter != self.insts:
+            self.insts = ctx.totalICounter
+            position = self.recorded % self.size
+            self.indexes[position] = index
+
+            target = self.targets[index]
+            self.values[position] = ctx.getFrame(target.frame).slots[target.slot] if target != None else None
+            self.recorded += 1
+
+
+    def getRecords(self) -> list:
+        """Returns pairs (instruction, written data or None) from the oldest
+        to the newest (uninitialized variable, e.g. after DEFVAR, has None)
+        """
+
+        count = min(self.recorded, self.size)
+        start = (self.recorded - count) % self.size
+        positions = [(start + i) % self.size for i in range(count)]
+
+        values = self.values if self.values != None else [None] * self.size
+
+        return [(self.instructions[self.indexes[p]], values[p] if values[p] else None) for p in positions] # UNINIT is false
+
+
+    def getExecutedParts(self, ctx : ProgramContext, failed) -> list:
+        """Returns parts of superinstruction, that were executed before its
+        failed part (superinstruction is not recorded by the hook, if it
+        fails)
+        """
+
+        index = ctx.nextInstructionIndex # Index of failed instruction
+        if failed == None or index == None or not 0 <= index < len(self.instructions):
+            return []
+
+        inst = self.instructions[index]
+        if inst.__class__ != Fused:
+            return []
+
+        parts = inst.getParts()
+        for i, part in enumerate(parts):
+            if part is failed:
+                return parts[:i]
+
+        return []
+
+
+    def dump(self, ctx : ProgramContext, failed = None):
+        """Writes the trace (one instruction per line) to the file, failed
+        instruction is written at the end (after the executed parts of
+        failed superinstruction)
+        """
+
+        records = self.getRecords() + [(part, None) for part in self.getExecutedParts(ctx, failed)]
+
+        try:
+            with open(self.path, "w") as f:
+                f.write(f"# executed: {ctx.totalICounter}, recorded: {len(records)}\n")
+                for inst, data in records:
+                    f.write(f"{inst.getOrder()} {inst.getOpCode()}" + (f" {data}" if data != None else "") + "\n")
+
+                if failed != None:
+                    f.write(f"# failed: {failed.getOrder()} {failed.getOpCode()}\n")
+        except OSError:
+            raise Error.FileError(OUPUT_FILE_ERROR, f"Nelze zapsat záznam provádění do souboru '{self.path}'!")
+
+
+
 class Instruction:
     """Inner representation of instruction. Used design pattern
     COMMAND to design this class. Instruction objects ar firstly created
@@ -635,28 +1410,48 @@ class Executable(Instruction):
         self.action = action
 
 
-    def do(self, ctx : ProgramContext, statCol : StatsCollector):
+    def do(self, ctx : ProgramContext):
         """Executes the implementation of instruction"""
 
         self.action(ctx, self.operands)
         ctx.incTotalICounter()
 
-        statCol.updateAll(ctx)
-
 
 class Debug(Executable):
     """Subclass of executable class for debug instructions (they do not update
     the instruction counter and statistics)
     """
 
-    def do(self, ctx : ProgramContext, statCol : StatsCollector):
+    def do(self, ctx : ProgramContext):
         self.action(ctx, self.operands)
 
 
+class Fused(Executable):
+    """Subclass of executable class for superinstructions - sequences of
+    instructions (parts) executed by one handler (it gets the list with parts).
+    Superinstruction has order number of its first part and it is counted as
+    all of its parts
+    """
+
+    def __init__(self, parts : list, action):
+        operands = [op for part in parts for op in part.getOperands()] # For linking
+        super().__init__("+".join(p.getOpCode() for p in parts), parts[0].getOrder(), operands, action)
+        self.parts = parts
+
+
+    def do(self, ctx : ProgramContext):
+        self.action(ctx, self.parts)
+        ctx.incTotalICounter()
+
+
+    def getParts(self) -> list:
+        return self.parts
+
+
 class Label(Instruction):
     """Subclass of instruction class for labels"""
 
-    def do(self, ctx : ProgramContext, statCol : StatsCollector):
+    def do(self, ctx : ProgramContext):
         pass
     
 
@@ -668,15 +1463,61 @@ class Program:
     """
 
     def __init__(self, config : dict, instructions = []):
-        """If the new program is created, the new program context is created"""
+        """If the new program is created, the new program context is created.
+        Given instructions are sorted by their order numbers (all at once)
+        """
 
-        self.ctx = ProgramContext(config["inputOpened"])
+        outputSize = config.get("outputBuffer", OutputBuffer.DEFAULT_SIZE)
+        self.ctx = ProgramContext(config["inputOpened"], outputSize)
 
         self.statCol = StatsCollector(config)
+        self.ctx.funcStats = self.statCol.getFunctionStats()
 
-        self.instructions = []
-        for i in instructions:
-            self.addInstruction(i)
+        self.trace = None
+        if "trace" in config:
+            self.trace = ExecutionTrace(config["trace"], config.get("traceSize", ExecutionTrace.DEFAULT_SIZE), "traceValues" in config)
+
+        self.instructions = sorted(instructions, key=Instruction.getOrder)
+        self.linked = False
+
+
+    @classmethod
+    def fromSorted(cls, config : dict, instructions : list):
+        """Creates program from list of instructions, that is already sorted
+        by order numbers (e.g. by parser), so no sorting is performed and the
+        list is used directly
+        """
+
+        program = cls(config)
+        program.instructions = instructions
+
+        return program
+
+
+    @classmethod
+    def fromLinked(cls, config : dict, instructions : list, labelMap : dict, slotNames : tuple, originalIndexes : list = None):
+        """Creates program from already linked instructions (e.g. loaded from
+        cache), label map and tables with names of variables (see 
+        getLinkage), so no linking is needed. Instructions are not traversed
+        (bytecode decodes them lazily), so indexes before fusion of
+        superinstructions must be given, if the instructions are fused
+        """
+
+        program = cls.fromSorted(config, instructions)
+        program.ctx.labelMap = labelMap
+        program.ctx.setSlotNames(*slotNames)
+        program.ctx.originalIndexes = originalIndexes
+        program.linked = True
+
+        return program
+
+
+    def getLinkage(self) -> tuple:
+        """Returns results of linking (label map and tables with names of
+        variables in global and local frames)
+        """
+
+        return self.ctx.getLabelMap(), (self.ctx.globalNames, self.ctx.localNames)
 
 
     def getContext(self):
@@ -693,31 +1534,132 @@ class Program:
                 self.ctx.addLabel(i.operands[0].getContent(), index)
 
 
-    def addInstruction(self, instruction : Instruction):
-        """Adds instruction to list of the instructions and checks if is is
-        sorted properly
+    def link(self, labelMap : dict = None):
+        """Performs linking of the program (it should be done only once). 
+        Maps labels to the label map of context (or uses given label map, e.g.
+        from semantic analysis) and stores target indexes directly to label
+        operands of instructions. Operands with undefined labels stay 
+        unresolved (jump to them raises an error in runtime). Then it assigns
+        slots to variables.
         """
 
-        if len(self.instructions) == 0:
-            self.instructions.append(instruction)
+        self.ctx.clearLabelMap()
+        if labelMap == None:
+            self.mapLabels()
         else:
-            pos = len(self.instructions)
-            while instruction.getOrder() < self.instructions[pos-1].getOrder():
-                pos -= 1
-                if pos == 0:
-                    break
+            self.ctx.labelMap = labelMap
+
+        labelMap = self.ctx.getLabelMap()
+        for i in self.instructions:
+            for op in i.getOperands():
+                if op.__class__ == Target:
+                    op.setTarget(labelMap.get(op.getContent()))
+
+        self.assignSlots()
+        self.mapOriginalIndexes()
+        self.linked = True
 
-            self.instructions.insert(pos, instruction)
+
+    def assignSlots(self):
+        """Assigns index of slot in frame to every variable operand. Global
+        frame has its own table with names, local and temporary frames share
+        one table (temporary frame becomes local frame by PUSHFRAME)
+        """
+
+        globalNames, localNames = [], []
+        globalSlots, localSlots = {}, {}
+
+        for i in self.instructions:
+            for op in i.getOperands():
+                if op.__class__ != Variable:
+                    continue
+
+                names, slots = localNames, localSlots
+                if op.getFrameMark() == Variable.FrameM.GLOBAL:
+                    names, slots = globalNames, globalSlots
+
+                name = op.getName()
+                if name not in slots:
+                    slots[name] = len(names)
+                    names.append(name)
+
+                op.setSlot(slots[name])
+
+        self.ctx.setSlotNames(globalNames, localNames)
+
+
+    def mapOriginalIndexes(self):
+        """Stores indexes, that instructions had before fusion of
+        superinstructions, to the context (superinstruction has index of its
+        first part)
+        """
+
+        if not any(i.__class__ == Fused for i in self.instructions):
+            self.ctx.originalIndexes = None
+            return
+
+        indexes = []
+        original = 0
+        for i in self.instructions:
+            indexes.append(original)
+            original += len(i.getParts()) if i.__class__ == Fused else 1
+
+        self.ctx.originalIndexes = indexes
+
+
+    def isLinked(self) -> bool:
+        return self.linked
 
 
     def getInstructions(self):
         return self.instructions
 
+
+    def replaceInstructions(self, instructions : list):
+        """Replaces instructions of the program (e.g. by optimized ones) and
+        links the program again
+        """
+
+        self.instructions = instructions
+        self.link()
+
     
     def getStatCollector(self):
         return self.statCol
 
 
+    def getTrace(self) -> ExecutionTrace:
+        return self.trace
+
+
+    def startHooks(self):
+        """Prepares statistics and trace for new run and returns hook, that
+        should be called after every instruction (or None if no hook is
+        needed)
+        """
+
+        hooks = []
+        if self.statCol.isEnabled():
+            self.statCol.start(self.instructions)
+
+        if self.statCol.needsHook():
+            hooks.append(self.statCol.update)
+
+        if self.trace != None:
+            self.trace.start(self.instructions)
+            hooks.append(self.trace.getHook())
+
+        if len(hooks) < 2:
+            return hooks[0] if hooks else None
+
+        first, second = hooks
+        def hook(ctx, index):
+            first(ctx, index)
+            second(ctx, index)
+
+        return hook
+
+
     def start(self):
         """Sets position in program to start"""
 
@@ -766,20 +1708,103 @@ class Program:
 
 
     def run(self):
-        """Performs the execution of the program"""
+        """Performs the execution of the program (statistics are collected
+        only if they are enabled)
+        """
+
+        if not self.linked:
+            self.link()
 
-        self.mapLabels()
         self.reset()
-        while not self.hasEnded():
-            current = self.instructions[self.ctx.getNextInstructionIndex()]
+        try:
+            hook = self.startHooks()
+            if hook != None:
+                self.execute(hook)
+            else:
+                self.execute()
+        finally:
+            self.statCol.stop(self.ctx)
+            self.ctx.flushOutput() # Program ended (by EXIT, error or at the end)
+
+
+    def execute(self, hook = None):
+        """Executes instructions until the program ends
+
+        Args:
+            hook (function): function called after every instruction with 
+                context and index of the instruction (e.g. StatsCollector.update),
+                if it is None, loop without hook is used
+        """
+
+        ctx = self.ctx
+        instructions = self.instructions
+        end = len(instructions)
+
+        if hook == None:
+            while not self.hasEnded():
+                current = instructions[ctx.nextInstructionIndex]
+
+                ctx.setInstruction(current)
+                current.do(ctx)
+
+                if self.hasEnded(): # Check if instruction terminated program
+                    break
+
+                self.nextInstruction()
+
+                if ctx.nextInstructionIndex >= end:
+                    self.finish()
+        else:
+            while not self.hasEnded(): # The same loop, but with hook
+                index = ctx.nextInstructionIndex
+                current = instructions[index]
+
+                ctx.setInstruction(current)
+                current.do(ctx)
+                hook(ctx, index)
+
+                if self.hasEnded():
+                    break
 
-            self.ctx.setInstruction(current)
-            current.do(self.ctx, self.statCol)
+                self.nextInstruction()
 
-            if self.hasEnded(): # Check if instruction terminated program
+                if ctx.nextInstructionIndex >= end:
+                    self.finish()
+
+
+    def executeSlice(self, limit : int, hook = None):
+        """Executes at most given number of instructions and returns, the
+        execution can be resumed by the next call (e.g. by cooperative
+        scheduler). Instruction, that raises an exception, can be executed
+        again, because the next instruction index is moved after its execution
+
+        Args:
+            limit (int): maximal number of executed instructions (labels are
+                included)
+            hook (function): function called after every instruction (see
+                execute)
+        """
+
+        ctx = self.ctx
+        instructions = self.instructions
+        end = len(instructions)
+
+        for _ in range(limit):
+            if self.hasEnded():
+                break
+
+            index = ctx.nextInstructionIndex
+            current = instructions[index]
+
+            ctx.setInstruction(current)
+            current.do(ctx)
+            if hook != None:
+                hook(ctx, index)
+
+            if self.hasEnded():
                 break
-            
+
             self.nextInstruction()
 
-            if self.ctx.getNextInstructionIndex() >= len(self.instructions):
+            if ctx.nextInstructionIndex >= end:
                 self.finish()
@@ -0,0 +1,254 @@
+# IPP project 2. part
+# Author: Vojtech Dvorak (xdvora3o)
+
+"""Contains cooperative scheduler, that runs many IPPcode22 programs in one
+process on asyncio event loop (it is meant to be used as library, e.g. by
+server multiplexing jobs). Every program executes bounded slice of
+instructions and then yields to the others, READ suspends the program until
+the line of input arrives and the standard output is sent to asyncio stream
+after every slice. Programs are executed by Program itself (compiled code
+of FastEngine can not be interrupted), linked instructions can be shared by
+many programs (see Program.fromLinked).
+
+Example:
+    scheduler = Scheduler()
+    jobs = [Job(program, reader, writer) for program, reader, writer in ...]
+    returnCodes = await scheduler.runAll(jobs)
+"""
+
+import asyncio
+
+from errors import *
+from program import Program
+
+
+class InputPending(Exception):
+    """Raised by READ instruction, if there is no line of input available
+    yet (instruction is executed again, when the line arrives)
+    """
+
+    pass
+
+
+
+class AsyncInput:
+    """Input of scheduled program with the interface of InputReader. Lines
+    are read from asyncio stream (or any object with coroutine readline) by
+    the scheduler, READ only takes the line, that was already read
+    """
+
+    ENCODING = "utf-8"
+
+
+    def __init__(self, stream = None):
+        """Creates input reading from given stream (if it is None, the input
+        is empty)
+        """
+
+        self.stream = stream
+        self.line = None # Line read from the stream, that was not taken yet
+        self.eof = stream == None
+
+
+    def readline(self) -> str:
+        """Returns the next line of input without line break (or empty string
+        at the end of input)
+
+        Raises:
+            InputPending: if the line must be read from the stream first
+        """
+
+        if self.line != None:
+            line, self.line = self.line, None
+            return line
+
+        if self.eof:
+            return ""
+
+        raise InputPending()
+
+
+    async def fill(self):
+        """Reads the next line from the stream"""
+
+        line = await self.stream.readline()
+        if line.__class__ == bytes:
+            line = line.decode(__class__.ENCODING, "replace")
+
+        if line == "":
+            self.eof = True
+        else:
+            self.line = line[:-1] if line.endswith("\n") else line
+
+
+
+class AsyncOutput:
+    """Sink of the output buffer of scheduled program. Written strings are
+    kept until they are sent to asyncio stream (or any object with write
+    and coroutine drain) by the scheduler
+    """
+
+    ENCODING = "utf-8"
+
+
+    def __init__(self, stream = None):
+        """Creates output writing to given stream (if it is None, the output
+        is thrown away)
+        """
+
+        self.stream = stream
+        self.parts = []
+
+
+    def write(self, string : str):
+        if self.stream != None:
+            self.parts.append(string)
+
+
+    def flush(self):
+        pass # Output is sent by the scheduler (see send)
+
+
+    async def send(self):
+        """Writes kept output to the stream and waits until it is drained"""
+
+        if not self.parts:
+            return
+
+        data = "".join(self.parts)
+        self.parts = []
+
+        self.stream.write(data.encode(__class__.ENCODING, "surrogateescape"))
+        await self.stream.drain()
+
+
+
+class Job:
+    """Linked program with its asynchronous input and output and results of
+    the execution
+
+    Properties:
+        program (Program): executed program (its context is redirected to
+            input and output of the job)
+        input (AsyncInput): input of the program
+        output (AsyncOutput): standard output of the program
+        returnCode (int): return code of the execution (None if the job
+            has not ended yet)
+        error (Error.MException|Exception): error, that ended the execution
+            (None if the program ended without error)
+    """
+
+    def __init__(self, program : Program, input = None, output = None):
+        """Creates job from program and streams (see AsyncInput and
+        AsyncOutput)
+        """
+
+        self.program = program
+        self.input = AsyncInput(input)
+        self.output = AsyncOutput(output)
+        self.returnCode = None
+        self.error = None
+
+        ctx = program.getContext()
+        ctx.reader = self.input
+        ctx.interactive = False # Output is sent before waiting for input anyway
+        ctx.output.setStream(self.output)
+
+
+    def getReturnCode(self) -> int:
+        return self.returnCode
+
+
+    def getError(self):
+        return self.error
+
+
+    async def send(self):
+        """Sends all output written by the program to the stream"""
+
+        self.program.getContext().flushOutput()
+        await self.output.send()
+
+
+
+class Scheduler:
+    """Runs jobs concurrently on the running event loop. Programs are
+    switched after slice of instructions and when they wait for input or
+    for draining of output stream, so one program can not block the others
+    """
+
+    DEFAULT_SLICE = 1000 # Number of instructions executed without yielding
+
+
+    def __init__(self, sliceSize : int = DEFAULT_SLICE):
+        self.sliceSize = sliceSize
+
+
+    async def run(self, job : Job) -> int:
+        """Executes the program of the job (errors are stored to the job, they
+        are not printed)
+
+        Returns:
+            (int): return code of the execution
+        """
+
+        program = job.program
+        ctx = program.getContext()
+
+        if not program.isLinked():
+            program.link()
+
+        program.reset()
+        returnCode = EXIT_SUCCESS  # Imlicit return code if everything runs correctly
+
+        try:
+            hook = program.startHooks()
+            while not program.hasEnded():
+                try:
+                    program.executeSlice(self.sliceSize, hook)
+                except InputPending:
+                    await job.send() # Output before READ should be visible to the other side
+                    await job.input.fill()
+                    continue
+
+                await job.send()
+                await asyncio.sleep(0) # Yield to other programs
+
+        except Error.MException as e:
+            job.error = e
+            returnCode = e.getCode()
+
+        except OSError:
+            raise # Failure of the streams is not error of the program
+
+        except Exception as e:
+            job.error = e
+            returnCode = INTERNAL_ERROR
+
+        else:
+            if ctx.getReturnCode() != None:
+                returnCode = ctx.getReturnCode()
+
+        finally:
+            program.getStatCollector().stop(ctx)
+
+        await job.send() # Program ended (by EXIT, error or at the end)
+
+        job.returnCode = returnCode
+        return returnCode
+
+
+    def submit(self, job : Job) -> asyncio.Task:
+        """Starts execution of the job as task of the running event loop"""
+
+        return asyncio.ensure_future(self.run(job))
+
+
+    async def runAll(self, jobs : list) -> list:
+        """Executes all jobs concurrently
+
+        Returns:
+            (list): return codes of the jobs (in the same order)
+        """
+
+        return await asyncio.gather(*[self.submit(job) for job in jobs])